@@ -0,0 +1,251 @@
+"""端到端吞吐压测：用本地模拟灯塔驱动 DTGO 引擎，结果保存为 JSON 便于比较
+
+对每个灯塔规模依次测量：
+    submit_rate            目标提交速度（任务/秒）
+    polls_per_task         每个完成任务消耗的状态查询请求数（任务列表 + 单任务查询）
+    result_requests_per_task  每个完成任务消耗的结果分页请求数
+    ingest_rows_per_s      结果接收速度（行/秒）
+    rows_unique            收到的不同结果数，小于 rows_expected 说明增量收集遗漏了结果
+    completion_lag         灯塔上任务完成到引擎发现完成的延迟（秒）
+    task_latency           目标入队到任务完成的延迟（秒）
+    peak_rss_mb            进程峰值内存（进程内单调递增，多个规模连续运行时取较大规模的值）
+
+    python benchmarks/bench_engine.py --beacons 1,10,100 --targets-per-beacon 5 --output bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dtgo_client import get_all_client_stats
+from dtgo_config import Config
+from dtgo_engine import Engine, EngineListener
+from mock_arl import DEFAULT_MOCK_OPTIONS, MockARLServer
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# 状态查询和结果分页接口，用于按类别统计模拟灯塔收到的请求
+POLL_ENDPOINTS = ("GET /task", "GET /task/{id}")
+RESULT_ENDPOINTS = ("GET /site", "GET /domain", "GET /fileleak")
+
+
+def percentile(values, ratio):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(int(round(ratio * (len(values) - 1))), len(values) - 1)
+    return round(values[index], 4)
+
+
+def summarize(values):
+    return {
+        "p50": percentile(values, 0.5),
+        "p95": percentile(values, 0.95),
+        "max": round(max(values), 4) if values else None,
+    }
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class BenchListener(EngineListener):
+    """记录任务创建、完成和结果到达的时间"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.created = {}    # {(beacon, task_id): 时间}
+        self.completed = {}  # {(beacon, task_id): 时间}
+        self.rows = 0
+        self.row_ids = set()  # 收到的不同结果 _id，与 rows 比较可以发现重复或遗漏的结果
+        self.first_result = None
+        self.last_result = None
+        self.errors = 0
+
+    def on_error(self, beacon, message):
+        with self.lock:
+            self.errors += 1
+
+    def on_results(self, beacon, task_id, result_type, items, is_final):
+        now = time.time()
+        with self.lock:
+            self.rows += len(items)
+            self.row_ids.update(item.get("_id") for item in items)
+            if self.first_result is None:
+                self.first_result = now
+            self.last_result = now
+
+    def on_task_created(self, beacon, task_id, target):
+        with self.lock:
+            self.created[(beacon, task_id)] = time.time()
+
+    def on_task_completed(self, beacon, task_id):
+        with self.lock:
+            self.completed[(beacon, task_id)] = time.time()
+
+
+def write_bench_config(app_path, args, client_options=None):
+    """在临时目录写入压测用的配置，轮询间隔和并发上限按命令行参数设置"""
+    config = {
+        "fofa_key": "",
+        "default_beacon_limit": args.limit,
+        "poll": {"min_interval": args.poll_interval, "max_interval": args.poll_interval * 10},
+        "client": dict(client_options or {}, page_size=args.page_size),
+    }
+    with open(os.path.join(app_path, "dtgo_config.json"), "w", encoding="utf-8") as f:
+        json.dump(config, f)
+
+
+def run_fleet(beacon_count, args, mock_options, client_options=None):
+    """启动 beacon_count 个模拟灯塔，提交目标并等待全部完成，返回测量结果"""
+    server = MockARLServer(beacon_count, mock_options).start()
+    app_path = tempfile.mkdtemp(prefix="dtgo-bench-")
+    write_bench_config(app_path, args, client_options)
+    listener = BenchListener()
+    engine = Engine(Config(write_behind=True, app_path=app_path), listener)
+    peak_threads = threading.active_count()
+    try:
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            logged_in = sum(1 for info in pool.map(
+                lambda target: engine.login_beacon(target, mock_options["username"], mock_options["password"]),
+                server.targets
+            ) if info)
+        login_seconds = time.monotonic() - start
+
+        targets = [f"t{i}.bench.local" for i in range(beacon_count * args.targets_per_beacon)]
+        engine.start()
+        submitted_at = time.time()
+        start = time.monotonic()
+        engine.submit(targets)
+        deadline = start + args.timeout
+        while not engine.is_idle() and time.monotonic() < deadline:
+            peak_threads = max(peak_threads, threading.active_count())
+            time.sleep(0.2)
+        elapsed = time.monotonic() - start
+        client_stats = get_all_client_stats()
+    finally:
+        engine.shutdown()
+        server.stop()
+        shutil.rmtree(app_path, ignore_errors=True)
+
+    requests = server.request_counts()
+    completed = len(listener.completed)
+    created_times = sorted(listener.created.values())
+    # 灯塔上任务完成的时刻由模拟灯塔记录的开始时间和时长得到
+    lags = []
+    for (beacon, task_id), seen in listener.completed.items():
+        task = server.beacon(beacon).tasks.get(task_id)
+        if task:
+            lags.append(max(seen - task["start_time"] - task["duration"], 0.0))
+    result_span = (listener.last_result - listener.first_result) if listener.rows > 1 else 0
+    expected_rows = len(targets) * (mock_options["sites"] + mock_options["domains"] + mock_options["leaks"])
+    return {
+        "beacons": beacon_count,
+        "logged_in": logged_in,
+        "targets": len(targets),
+        "tasks_created": len(listener.created),
+        "tasks_completed": completed,
+        "incomplete": completed < len(targets),  # 超时或任务因错误被放弃
+        "elapsed_s": round(elapsed, 3),
+        "login_s": round(login_seconds, 3),
+        "submit_rate": (
+            round(len(created_times) / max(created_times[-1] - submitted_at, 0.001), 2) if created_times else 0
+        ),
+        "polls_per_task": (
+            round(sum(requests.get(endpoint, 0) for endpoint in POLL_ENDPOINTS) / completed, 2) if completed else None
+        ),
+        "result_requests_per_task": (
+            round(sum(requests.get(endpoint, 0) for endpoint in RESULT_ENDPOINTS) / completed, 2)
+            if completed else None
+        ),
+        "rows": listener.rows,
+        "rows_unique": len(listener.row_ids),
+        "rows_expected": expected_rows,
+        "ingest_rows_per_s": round(listener.rows / result_span, 1) if result_span else None,
+        "completion_lag_s": summarize(lags),
+        "task_latency_s": summarize([seen - submitted_at for seen in listener.completed.values()]),
+        "requests": requests,
+        "client_requests": sum(stats["requests"] for stats in client_stats),
+        "client_errors": sum(stats["errors"] for stats in client_stats),
+        "engine_errors": listener.errors,
+        "peak_threads": peak_threads,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def add_fleet_arguments(parser):
+    """模拟灯塔集群和引擎配置的命令行参数"""
+    parser.add_argument("--targets-per-beacon", type=int, default=5)
+    parser.add_argument("--limit", type=int, default=5, help="单个灯塔的并行任务数")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="最短轮询间隔（秒）")
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--timeout", type=float, default=600, help="每个规模的最长等待时间（秒）")
+    for key, value in DEFAULT_MOCK_OPTIONS.items():
+        if key not in ("username", "password"):
+            parser.add_argument(f"--{key.replace('_', '-')}", type=type(value), default=value)
+    parser.set_defaults(task_duration=5.0)
+
+
+def mock_options_from_args(args):
+    return {key: getattr(args, key, value) for key, value in DEFAULT_MOCK_OPTIONS.items()}
+
+
+def save_report(path, args, runs):
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "options": vars(args),
+        "runs": runs,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存到 {path}", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="DTGO 引擎端到端压测")
+    parser.add_argument("--beacons", default="1,10,50", help="逗号分隔的灯塔规模，如 1,10,100,500")
+    parser.add_argument("--tracemalloc", action="store_true", help="同时记录 Python 堆内存峰值（会拖慢运行）")
+    parser.add_argument("--output", default="bench_results.json")
+    add_fleet_arguments(parser)
+    args = parser.parse_args(argv)
+    mock_options = mock_options_from_args(args)
+
+    runs = []
+    for beacon_count in [int(value) for value in args.beacons.split(",") if value.strip()]:
+        if args.tracemalloc:
+            tracemalloc.start()
+        result = run_fleet(beacon_count, args, mock_options)
+        if args.tracemalloc:
+            result["traced_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+            tracemalloc.stop()
+        runs.append(result)
+        print(
+            f"{beacon_count:>4} 灯塔  {result['tasks_completed']}/{result['targets']} 任务  "
+            f"{result['elapsed_s']:.1f}s  提交 {result['submit_rate']}/s  "
+            f"轮询 {result['polls_per_task']}/任务  接收 {result['ingest_rows_per_s']} 行/s  "
+            f"发现延迟 p95 {result['completion_lag_s']['p95']}s  RSS {result['peak_rss_mb']}MB",
+            file=sys.stderr
+        )
+    save_report(args.output, args, runs)
+
+if __name__ == "__main__":
+    main()
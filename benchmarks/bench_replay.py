@@ -0,0 +1,151 @@
+"""用录制的灯塔流量回放压测：任务监控、结果收集和导出，数据形态与生产环境一致且结果可重复
+
+录制：在配置文件的 "client" 中设置 "capture_mode": "record"，正常使用 DTGO 后得到 dtgo_capture.jsonl.gz；
+也可以用 --record-mock 从本地模拟灯塔录制一份
+回放：
+    python benchmarks/bench_replay.py dtgo_capture.jsonl.gz --speed 0 --output replay.json
+    python benchmarks/bench_replay.py mock_capture.jsonl.gz --record-mock --beacons 3
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dtgo_capture import ReplayCapture
+from dtgo_client import get_all_client_stats
+from dtgo_config import Config
+from dtgo_engine import Engine
+from dtgo_export import BackgroundWriter, create_export_writer
+from bench_engine import (BenchListener, add_fleet_arguments, mock_options_from_args, peak_rss_mb, run_fleet,
+                          save_report, summarize, write_bench_config)
+
+# 回放时的灯塔地址，末尾为录制文件中的别名
+REPLAY_HOST = "http://replay.local"
+
+
+def recorded_page_size(capture):
+    """录制时结果接口使用的分页大小，回放时必须一致才能命中录制的请求"""
+    for (_, method, path, query), _ in capture.entries.items():
+        if method == "GET" and path in ("/site/", "/domain/", "/fileleak/"):
+            for key, value in json.loads(query):
+                if key == "size":
+                    return int(value)
+    return 500
+
+
+def recorded_targets(capture):
+    """每个灯塔录制时提交的目标 {别名: [目标]}"""
+    targets = {}
+    for (alias, method, path, _), entries in capture.entries.items():
+        if method == "POST" and path == "/task/":
+            for entry in entries:
+                target = (entry.get("request") or {}).get("target")
+                if target:
+                    targets.setdefault(alias, []).append(target)
+    return targets
+
+
+def replay(args):
+    capture = ReplayCapture(args.capture)
+    targets = recorded_targets(capture)
+    args.page_size = recorded_page_size(capture)
+    app_path = tempfile.mkdtemp(prefix="dtgo-replay-")
+    write_bench_config(app_path, args, {
+        "capture_mode": "replay",
+        "capture_file": os.path.abspath(args.capture),
+        "replay_speed": args.speed,
+    })
+    listener = BenchListener()
+    engine = Engine(Config(write_behind=True, app_path=app_path), listener)
+    if args.no_cache:
+        engine.result_cache = None  # 导出时从（回放的）灯塔重新获取结果
+    result = {"capture": args.capture, "beacons": len(capture.beacons), "targets": sum(map(len, targets.values()))}
+    try:
+        for alias in capture.beacons:
+            engine.add_beacon({"target": f"{REPLAY_HOST}/{alias}", "token": "REDACTED"})
+        engine.start()
+        # 目标按录制时的灯塔提交，每个灯塔的请求序列与录制时一致
+        start = time.monotonic()
+        for alias, beacon_targets in targets.items():
+            beacon = f"{REPLAY_HOST}/{alias}"
+            engine.enqueue({beacon: beacon_targets}, [beacon])
+        engine.wait_idle(args.timeout)
+        monitor_seconds = time.monotonic() - start
+        result.update({
+            "tasks_completed": len(listener.completed),
+            "monitor_s": round(monitor_seconds, 3),
+            "rows": listener.rows,
+            "ingest_rows_per_s": round(listener.rows / monitor_seconds, 1) if monitor_seconds else None,
+            "task_latency_s": summarize([seen - listener.created[key] for key, seen in listener.completed.items()]),
+        })
+
+        # 导出所有完成的任务，测量获取（或读取缓存）和写入文件的速度
+        output = os.path.join(app_path, f"export{args.export_format}")
+        exporter = engine.create_exporter(sorted(listener.completed), BackgroundWriter(create_export_writer(output)))
+        start = time.monotonic()
+        exported = exporter.run()
+        export_seconds = time.monotonic() - start
+        output_bytes = sum(
+            os.path.getsize(os.path.join(app_path, name)) for name in os.listdir(app_path)
+            if name.startswith("export")
+        )
+        result.update({
+            "exported_tasks": exported,
+            "export_cached_tasks": exporter.cached_tasks,
+            "export_s": round(export_seconds, 3),
+            "export_rows_per_s": round(exporter.rows / export_seconds, 1) if export_seconds else None,
+            "export_mb": round(output_bytes / (1024 * 1024), 2),
+            "client_requests": sum(stats["requests"] for stats in get_all_client_stats()),
+            "engine_errors": listener.errors,
+        })
+    finally:
+        engine.shutdown()
+        shutil.rmtree(app_path, ignore_errors=True)
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="DTGO 录制流量回放压测")
+    parser.add_argument("capture", help="录制文件（.jsonl 或 .jsonl.gz）")
+    parser.add_argument("--speed", type=float, default=0.0, help="模拟录制耗时的倍速，0 表示不等待")
+    parser.add_argument("--no-cache", action="store_true", help="导出时不使用本地结果缓存")
+    parser.add_argument("--export-format", default=".csv.gz", help="导出文件扩展名，如 .xlsx/.csv.gz/.jsonl")
+    parser.add_argument("--repeat", type=int, default=1, help="回放次数")
+    parser.add_argument("--record-mock", action="store_true", help="先从本地模拟灯塔录制到 capture 文件")
+    parser.add_argument("--beacons", type=int, default=3, help="--record-mock 时模拟的灯塔数")
+    parser.add_argument("--output", default="replay_results.json")
+    add_fleet_arguments(parser)
+    parser.set_defaults(poll_interval=0.2)
+    args = parser.parse_args(argv)
+
+    if args.record_mock:
+        if os.path.exists(args.capture):
+            os.remove(args.capture)
+        recorded = run_fleet(args.beacons, args, mock_options_from_args(args), {
+            "capture_mode": "record",
+            "capture_file": os.path.abspath(args.capture),
+        })
+        print(f"已录制 {recorded['tasks_completed']} 个任务到 {args.capture}", file=sys.stderr)
+
+    runs = []
+    for _ in range(args.repeat):
+        result = replay(args)
+        runs.append(result)
+        print(
+            f"{result['tasks_completed']}/{result['targets']} 任务  监控 {result['monitor_s']:.2f}s  "
+            f"接收 {result['ingest_rows_per_s']} 行/s  导出 {result['export_s']:.2f}s "
+            f"({result['export_rows_per_s']} 行/s，{result['export_cached_tasks']} 个来自缓存)  "
+            f"RSS {result['peak_rss_mb']}MB",
+            file=sys.stderr
+        )
+    save_report(args.output, args, runs)
+
+
+if __name__ == "__main__":
+    main()
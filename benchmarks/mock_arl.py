@@ -0,0 +1,345 @@
+"""本地模拟 ARL 灯塔，实现 DTGO 用到的接口，用于压测和调试
+
+一个进程可以模拟多个灯塔，每个灯塔使用独立的路径前缀（/b0、/b1 ...），
+DTGO 中的灯塔地址写成 http://127.0.0.1:端口/b0 即可
+
+    python benchmarks/mock_arl.py --beacons 3 --task-duration 30 --latency 0.05
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# 默认模拟参数，可以在创建服务器时覆盖
+DEFAULT_MOCK_OPTIONS = {
+    "latency": 0.0,          # 每个请求的固定延迟（秒）
+    "latency_jitter": 0.0,   # 额外的随机延迟上限（秒）
+    "error_rate": 0.0,       # 返回 HTTP 500 的请求比例
+    "token_ttl": 0.0,        # token 有效期（秒），过期后接口返回业务码 401，0 表示不过期
+    "task_duration": 10.0,   # 任务从提交到完成的时长（秒）
+    "duration_jitter": 0.0,  # 任务时长的随机浮动比例
+    "sites": 200,            # 每个任务的站点数
+    "domains": 500,          # 每个任务的子域名数
+    "leaks": 20,             # 每个任务的信息泄露数
+    "username": "admin",
+    "password": "arlpass",
+}
+
+# 任务依次经过的扫描阶段，运行中任务的状态为当前阶段
+TASK_PHASES = [
+    "domain_brute",
+    "arl_search",
+    "dns_query_plugin",
+    "port_scan",
+    "service_detection",
+    "fetch_site",
+    "site_identify",
+    "file_leak",
+]
+
+# 列表接口默认的排序，与 ARL 一致按 _id 倒序（最新的在前），可以用 order=_id 指定升序
+DEFAULT_ORDER = "-_id"
+
+# 结果接口路径 -> (模拟参数中的数量字段, 生成记录的函数)
+RESULT_ENDPOINTS = {
+    "site": ("sites", lambda task, i: {
+        "_id": f"{task['_id']}s{i:08d}",
+        "site": f"http://s{i}.{task['target']}",
+        "title": f"site {i}",
+        "ip": f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}",
+        "http_server": "nginx",
+        "finger": [{"name": "nginx", "version": "1.24"}],
+        "task_id": task["_id"],
+    }),
+    "domain": ("domains", lambda task, i: {
+        "_id": f"{task['_id']}d{i:08d}",
+        "domain": f"d{i}.{task['target']}",
+        "type": "A",
+        "record": [f"10.0.{i >> 8 & 255}.{i & 255}"],
+        "ips": [f"10.0.{i >> 8 & 255}.{i & 255}"],
+        "task_id": task["_id"],
+    }),
+    "fileleak": ("leaks", lambda task, i: {
+        "_id": f"{task['_id']}f{i:08d}",
+        "url": f"http://s{i}.{task['target']}/.git/config",
+        "title": "git config",
+        "task_id": task["_id"],
+    }),
+}
+
+
+def is_descending(order):
+    return (order or DEFAULT_ORDER).startswith("-")
+
+
+class MockBeacon:
+    """单个模拟灯塔的任务、token 和请求计数"""
+
+    def __init__(self, name, options):
+        self.name = name
+        self.options = options
+        self.lock = threading.Lock()
+        self.tasks = {}     # {task_id: 任务}，按提交顺序
+        self.tokens = {}    # {token: 签发时间}
+        self.counters = {}  # {接口: 请求数}
+        # 任务 ID 与 ARL 的 ObjectId 一样以创建时间开头，按 ID 排序即按创建顺序
+        self.id_prefix = uuid.uuid4().hex[:10]
+        self.id_counter = 0
+
+    def count(self, endpoint):
+        with self.lock:
+            self.counters[endpoint] = self.counters.get(endpoint, 0) + 1
+
+    def login(self, body):
+        if body.get("username") != self.options["username"] or body.get("password") != self.options["password"]:
+            return {"code": 401, "message": "用户名或密码错误"}
+        token = uuid.uuid4().hex
+        with self.lock:
+            self.tokens[token] = time.time()
+        return {"code": 200, "data": {"token": token}}
+
+    def token_valid(self, token):
+        with self.lock:
+            issued = self.tokens.get(token)
+        if issued is None:
+            return False
+        ttl = self.options["token_ttl"]
+        return not ttl or time.time() - issued < ttl
+
+    def expire_tokens(self):
+        """让已签发的 token 全部失效，模拟灯塔重启"""
+        with self.lock:
+            self.tokens.clear()
+
+    def create_task(self, body):
+        now = time.time()
+        duration = self.options["task_duration"]
+        jitter = self.options["duration_jitter"]
+        if jitter:
+            duration *= 1 + random.uniform(-jitter, jitter)
+        with self.lock:
+            self.id_counter += 1
+            task_id = f"{int(now):08x}{self.id_prefix}{self.id_counter:06x}"
+            self.tasks[task_id] = {
+                "_id": task_id,
+                "name": body.get("name", ""),
+                "target": body.get("target", ""),
+                "start_time": now,
+                "duration": duration,
+            }
+        return {"code": 200, "items": [{"task_id": task_id, "target": body.get("target", "")}]}
+
+    def delete_tasks(self, body):
+        with self.lock:
+            for task_id in body.get("task_id", []):
+                self.tasks.pop(task_id, None)
+        return {"code": 200, "message": "success"}
+
+    def progress(self, task, now=None):
+        now = time.time() if now is None else now
+        if task["duration"] <= 0:
+            return 1.0
+        return min(max((now - task["start_time"]) / task["duration"], 0.0), 1.0)
+
+    def task_view(self, task, now=None):
+        """接口返回的任务信息，状态和已完成阶段按任务已运行的比例计算"""
+        progress = self.progress(task, now)
+        finished = int(progress * len(TASK_PHASES))
+        done = progress >= 1.0
+        return {
+            "_id": task["_id"],
+            "name": task["name"],
+            "target": task["target"],
+            "status": "done" if done else TASK_PHASES[finished],
+            "service": [{"name": phase, "elapsed": 1.0} for phase in TASK_PHASES[:finished]],
+            "start_time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(task["start_time"])),
+            "end_time": (
+                time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(task["start_time"] + task["duration"]))
+                if done else "-"
+            ),
+        }
+
+    def list_tasks(self, page, size, order=None):
+        # 与 ARL 一致，默认新提交的任务排在前面
+        now = time.time()
+        with self.lock:
+            tasks = list(self.tasks.values())
+        if is_descending(order):
+            tasks.reverse()
+        items = [self.task_view(task, now) for task in tasks[(page - 1) * size:page * size]]
+        return {"code": 200, "items": items, "total": len(tasks), "page": page, "size": size}
+
+    def get_task(self, task_id):
+        with self.lock:
+            task = self.tasks.get(task_id)
+        if task is None:
+            return {"code": 404, "message": "任务不存在"}
+        return {"code": 200, "data": self.task_view(task)}
+
+    def list_results(self, endpoint, query):
+        """结果随任务进度逐渐增加，任务完成时达到配置的数量，默认最新写入的结果排在前面"""
+        field, make_item = RESULT_ENDPOINTS[endpoint]
+        page = int(query.get("page", 1))
+        size = int(query.get("size", 10))
+        with self.lock:
+            task = self.tasks.get(query.get("task_id"))
+        if task is None:
+            return {"code": 200, "items": [], "total": 0, "page": page, "size": size}
+        total = int(self.options[field] * self.progress(task))
+        start = (page - 1) * size
+        positions = range(start, min(start + size, total))
+        if is_descending(query.get("order")):
+            items = [make_item(task, total - 1 - position) for position in positions]
+        else:
+            items = [make_item(task, position) for position in positions]
+        return {"code": 200, "items": items, "total": total, "page": page, "size": size}
+
+    def stats(self):
+        with self.lock:
+            return {"tasks": len(self.tasks), "requests": dict(self.counters)}
+
+
+class MockRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # 支持长连接，与真实灯塔一致
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, obj):
+        body = json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError:
+            return {}
+
+    def do_GET(self):
+        self.dispatch("GET", {})
+
+    def do_POST(self):
+        self.dispatch("POST", self.read_body())
+
+    def dispatch(self, method, body):
+        url = urlparse(self.path)
+        prefix, sep, path = url.path.partition("/api/")
+        beacon = self.server.beacons.get(prefix.strip("/")) if sep else None
+        if beacon is None:
+            self.send_json(404, {"code": 404, "message": "not found"})
+            return
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        parts = [part for part in path.split("/") if part]
+        endpoint = parts[0] if parts else ""
+        if endpoint == "task" and len(parts) > 1 and parts[1] != "delete":
+            beacon.count("GET /task/{id}")
+        else:
+            beacon.count(f"{method} /{'/'.join(parts)}")
+
+        options = beacon.options
+        delay = options["latency"] + random.uniform(0, options["latency_jitter"])
+        if delay > 0:
+            time.sleep(delay)
+        if options["error_rate"] and random.random() < options["error_rate"]:
+            self.send_json(500, {"code": 500, "message": "模拟的服务器错误"})
+            return
+
+        if endpoint == "user" and parts[1:] == ["login"] and method == "POST":
+            self.send_json(200, beacon.login(body))
+            return
+        if not beacon.token_valid(self.headers.get("Token", "")):
+            self.send_json(200, {"code": 401, "message": "token 已过期"})
+            return
+        if endpoint == "task":
+            if method == "POST" and len(parts) == 1:
+                result = beacon.create_task(body)
+            elif method == "POST" and parts[1:] == ["delete"]:
+                result = beacon.delete_tasks(body)
+            elif len(parts) == 1:
+                result = beacon.list_tasks(int(query.get("page", 1)), int(query.get("size", 10)), query.get("order"))
+            else:
+                result = beacon.get_task(parts[1])
+        elif endpoint in RESULT_ENDPOINTS:
+            result = beacon.list_results(endpoint, query)
+        else:
+            self.send_json(404, {"code": 404, "message": "not found"})
+            return
+        self.send_json(200, result)
+
+
+class MockARLServer(ThreadingHTTPServer):
+    """在后台线程中运行的模拟灯塔集群，beacon_count 个灯塔共享一个端口"""
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, beacon_count=1, options=None, host="127.0.0.1", port=0):
+        super().__init__((host, port), MockRequestHandler)
+        self.options = dict(DEFAULT_MOCK_OPTIONS)
+        if options:
+            self.options.update(options)
+        self.beacons = {f"b{i}": MockBeacon(f"b{i}", self.options) for i in range(beacon_count)}
+        self.thread = None
+
+    @property
+    def targets(self):
+        """DTGO 中使用的灯塔地址"""
+        host, port = self.server_address[:2]
+        return [f"http://{host}:{port}/{name}" for name in self.beacons]
+
+    def beacon(self, target):
+        return self.beacons[target.rstrip("/").rsplit("/", 1)[-1]]
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, name="mock-arl", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self.thread:
+            self.thread.join()
+
+    def request_counts(self):
+        """所有灯塔合计的各接口请求数"""
+        totals = {}
+        for beacon in self.beacons.values():
+            for endpoint, count in beacon.stats()["requests"].items():
+                totals[endpoint] = totals.get(endpoint, 0) + count
+        return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="本地模拟 ARL 灯塔")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5003)
+    parser.add_argument("--beacons", type=int, default=1, help="模拟的灯塔数量")
+    for key, value in DEFAULT_MOCK_OPTIONS.items():
+        parser.add_argument(f"--{key.replace('_', '-')}", type=type(value), default=value)
+    args = parser.parse_args(argv)
+    options = {key: getattr(args, key) for key in DEFAULT_MOCK_OPTIONS}
+    server = MockARLServer(args.beacons, options, args.host, args.port)
+    for target in server.targets:
+        print(target)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
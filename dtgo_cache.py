@@ -0,0 +1,177 @@
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+# 默认缓存配置，可以通过配置文件中的 "cache" 覆盖
+DEFAULT_CACHE_OPTIONS = {
+    "max_mb": 512,        # 缓存目录的最大占用（MB），超过后删除最久未使用的任务
+    "read_batch": 1000,   # 从缓存读取时每批返回的记录数
+}
+
+CACHE_SUFFIX = ".jsonl.gz"
+
+
+class CacheEntryWriter:
+    """逐批写入一个任务的结果，commit 后才对读取可见，abort 时丢弃"""
+
+    def __init__(self, cache, beacon, task_id):
+        self.cache = cache
+        self.beacon = beacon
+        self.task_id = task_id
+        fd, self.temp_file = tempfile.mkstemp(prefix=".entry.", suffix=".tmp", dir=cache.directory)
+        os.close(fd)
+        self.file = gzip.open(self.temp_file, "wt", encoding="utf-8", compresslevel=6)
+        self.closed = False
+
+    def write(self, result_type, items):
+        for item in items:
+            self.file.write(json.dumps([result_type, item], ensure_ascii=False, default=str))
+            self.file.write("\n")
+
+    def commit(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.file.close()
+        self.cache.add_file(self.beacon, self.task_id, self.temp_file)
+
+    def abort(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.file.close()
+        finally:
+            if os.path.exists(self.temp_file):
+                os.remove(self.temp_file)
+
+
+class ResultCache:
+    """已完成任务结果的本地缓存，按 (beacon, task_id) 保存为 gzip 压缩的 JSON Lines 文件
+
+    已完成任务的结果不会再变化，导出和查看时直接从本地读取；
+    目录总大小超过上限时按最近使用时间淘汰，任务删除时同时删除缓存
+    """
+
+    def __init__(self, directory, options=None):
+        self.options = dict(DEFAULT_CACHE_OPTIONS)
+        if options:
+            self.options.update(options)
+        self.directory = directory
+        self.max_bytes = int(self.options["max_mb"] * 1024 * 1024)
+        self.lock = threading.Lock()
+        self.entries = {}  # {文件名: [大小, 最近使用时间]}
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        for entry in os.scandir(directory):
+            if entry.name.endswith(CACHE_SUFFIX):
+                stat = entry.stat()
+                self.entries[entry.name] = [stat.st_size, stat.st_mtime]
+                self.total_bytes += stat.st_size
+            elif entry.name.endswith(".tmp"):
+                # 上次异常退出时留下的未完成文件
+                os.remove(entry.path)
+
+    @staticmethod
+    def entry_name(beacon, task_id):
+        digest = hashlib.sha1(f"{beacon}\n{task_id}".encode("utf-8")).hexdigest()
+        return digest + CACHE_SUFFIX
+
+    def contains(self, beacon, task_id):
+        with self.lock:
+            return self.entry_name(beacon, task_id) in self.entries
+
+    def open_writer(self, beacon, task_id):
+        return CacheEntryWriter(self, beacon, task_id)
+
+    def add_file(self, beacon, task_id, temp_file):
+        """把写好的临时文件放入缓存，然后按大小上限淘汰旧条目"""
+        name = self.entry_name(beacon, task_id)
+        size = os.path.getsize(temp_file)
+        with self.lock:
+            os.replace(temp_file, os.path.join(self.directory, name))
+            old = self.entries.get(name)
+            if old:
+                self.total_bytes -= old[0]
+            self.entries[name] = [size, time.time()]
+            self.total_bytes += size
+            self.evict(keep=name)
+
+    def evict(self, keep=None):
+        """删除最久未使用的条目，直到总大小不超过上限（调用方持有锁）"""
+        if self.total_bytes <= self.max_bytes:
+            return
+        for name, (size, _) in sorted(self.entries.items(), key=lambda entry: entry[1][1]):
+            if self.total_bytes <= self.max_bytes:
+                break
+            if name == keep:
+                continue
+            self.remove_entry(name)
+
+    def remove_entry(self, name):
+        size, _ = self.entries.pop(name)
+        self.total_bytes -= size
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except OSError:
+            # 文件正在被读取（Windows）或已被删除，下次启动时重新计入
+            pass
+
+    def iter_results(self, beacon, task_id):
+        """逐批读取缓存的结果，每次返回 (结果类型, 记录列表)；没有缓存时返回 None"""
+        name = self.entry_name(beacon, task_id)
+        with self.lock:
+            entry = self.entries.get(name)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            entry[1] = time.time()
+            path = os.path.join(self.directory, name)
+            try:
+                os.utime(path)
+                # 打开后即使被淘汰也能继续读完
+                f = gzip.open(path, "rt", encoding="utf-8")
+            except FileNotFoundError:
+                self.entries.pop(name)
+                self.total_bytes -= entry[0]
+                return None
+        return self._read_batches(f)
+
+    def _read_batches(self, f):
+        batch_size = self.options["read_batch"]
+        with f:
+            current_type = None
+            batch = []
+            for line in f:
+                result_type, item = json.loads(line)
+                if result_type != current_type or len(batch) >= batch_size:
+                    if batch:
+                        yield current_type, batch
+                    current_type = result_type
+                    batch = []
+                batch.append(item)
+            if batch:
+                yield current_type, batch
+
+    def invalidate(self, beacon, task_id):
+        with self.lock:
+            name = self.entry_name(beacon, task_id)
+            if name in self.entries:
+                self.remove_entry(name)
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses
+            }
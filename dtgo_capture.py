@@ -0,0 +1,252 @@
+"""灯塔请求的录制和回放
+
+录制模式下客户端照常访问灯塔，同时把脱敏后的请求和响应（含耗时）写入 JSON Lines 文件；
+回放模式下不访问网络，按录制顺序返回相同请求的响应并模拟录制时的耗时，
+用真实形态的数据（大量指纹、长标题、多 IP 的子域名）重复测试监控、结果收集和导出的性能
+
+脱敏：不保存请求头，登录请求的账号密码和返回的 token 替换为占位符，
+灯塔地址替换为按出现顺序编号的别名（b0、b1 ...）
+"""
+import gzip
+import json
+import threading
+import time
+from urllib.parse import urlsplit, parse_qsl
+
+from requests import Response
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+REDACTED = "REDACTED"
+
+
+def open_capture_file(path, mode):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def request_key(base_url, request):
+    """请求在录制文件中的位置：(方法, 相对接口地址的路径, 排序后的查询参数)"""
+    base_path = urlsplit(base_url).path.rstrip("/")
+    url = urlsplit(request.url)
+    path = url.path[len(base_path):] if url.path.startswith(base_path) else url.path
+    query = sorted(parse_qsl(url.query, keep_blank_values=True))
+    return request.method, path, [list(pair) for pair in query]
+
+
+def sanitize_request_body(path, body):
+    if not body:
+        return None
+    try:
+        data = json.loads(body)
+    except (TypeError, ValueError):
+        return None
+    if path.startswith("/user/login") and isinstance(data, dict):
+        data = {key: REDACTED for key in data}
+    return data
+
+
+def sanitize_response_text(path, text, host, alias):
+    if host:
+        text = text.replace(host, alias)
+    if path.startswith("/user/login"):
+        try:
+            data = json.loads(text)
+        except ValueError:
+            return text
+        if isinstance(data.get("data"), dict) and "token" in data["data"]:
+            data["data"]["token"] = REDACTED
+            text = json.dumps(data, ensure_ascii=False)
+    return text
+
+
+class CaptureRecorder:
+    """多个灯塔客户端共享的录制文件，每行一个请求"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = open_capture_file(path, "a")
+        self.aliases = {}  # {灯塔地址: 别名}
+        self.count = 0
+
+    def alias_for(self, target):
+        with self.lock:
+            if target not in self.aliases:
+                self.aliases[target] = f"b{len(self.aliases)}"
+            return self.aliases[target]
+
+    def write(self, entry):
+        line = json.dumps(entry, ensure_ascii=False)
+        with self.lock:
+            if self.file is None:
+                return
+            self.file.write(line)
+            self.file.write("\n")
+            self.count += 1
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+class ReplayCapture:
+    """加载录制文件，同一请求按录制顺序依次返回，录制的响应用完后重复最后一个"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {}  # {(别名, 方法, 路径, 查询参数): [记录]}
+        self.cursors = {}
+        self.beacons = []  # 录制文件中的灯塔别名，按出现顺序
+        self.assigned = {}  # {灯塔地址: 别名}
+        with open_capture_file(path, "r") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                key = (entry["beacon"], entry["method"], entry["path"], json.dumps(entry["query"]))
+                self.entries.setdefault(key, []).append(entry)
+                if entry["beacon"] not in self.beacons:
+                    self.beacons.append(entry["beacon"])
+
+    def alias_for(self, target):
+        """灯塔地址以别名结尾（如 http://replay/b0）时使用该别名，否则按顺序分配"""
+        with self.lock:
+            if target in self.assigned:
+                return self.assigned[target]
+            name = target.rstrip("/").rsplit("/", 1)[-1]
+            if name in self.beacons:
+                alias = name
+            elif self.beacons:
+                alias = self.beacons[len(self.assigned) % len(self.beacons)]
+            else:
+                alias = "b0"
+            self.assigned[target] = alias
+            return alias
+
+    def next_entry(self, alias, method, path, query):
+        key = (alias, method, path, json.dumps(query))
+        with self.lock:
+            entries = self.entries.get(key)
+            if not entries:
+                return None
+            index = self.cursors.get(key, 0)
+            self.cursors[key] = index + 1
+            return entries[min(index, len(entries) - 1)]
+
+
+class RecordingAdapter(HTTPAdapter):
+    """正常发送请求，并把脱敏后的请求和响应写入录制文件"""
+
+    def __init__(self, recorder, base_url, alias, **kwargs):
+        super().__init__(**kwargs)
+        self.recorder = recorder
+        self.base_url = base_url
+        self.host = urlsplit(base_url).netloc
+        self.alias = alias
+
+    def send(self, request, **kwargs):
+        start = time.monotonic()
+        response = super().send(request, **kwargs)
+        text = response.content.decode(response.encoding or "utf-8", errors="replace")
+        elapsed = time.monotonic() - start
+        method, path, query = request_key(self.base_url, request)
+        self.recorder.write({
+            "beacon": self.alias,
+            "method": method,
+            "path": path,
+            "query": query,
+            "request": sanitize_request_body(path, request.body),
+            "status": response.status_code,
+            "content_type": response.headers.get("Content-Type", "application/json"),
+            "body": sanitize_response_text(path, text, self.host, self.alias),
+            "elapsed": round(elapsed, 6),
+        })
+        return response
+
+
+class ReplayAdapter(HTTPAdapter):
+    """不访问网络，从录制文件返回响应，按 speed 倍速模拟录制时的耗时（speed 为 0 时不等待）"""
+
+    def __init__(self, capture, base_url, alias, speed=1.0, **kwargs):
+        super().__init__(**kwargs)
+        self.capture = capture
+        self.base_url = base_url
+        self.alias = alias
+        self.speed = speed
+
+    def send(self, request, **kwargs):
+        method, path, query = request_key(self.base_url, request)
+        entry = self.capture.next_entry(self.alias, method, path, query)
+        if entry is None and method == "GET" and any(key == "page" for key, _ in query):
+            # 回放时的轮询节奏与录制时不同，游标可能停在录制中没有请求过的页，与灯塔一样返回空页
+            status, content_type, body, elapsed = 200, "application/json", json.dumps(
+                {"code": 200, "items": [], "total": 0}
+            ), 0
+        elif entry is None:
+            status, content_type, body, elapsed = 404, "application/json", json.dumps(
+                {"code": 404, "message": f"未录制的请求: {method} {path}"}, ensure_ascii=False
+            ), 0
+        else:
+            status, content_type, body, elapsed = (
+                entry["status"], entry["content_type"], entry["body"], entry["elapsed"]
+            )
+        if self.speed and elapsed:
+            time.sleep(elapsed / self.speed)
+        response = Response()
+        response.status_code = status
+        response.headers = CaseInsensitiveDict({"Content-Type": content_type})
+        response._content = body.encode("utf-8")
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        response.reason = "OK" if status == 200 else ""
+        return response
+
+
+# 录制文件和回放文件按路径共享，所有灯塔写入同一个文件
+_recorders = {}
+_replays = {}
+_captures_lock = threading.Lock()
+
+
+def get_recorder(path):
+    with _captures_lock:
+        recorder = _recorders.get(path)
+        if recorder is None:
+            recorder = _recorders[path] = CaptureRecorder(path)
+        return recorder
+
+
+def get_replay(path):
+    with _captures_lock:
+        capture = _replays.get(path)
+        if capture is None:
+            capture = _replays[path] = ReplayCapture(path)
+        return capture
+
+
+def create_adapter(options, target, base_url, **kwargs):
+    """按客户端配置中的 capture_mode 创建连接适配器，record 为录制，replay 为回放，否则为普通连接"""
+    mode = options.get("capture_mode")
+    if mode == "record":
+        recorder = get_recorder(options["capture_file"])
+        return RecordingAdapter(recorder, base_url, recorder.alias_for(target), **kwargs)
+    if mode == "replay":
+        capture = get_replay(options["capture_file"])
+        return ReplayAdapter(capture, base_url, capture.alias_for(target), options.get("replay_speed", 1.0), **kwargs)
+    return HTTPAdapter(**kwargs)
+
+
+def close_captures():
+    """关闭所有录制文件，回放文件在下次使用时重新加载"""
+    with _captures_lock:
+        recorders = list(_recorders.values())
+        _recorders.clear()
+        _replays.clear()
+    for recorder in recorders:
+        recorder.close()
@@ -0,0 +1,333 @@
+"""DTGO 命令行入口，不依赖 PyQt，可在服务器上直接运行或作为守护进程常驻
+
+用法示例:
+    python dtgo_cli.py beacons
+    python dtgo_cli.py add-beacon http://1.2.3.4:5003 -u admin -p arlpass
+    python dtgo_cli.py submit example.com test.com --wait --output results.csv.gz
+    python dtgo_cli.py tasks --refresh
+    python dtgo_cli.py export results.jsonl --dedup
+    python dtgo_cli.py daemon --watch ./targets
+    python dtgo_cli.py --profile ./profile --profiler sample submit example.com --wait
+"""
+import argparse
+import os
+import signal
+import sys
+import threading
+import time
+
+# 等待目标文件时的扫描间隔（秒）
+WATCH_INTERVAL = 5
+
+
+class PrintListener:
+    """实现 EngineListener 的回调，把引擎事件打印到标准错误，verbose 为 False 时不打印任务进度"""
+
+    def __init__(self, verbose=False):
+        self.verbose = verbose
+        self.lock = threading.Lock()
+        self.created_tasks = []  # [(beacon, task_id)]，本次运行中创建的任务
+
+    def echo(self, message):
+        with self.lock:
+            print(message, file=sys.stderr, flush=True)
+
+    def on_message(self, beacon, message):
+        self.echo(message)
+
+    def on_error(self, beacon, message):
+        self.echo(f"[错误] {message}")
+
+    def on_progress(self, beacon, task_id, message):
+        if self.verbose:
+            self.echo(message)
+
+    def on_results(self, beacon, task_id, result_type, items, is_final):
+        pass
+
+    def on_task_created(self, beacon, task_id, target):
+        with self.lock:
+            self.created_tasks.append((beacon, task_id))
+        self.echo(f"已在灯塔 {beacon} 创建任务 {task_id}: {target}")
+
+    def on_task_completed(self, beacon, task_id):
+        self.echo(f"灯塔 {beacon} 的任务 {task_id} 已结束")
+
+    def on_task_status(self, beacon, task_id, status):
+        self.echo(f"灯塔 {beacon} 的任务 {task_id}: {status}")
+
+    def on_token_expired(self, beacon):
+        self.echo(f"灯塔 {beacon} 的 token 已过期且重新登录失败，已移除")
+
+    def on_token_refreshed(self, beacon, token):
+        pass
+
+    def on_worker_finished(self, beacon):
+        pass
+
+    def on_export_progress(self, done, total, message):
+        if self.verbose:
+            self.echo(f"[{done}/{total}] {message}")
+
+
+def open_engine(args):
+    # 引擎和配置只在需要时导入，--help 不加载 HTTP 客户端和数据库
+    from dtgo_config import Config
+    from dtgo_engine import Engine
+    listener = PrintListener(args.verbose)
+    config = Config(write_behind=True)
+    if args.profile:
+        # 命令行指定时覆盖配置文件中的剖析设置，引擎关闭时写入结果
+        from dtgo_profile import start_profiling
+        options = dict(config.get_profile_options(), enabled=True, output_dir=args.profile)
+        if args.profiler:
+            options["profiler"] = args.profiler
+        start_profiling(options)
+    return Engine(config, listener), listener
+
+
+def read_targets(args):
+    targets = list(args.targets)
+    if args.file:
+        with open(args.file, encoding="utf-8") as f:
+            targets.extend(f.read().splitlines())
+    return [target.strip() for target in targets if target.strip()]
+
+
+def parse_task_keys(engine, values):
+    """把 beacon/task_id 或 task_id 解析为 (beacon, task_id)，只给出 task_id 时在所有灯塔的记录中查找"""
+    keys = []
+    for value in values:
+        beacon, _, task_id = value.rpartition("/")
+        if beacon and beacon in engine.task_records:
+            keys.append((beacon, task_id))
+            continue
+        matched = [(beacon, value) for beacon, tasks in engine.task_records.items() if value in tasks]
+        if not matched:
+            print(f"未找到任务 {value}", file=sys.stderr)
+        keys.extend(matched)
+    return keys
+
+
+def export_tasks(engine, tasks, output, dedup=False):
+    """导出 tasks 的结果到 output，dedup 时从本地结果库读取去重结果，返回导出数量"""
+    from dtgo_export import BackgroundWriter, create_export_writer
+    # 写入和压缩在单独的线程中进行，不阻塞获取结果
+    writer = BackgroundWriter(create_export_writer(output))
+    if dedup:
+        exporter = engine.create_warehouse_exporter(tasks, writer)
+    else:
+        exporter = engine.create_exporter(tasks, writer)
+    return exporter.run()
+
+
+def cmd_beacons(engine, listener, args):
+    from dtgo_planner import get_cost_model, format_duration
+    for beacon in engine.beacons:
+        model = get_cost_model(beacon)
+        print(
+            f"{beacon}\t并发 {engine.queue.get_limit(beacon)}\t"
+            f"任务时长 {format_duration(model.expected_duration())}（{model.samples} 个样本）"
+        )
+    return 0
+
+
+def cmd_add_beacon(engine, listener, args):
+    if args.address in engine.beacons:
+        print(f"灯塔 {args.address} 已在列表中", file=sys.stderr)
+        return 1
+    try:
+        if not engine.login_beacon(args.address, args.username, args.password):
+            print("用户名或密码错误", file=sys.stderr)
+            return 1
+    except Exception as e:
+        print(f"无法连接到灯塔: {str(e)}", file=sys.stderr)
+        return 1
+    print(f"已添加灯塔 {args.address}")
+    return 0
+
+
+def cmd_remove_beacon(engine, listener, args):
+    for beacon in args.beacons:
+        engine.remove_beacon(beacon)
+    return 0
+
+
+def cmd_limit(engine, listener, args):
+    engine.set_beacon_limit(args.beacons, args.limit)
+    return 0
+
+
+def cmd_submit(engine, listener, args):
+    targets = read_targets(args)
+    if not targets:
+        print("没有输入目标", file=sys.stderr)
+        return 1
+    beacons = args.beacon or list(engine.beacons)
+    unknown = [beacon for beacon in beacons if beacon not in engine.beacons]
+    if unknown:
+        print(f"未登录的灯塔: {', '.join(unknown)}", file=sys.stderr)
+        return 1
+    if not beacons:
+        print("没有可用的灯塔", file=sys.stderr)
+        return 1
+    engine.start()
+    assignments = engine.submit(targets, beacons)
+    for beacon, beacon_targets in assignments.items():
+        if beacon_targets:
+            print(f"{beacon}: {len(beacon_targets)} 个目标", file=sys.stderr)
+    if not (args.wait or args.output):
+        # 不等待时进程退出会停止任务线程，只等待所有目标提交到灯塔
+        while engine.queue.has_work() and not engine.is_idle():
+            time.sleep(0.2)
+        return 0
+    engine.wait_idle()
+    if args.output:
+        count = export_tasks(engine, listener.created_tasks, args.output)
+        print(f"已导出 {count} 个任务的结果到 {args.output}", file=sys.stderr)
+    return 0
+
+
+def cmd_tasks(engine, listener, args):
+    if args.refresh:
+        # 查询运行中的历史任务是否已结束
+        for beacon, task_ids in engine.running_tasks().items():
+            if beacon in engine.beacons:
+                try:
+                    engine.check_beacon_tasks(beacon, task_ids)
+                except Exception as e:
+                    print(f"检查灯塔 {beacon} 任务状态失败: {str(e)}", file=sys.stderr)
+    for beacon, tasks in engine.task_records.items():
+        for task_id, status in tasks.items():
+            if args.running and status != "运行中":
+                continue
+            print(f"{beacon}/{task_id}\t{status}")
+    return 0
+
+
+def cmd_export(engine, listener, args):
+    if args.tasks:
+        tasks = parse_task_keys(engine, args.tasks)
+    elif args.dedup:
+        tasks = None  # 去重导出时读取结果库中的全部记录
+    else:
+        tasks = [
+            (beacon, task_id) for beacon, records in engine.task_records.items()
+            for task_id, status in records.items() if status == "已结束"
+        ]
+    if tasks is not None and not args.dedup:
+        tasks = engine.exportable_tasks(tasks)
+    if tasks is not None and not tasks:
+        print("没有找到可导出的结果", file=sys.stderr)
+        return 1
+    count = export_tasks(engine, tasks, args.output, args.dedup)
+    unit = "条去重结果" if args.dedup else "个任务的结果"
+    print(f"已导出 {count} {unit}到 {args.output}", file=sys.stderr)
+    return 0 if count else 1
+
+
+def cmd_delete(engine, listener, args):
+    failed = 0
+    for beacon, task_id in parse_task_keys(engine, args.tasks):
+        if engine.delete_task(beacon, task_id):
+            print(f"已删除灯塔 {beacon} 的任务 {task_id}", file=sys.stderr)
+        else:
+            print(f"删除灯塔 {beacon} 的任务 {task_id} 失败", file=sys.stderr)
+            failed += 1
+    return 1 if failed else 0
+
+
+def cmd_daemon(engine, listener, args):
+    """常驻运行：监控历史任务状态，watch 目录中出现的 *.txt 目标文件提交后重命名为 .submitted"""
+    stop_event = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop_event.set())
+    engine.start()
+    print(f"守护进程已启动，{len(engine.beacons)} 个灯塔", file=sys.stderr)
+    while not stop_event.is_set():
+        if args.watch:
+            for name in sorted(os.listdir(args.watch)):
+                if not name.endswith(".txt"):
+                    continue
+                path = os.path.join(args.watch, name)
+                try:
+                    with open(path, encoding="utf-8") as f:
+                        targets = [line.strip() for line in f if line.strip()]
+                    os.replace(path, path + ".submitted")
+                except OSError as e:
+                    print(f"读取目标文件 {path} 失败: {str(e)}", file=sys.stderr)
+                    continue
+                assignments = engine.submit(targets, args.beacon)
+                if not assignments:
+                    print(f"{name}: 没有可用的灯塔", file=sys.stderr)
+                else:
+                    print(f"{name}: 已提交 {len(targets)} 个目标", file=sys.stderr)
+        stop_event.wait(WATCH_INTERVAL)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="dtgo", description="DTGO 灯塔任务管理命令行")
+    parser.add_argument("-v", "--verbose", action="store_true", help="显示任务进度")
+    parser.add_argument("--profile", metavar="DIR", help="记录各阶段耗时，退出时把 trace 和剖析结果写入目录")
+    parser.add_argument("--profiler", choices=["cprofile", "sample"], help="与 --profile 一起使用，按线程剖析的方式")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("beacons", help="列出已登录的灯塔").set_defaults(func=cmd_beacons)
+
+    add = commands.add_parser("add-beacon", help="登录并添加灯塔")
+    add.add_argument("address", help="灯塔地址，如 http://1.2.3.4:5003")
+    add.add_argument("-u", "--username", default="admin")
+    add.add_argument("-p", "--password", required=True)
+    add.set_defaults(func=cmd_add_beacon)
+
+    remove = commands.add_parser("remove-beacon", help="移除灯塔")
+    remove.add_argument("beacons", nargs="+")
+    remove.set_defaults(func=cmd_remove_beacon)
+
+    limit = commands.add_parser("limit", help="设置灯塔的并行任务数")
+    limit.add_argument("limit", type=int)
+    limit.add_argument("beacons", nargs="+")
+    limit.set_defaults(func=cmd_limit)
+
+    submit = commands.add_parser("submit", help="分配并提交目标")
+    submit.add_argument("targets", nargs="*", help="目标域名")
+    submit.add_argument("-f", "--file", help="从文件读取目标，每行一个")
+    submit.add_argument("-b", "--beacon", action="append", help="只使用指定的灯塔，可重复，默认使用所有灯塔")
+    submit.add_argument("-w", "--wait", action="store_true", help="等待所有任务结束")
+    submit.add_argument("-o", "--output", help="任务结束后导出结果到文件（隐含 --wait）")
+    submit.set_defaults(func=cmd_submit)
+
+    tasks = commands.add_parser("tasks", help="列出任务记录")
+    tasks.add_argument("--running", action="store_true", help="只列出运行中的任务")
+    tasks.add_argument("--refresh", action="store_true", help="先查询运行中任务的最新状态")
+    tasks.set_defaults(func=cmd_tasks)
+
+    export = commands.add_parser("export", help="导出任务结果")
+    export.add_argument("output", help="输出文件，格式由扩展名决定（.xlsx/.csv/.jsonl/.parquet/.feather，可加 .gz/.zst）")
+    export.add_argument("tasks", nargs="*", help="beacon/task_id 或 task_id，默认导出所有已结束的任务")
+    export.add_argument("--dedup", action="store_true", help="从本地结果库导出跨任务去重的结果")
+    export.set_defaults(func=cmd_export)
+
+    delete = commands.add_parser("delete", help="删除任务（同时删除灯塔上的任务数据）")
+    delete.add_argument("tasks", nargs="+", help="beacon/task_id 或 task_id")
+    delete.set_defaults(func=cmd_delete)
+
+    daemon = commands.add_parser("daemon", help="常驻运行，监控任务并提交目录中的目标文件")
+    daemon.add_argument("--watch", help="目标文件目录，其中的 *.txt 提交后重命名为 .submitted")
+    daemon.add_argument("-b", "--beacon", action="append", help="只使用指定的灯塔，可重复")
+    daemon.set_defaults(func=cmd_daemon)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    engine, listener = open_engine(args)
+    try:
+        return args.func(engine, listener, args)
+    finally:
+        engine.shutdown()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
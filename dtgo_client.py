@@ -0,0 +1,484 @@
+import threading
+import time
+import requests
+import urllib3
+from dtgo_capture import create_adapter, close_captures
+from dtgo_metrics import get_metrics, is_auth_error
+from dtgo_profile import span
+
+urllib3.disable_warnings()
+
+# 默认连接池和超时配置，可以通过配置文件中的 "client" 覆盖
+DEFAULT_CLIENT_OPTIONS = {
+    "pool_connections": 2,   # 每个灯塔缓存的连接池数量
+    "pool_maxsize": 8,       # 每个连接池保持的最大长连接数
+    "connect_timeout": 5,    # 建立连接超时（秒）
+    "read_timeout": 30,      # 读取响应超时（秒）
+    "page_size": 500,        # 分页获取结果时每页的条数
+    "status_cache_ttl": 2,   # 任务列表快照的有效期（秒），同一灯塔的多个调用方共享
+    "capture_mode": "",      # record 录制脱敏后的请求和响应，replay 从录制文件回放，为空时正常访问
+    "capture_file": "dtgo_capture.jsonl.gz",  # 录制/回放文件
+    "replay_speed": 1.0,     # 回放时模拟录制耗时的倍速，0 表示不等待
+    "token_ttl": 0,          # token 有效期（秒），0 表示按第一次过期时 token 的存活时间推算
+    "token_refresh_margin": 0.1,  # 有效期剩余不足该比例时提前刷新
+    "refresh_backoff": 5,    # 刷新失败后这段时间内（秒）不再重复登录，直接按过期处理
+}
+
+# 未指定账号时刷新 token 使用的 ARL 默认账号
+DEFAULT_USERNAME = "admin"
+DEFAULT_PASSWORD = "arlpass"
+
+
+class BeaconAPIError(Exception):
+    """灯塔接口返回了非 200 的业务状态码"""
+
+    def __init__(self, code, message=""):
+        super().__init__(f"灯塔接口错误 {code}: {message}")
+        self.code = code
+        self.message = message
+
+
+class TokenExpiredError(BeaconAPIError):
+    """灯塔 token 已过期（业务状态码 401）"""
+
+
+def beacon_base_url(target):
+    """灯塔接口地址，target 不带协议时默认 https，也可以写成 http://host:port/前缀"""
+    if "://" not in target:
+        target = f"https://{target}"
+    return f"{target.rstrip('/')}/api"
+
+
+class TokenManager:
+    """单个灯塔的 token，由该灯塔的客户端持有，任务线程、历史任务轮询和导出共享
+
+    token 失效时只有一个线程重新登录，同时失效的其他线程等待后直接使用新 token；
+    已知有效期时在到期前主动刷新。每次换新 token 时 generation 加一，
+    调用方传入发出请求时的 generation，据此判断 token 是否已被其他线程刷新过
+    """
+
+    def __init__(self, client, token=""):
+        self.client = client
+        self.lock = threading.Lock()          # 保护 token 和 generation
+        self.refresh_lock = threading.Lock()  # 同一时间只有一个线程登录
+        self.token = token or ""
+        self.generation = 0
+        self.issued_at = None  # 本进程登录得到 token 的时间，外部设置的 token 签发时间未知
+        self.learned_ttl = None  # 观察到的 token 最短存活时间（秒）
+        self.username = DEFAULT_USERNAME
+        self.password = DEFAULT_PASSWORD
+        self.failed_generation = None  # 最近一次刷新失败时的 generation
+        self.failed_at = 0
+        self.refreshes = 0          # 实际重新登录的次数
+        self.refresh_failures = 0
+        self.shared_refreshes = 0   # 等待并复用其他线程刷新结果的次数
+        self.proactive_refreshes = 0
+
+    def current(self):
+        """返回 (token, generation)"""
+        with self.lock:
+            return self.token, self.generation
+
+    def set_token(self, token):
+        """使用外部登录得到的 token（如配置中保存的 token 或 FOFA 扫描时的登录）"""
+        with self.lock:
+            if token == self.token:
+                return
+            self.token = token or ""
+            self.generation += 1
+            self.issued_at = None
+
+    @property
+    def ttl(self):
+        return self.client.options["token_ttl"] or self.learned_ttl
+
+    def login(self, username=None, password=None):
+        """用账号密码登录，不传时使用上次成功登录的账号，返回是否成功，网络错误时抛出异常"""
+        with self.refresh_lock:
+            return self.login_locked(username or self.username, password or self.password, refresh=False)
+
+    def login_locked(self, username, password, refresh):
+        success = False
+        try:
+            response = self.client.send_request(
+                "POST",
+                "/user/login",
+                "",
+                json={"username": username, "password": password},
+                timeout=(self.client.options["connect_timeout"], 5)
+            )
+            result = response.json()
+            if result.get("code") == 200:
+                with self.lock:
+                    self.token = result["data"]["token"]
+                    self.generation += 1
+                    self.issued_at = time.time()
+                    self.failed_generation = None
+                self.username = username
+                self.password = password
+                success = True
+            return success
+        finally:
+            get_metrics().record_login(self.client.target, refresh, success)
+
+    def refresh(self, generation=None, expired=True):
+        """刷新 token，返回之后是否有可用的新 token
+
+        generation 为发出失败请求时的 token 版本（默认为当前版本）：其他线程已经刷新过时直接返回 True；
+        同一版本最近刷新失败过时直接返回 False，不会让所有线程轮流重新登录
+        """
+        if generation is None:
+            generation = self.current()[1]
+        with self.refresh_lock:
+            with self.lock:
+                if self.generation != generation:
+                    self.shared_refreshes += 1
+                    return True
+                if (self.failed_generation == generation
+                        and time.time() - self.failed_at < self.client.options["refresh_backoff"]):
+                    return False
+                if expired and self.issued_at is not None:
+                    # 记录 token 实际的存活时间，之后在到期前主动刷新
+                    lifetime = time.time() - self.issued_at
+                    self.learned_ttl = lifetime if self.learned_ttl is None else min(self.learned_ttl, lifetime)
+            try:
+                success = self.login_locked(self.username, self.password, refresh=True)
+            except Exception:
+                success = False
+            with self.lock:
+                if success:
+                    self.refreshes += 1
+                    if not expired:
+                        self.proactive_refreshes += 1
+                else:
+                    self.refresh_failures += 1
+                    self.failed_generation = generation
+                    self.failed_at = time.time()
+                token = self.token
+        if success:
+            notify_token_refreshed(self.client.target, token)
+        return success
+
+    def ensure_fresh(self):
+        """有效期剩余不足 token_refresh_margin 时主动刷新，刷新失败时继续使用旧 token"""
+        ttl = self.ttl
+        with self.lock:
+            issued_at = self.issued_at
+            generation = self.generation
+        if not ttl or issued_at is None:
+            return
+        if time.time() - issued_at < ttl * (1 - self.client.options["token_refresh_margin"]):
+            return
+        self.refresh(generation, expired=False)
+
+
+class BeaconClient:
+    """单个灯塔的 HTTP 客户端，持有可复用的长连接会话和共享的 token"""
+
+    def __init__(self, target, token="", options=None):
+        self.target = target
+        self.options = dict(DEFAULT_CLIENT_OPTIONS)
+        if options:
+            self.options.update(options)
+        self.base_url = beacon_base_url(target)
+        self.tokens = TokenManager(self, token)
+
+        self.session = requests.Session()
+        self.session.verify = False
+        # 录制和回放模式下替换连接适配器，客户端其余逻辑不变
+        self.adapter = create_adapter(
+            self.options,
+            target,
+            self.base_url,
+            pool_connections=self.options["pool_connections"],
+            pool_maxsize=self.options["pool_maxsize"]
+        )
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+
+        self.lock = threading.Lock()
+        self.request_count = 0
+        self.error_count = 0
+        self.latency_ewma = None  # 请求耗时的指数加权平均（秒）
+
+        # 任务列表快照，用一次列表查询代替逐个任务查询状态
+        self.status_lock = threading.Lock()
+        self.task_snapshot = {}
+        self.task_snapshot_time = 0
+        self.status_lookups = 0    # 调用方查询的任务状态数
+        self.status_requests = 0   # 实际发出的任务列表请求数
+        self.missing_tasks = set()  # 已确认灯塔上不存在的任务（被删除），不再为它们翻页
+
+    @property
+    def timeout(self):
+        return (self.options["connect_timeout"], self.options["read_timeout"])
+
+    @property
+    def token(self):
+        return self.tokens.token
+
+    @token.setter
+    def token(self, token):
+        self.tokens.set_token(token)
+
+    def request(self, method, path, headers=None, timeout=None, token_retry=True, **kwargs):
+        """发送请求，自动附带 Token 并复用连接
+
+        token 失效（业务状态码 401）时由共享的 TokenManager 刷新后重发一次，
+        调用方只有在刷新失败时才会看到 401；token_retry 为 False 时不刷新也不重发
+        """
+        if token_retry:
+            self.tokens.ensure_fresh()
+        token, generation = self.tokens.current()
+        response = self.send_request(method, path, token, headers, timeout, **kwargs)
+        if token_retry and is_auth_error(response.content or b"") and self.tokens.refresh(generation):
+            response = self.send_request(method, path, self.tokens.current()[0], headers, timeout, **kwargs)
+        return response
+
+    def send_request(self, method, path, token, headers=None, timeout=None, **kwargs):
+        """用指定的 token 发送一次请求，记录耗时、错误和请求指标"""
+        request_headers = {"Token": token}
+        if headers:
+            request_headers.update(headers)
+        start = time.monotonic()
+        response = None
+        failure = None
+        try:
+            with span("fetch", method=method, path=path):
+                response = self.session.request(
+                    method,
+                    f"{self.base_url}{path}",
+                    headers=request_headers,
+                    timeout=timeout or self.timeout,
+                    **kwargs
+                )
+            return response
+        except Exception as e:
+            failure = e
+            with self.lock:
+                self.error_count += 1
+            raise
+        finally:
+            elapsed = time.monotonic() - start
+            with self.lock:
+                self.request_count += 1
+                if self.latency_ewma is None:
+                    self.latency_ewma = elapsed
+                else:
+                    self.latency_ewma = self.latency_ewma * 0.8 + elapsed * 0.2
+            self.record_metrics(path, elapsed, response, failure)
+
+    def record_metrics(self, path, elapsed, response, failure):
+        """按接口记录耗时、流量、错误和超时"""
+        if response is None:
+            get_metrics().record_request(
+                self.target, path, elapsed, error=True,
+                timeout=isinstance(failure, requests.exceptions.Timeout)
+            )
+            return
+        body = response.request.body if response.request is not None else None
+        content = response.content or b""
+        get_metrics().record_request(
+            self.target,
+            path,
+            elapsed,
+            bytes_sent=len(body) if body else 0,
+            bytes_received=len(content),
+            status=response.status_code,
+            auth_error=is_auth_error(content)
+        )
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def iter_pages(self, path, params=None, page_size=None, start_page=1, refresh=None):
+        """逐页遍历列表接口，每次返回 (页码, 当前页记录)，内存占用只有一页
+
+        token 过期时调用 refresh() 刷新一次并从当前页继续，失败则抛出 TokenExpiredError
+        """
+        page_size = page_size or self.options["page_size"]
+        page = start_page
+        retry = refresh is not None
+        while True:
+            query = dict(params or {})
+            query.update({"page": page, "size": page_size})
+            response = self.get(path, params=query)
+            response.raise_for_status()
+            with span("decode", path=path, bytes=len(response.content)):
+                result = response.json()
+            code = result.get("code")
+            if code == 401:
+                if retry and refresh():
+                    retry = False
+                    continue
+                raise TokenExpiredError(code, result.get("message", ""))
+            if code != 200:
+                raise BeaconAPIError(code, result.get("message", ""))
+            
+            items = result.get("items", [])
+            if items:
+                yield page, items
+            total = result.get("total")
+            if len(items) < page_size or (total is not None and page * page_size >= total):
+                return
+            page += 1
+
+    def get_task_statuses(self, task_ids, refresh=None):
+        """通过任务列表接口批量获取任务信息，返回 {task_id: 任务信息}
+
+        列表快照在 status_cache_ttl 内被同一灯塔的所有调用方共享，
+        并发调用时只有一个线程真正发出请求。
+        列表按 _id（ObjectId，前缀为创建时间）倒序，翻到比所有缺少的任务都旧的页就停止；
+        仍未找到的任务逐个查询确认，确认不存在的任务记住后不再触发翻页
+        """
+        wanted = set(task_ids)
+        with self.status_lock:
+            self.status_lookups += len(wanted)
+            wanted -= self.missing_tasks
+            age = time.time() - self.task_snapshot_time
+            if age >= self.options["status_cache_ttl"] or not wanted <= self.task_snapshot.keys():
+                snapshot = {}
+                pages = 0
+                for _, items in self.iter_pages("/task/", {"order": "-_id"}, page_size=100, refresh=refresh):
+                    pages += 1
+                    for item in items:
+                        snapshot[item["_id"]] = item
+                    # 新任务排在前面，找齐需要的任务后就不再翻页
+                    missing = wanted - snapshot.keys()
+                    if wanted and not missing:
+                        break
+                    # 缺少的任务都比这一页最旧的任务新，说明已被删除，后面的页不会再有
+                    if missing and min(missing) > min(item["_id"] for item in items):
+                        break
+                self.status_requests += max(pages, 1)
+                for task_id in wanted - snapshot.keys():
+                    task = self.get_task(task_id)
+                    if task is not None:
+                        snapshot[task_id] = task
+                self.task_snapshot = snapshot
+                self.task_snapshot_time = time.time()
+            return {
+                task_id: self.task_snapshot[task_id]
+                for task_id in wanted
+                if task_id in self.task_snapshot
+            }
+
+    def get_task(self, task_id):
+        """单独查询列表中没有的任务，不存在时记入 missing_tasks，网络错误时返回 None 且下次重试"""
+        try:
+            response = self.get(f"/task/{task_id}")
+            result = response.json()
+        except Exception:
+            return None
+        self.status_requests += 1
+        if result.get("code") == 200 and result.get("data"):
+            return result["data"]
+        if result.get("code") in (200, 404):
+            self.missing_tasks.add(task_id)
+        return None
+
+    def login(self, username=None, password=None):
+        """登录灯塔，成功后更新共享的 token，之后 token 失效时用同一账号重新登录"""
+        return self.tokens.login(username, password)
+
+    def get_stats(self):
+        """返回连接复用统计信息"""
+        connections = 0
+        pool_requests = 0
+        pools = self.adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            connections += pool.num_connections
+            pool_requests += pool.num_requests
+        reused = max(pool_requests - connections, 0)
+        return {
+            "target": self.target,
+            "requests": self.request_count,
+            "errors": self.error_count,
+            "latency_ms": round((self.latency_ewma or 0) * 1000, 1),
+            "connections": connections,
+            "reused": reused,
+            "reuse_ratio": reused / pool_requests if pool_requests else 0.0,
+            "status_lookups": self.status_lookups,
+            "status_requests": self.status_requests,
+            "status_requests_saved": max(self.status_lookups - self.status_requests, 0),
+            "token_refreshes": self.tokens.refreshes,
+            "token_refresh_failures": self.tokens.refresh_failures,
+            "token_refreshes_shared": self.tokens.shared_refreshes,
+            "token_refreshes_proactive": self.tokens.proactive_refreshes
+        }
+
+    def close(self):
+        self.session.close()
+
+
+# 全局客户端注册表，保证每个灯塔只有一个客户端实例
+_clients = {}
+_clients_lock = threading.Lock()
+_client_options = dict(DEFAULT_CLIENT_OPTIONS)
+# token 刷新后的回调 callback(target, token)，用于保存新 token
+_token_listeners = []
+
+
+def add_token_listener(callback):
+    if callback not in _token_listeners:
+        _token_listeners.append(callback)
+
+
+def remove_token_listener(callback):
+    if callback in _token_listeners:
+        _token_listeners.remove(callback)
+
+
+def notify_token_refreshed(target, token):
+    for callback in list(_token_listeners):
+        try:
+            callback(target, token)
+        except Exception as e:
+            print(f"Token listener error: {str(e)}")
+
+
+def configure_clients(options):
+    """更新之后新建客户端使用的连接池和超时配置"""
+    if options:
+        _client_options.update(options)
+
+
+def get_client(target, token=None):
+    """获取（或创建）指定灯塔的共享客户端，传入的 token 与现有的不同时（如重新登录后）替换现有的 token"""
+    with _clients_lock:
+        client = _clients.get(target)
+        if client is None:
+            client = BeaconClient(target, token, _client_options)
+            _clients[target] = client
+        elif token and token != client.token:
+            # set_token 会增加 generation，用旧 token 失败的请求会直接使用新 token 重试，不会再次登录
+            client.token = token
+        return client
+
+
+def close_client(target):
+    with _clients_lock:
+        client = _clients.pop(target, None)
+    if client:
+        client.close()
+
+
+def close_all_clients():
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        client.close()
+    close_captures()
+
+
+def get_all_client_stats():
+    with _clients_lock:
+        clients = list(_clients.values())
+    return [client.get_stats() for client in clients]
@@ -1,13 +1,31 @@
 import json
 import os
 import sys
+import tempfile
+import threading
 import traceback
+from dtgo_store import TaskStore
+from dtgo_profile import span, profile_thread
 
 class Config:
-    def __init__(self):
+    def __init__(self, write_behind=False, flush_interval=0.5, app_path=None):
+        """app_path 为配置、任务记录、缓存和结果库所在目录，默认为程序所在目录"""
+        # 延迟写入模式下，修改先记录在内存中，由后台线程合并后定期写入
+        self.write_behind = write_behind
+        self.flush_interval = flush_interval
+        self.lock = threading.RLock()
+        self.flush_lock = threading.Lock()  # 保证多次写入按顺序完成
+        self.config_dirty = False
+        self.pending_ops = {}  # {(类型, 主键): (方法名, 参数)}，同一条记录只保留最后一次修改
+        self.flush_event = threading.Event()
+        self.flush_thread = None
+        self.closed = False
+        self.write_count = 0  # 实际写入磁盘的次数
         try:
             # 获取应用程序的实际路径
-            if getattr(sys, 'frozen', False):
+            if app_path:
+                self.app_path = app_path
+            elif getattr(sys, 'frozen', False):
                 # 如果是打包后的应用
                 self.app_path = os.path.dirname(sys.executable)
             else:
@@ -17,40 +35,137 @@ class Config:
             # 配置文件路径
             self.config_file = os.path.join(self.app_path, "dtgo_config.json")
             self.config = self.load_config()
+            
+            # 灯塔和任务记录保存在 SQLite 数据库中
+            self.db_file = os.path.join(self.app_path, "dtgo_tasks.db")
+            # 已完成任务的结果缓存目录
+            self.cache_dir = os.path.join(self.app_path, "dtgo_cache")
+            # 跨任务去重的结果库
+            self.warehouse_file = os.path.join(self.app_path, "dtgo_results.db")
+            self.store = TaskStore(self.db_file)
+            self.migrate_json_records()
         except Exception as e:
             print(f"Config initialization error: {str(e)}")
             traceback.print_exc()
             self.config = {
-                "fofa_key": "",
-                "successful_beacons": {},
-                "task_records": {}
+                "fofa_key": ""
             }
+            self.store = TaskStore(":memory:")
+            self.cache_dir = os.path.join(tempfile.gettempdir(), "dtgo_cache")
+            self.warehouse_file = ":memory:"
+        
+        if self.write_behind:
+            self.flush_thread = threading.Thread(target=self.flush_loop, daemon=True)
+            self.flush_thread.start()
+    
+    def flush_loop(self):
+        """后台线程：定期把合并后的修改写入磁盘"""
+        with profile_thread():
+            while not self.closed:
+                self.flush_event.wait(self.flush_interval)
+                self.flush_event.clear()
+                self.flush()
+    
+    def flush(self):
+        """立即写入所有待保存的修改"""
+        with self.flush_lock:
+            with self.lock:
+                config_dirty = self.config_dirty
+                self.config_dirty = False
+                ops = list(self.pending_ops.values())
+                self.pending_ops.clear()
+                data = json.dumps(self.config, ensure_ascii=False, indent=2) if config_dirty else None
+            
+            ok = True
+            if data is not None:
+                with span("persist.config"):
+                    ok = self.write_config_file(data)
+            if ops:
+                try:
+                    with span("persist.records", ops=len(ops)), self.store.transaction() as conn:
+                        for method, args in ops:
+                            getattr(self.store, method)(*args, conn=conn)
+                    self.write_count += 1
+                except Exception as e:
+                    print(f"Flush records error: {str(e)}")
+                    traceback.print_exc()
+                    ok = False
+            return ok
+    
+    def close(self):
+        """停止后台写入线程，写入剩余的修改并关闭数据库连接"""
+        self.closed = True
+        self.flush_event.set()
+        if self.flush_thread:
+            self.flush_thread.join()
+        self.flush()
+        self.store.close()
+    
+    def queue_store_op(self, key, method, *args):
+        """记录一次数据库修改，延迟写入模式下合并后批量写入"""
+        if not self.write_behind:
+            getattr(self.store, method)(*args)
+            return
+        with self.lock:
+            self.pending_ops.pop(key, None)  # 重新插入，保持修改的先后顺序
+            self.pending_ops[key] = (method, args)
+    
+    def migrate_json_records(self):
+        """把旧版配置文件中的灯塔和任务记录合并到数据库
+
+        数据库中已有的灯塔和任务较新，保持不变，只补充缺少的（如新旧版本交替运行后）；导入成功后才从配置文件中移除
+        """
+        if "successful_beacons" not in self.config and "task_records" not in self.config:
+            return
+        self.store.import_records(
+            self.config.get("successful_beacons") or {},
+            self.config.get("task_records") or {}
+        )
+        self.config.pop("successful_beacons", None)
+        self.config.pop("task_records", None)
+        # 迁移成功后配置文件只保留设置项
+        self.save_config(sync=True)
     
     def load_config(self):
         try:
             if os.path.exists(self.config_file):
                 with open(self.config_file, 'r', encoding='utf-8') as f:
-                    config = json.load(f)
-                    if "task_records" not in config:
-                        config["task_records"] = {}
-                    return config
+                    return json.load(f)
         except Exception as e:
             print(f"Load config error: {str(e)}")
             traceback.print_exc()
         return {
-            "fofa_key": "",
-            "successful_beacons": {},
-            "task_records": {}
+            "fofa_key": ""
         }
     
-    def save_config(self):
+    def save_config(self, sync=False):
+        """保存配置，延迟写入模式下只标记修改，由后台线程写入"""
+        with self.lock:
+            self.config_dirty = True
+        if self.write_behind and not sync:
+            return True
+        return self.flush()
+    
+    def write_config_file(self, data):
+        """原子地写入配置文件：先写临时文件并落盘，再替换原文件"""
         try:
             # 确保目录存在
-            os.makedirs(os.path.dirname(self.config_file), exist_ok=True)
+            directory = os.path.dirname(self.config_file)
+            os.makedirs(directory, exist_ok=True)
             
             # 保存配置
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(self.config, f, ensure_ascii=False, indent=2)
+            fd, temp_file = tempfile.mkstemp(prefix=".dtgo_config.", suffix=".tmp", dir=directory)
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_file, self.config_file)
+            except Exception:
+                if os.path.exists(temp_file):
+                    os.remove(temp_file)
+                raise
+            self.write_count += 1
             return True
         except Exception as e:
             print(f"Save config error: {str(e)}")
@@ -62,23 +177,84 @@ class Config:
     
     def set_fofa_key(self, key):
         try:
-            self.config["fofa_key"] = key
-            return self.save_config()
+            with self.lock:
+                self.config["fofa_key"] = key
+            # 设置需要立即知道是否保存成功
+            return self.save_config(sync=True)
         except Exception as e:
             print(f"Set fofa key error: {str(e)}")
             traceback.print_exc()
             return False
     
-    def get_successful_beacons(self):
-        return self.config.get("successful_beacons", {})
+    def get_client_options(self):
+        """获取灯塔客户端的连接池和超时配置"""
+        return self.config.get("client", {})
+    
+    def get_poll_options(self):
+        """获取任务轮询调度配置"""
+        return self.config.get("poll", {})
+    
+    def get_export_options(self):
+        """获取导出结果时的并发配置"""
+        return self.config.get("export", {})
+    
+    def get_cache_options(self):
+        """获取本地结果缓存配置"""
+        return self.config.get("cache", {})
     
-    def save_successful_beacons(self, beacons):
-        self.config["successful_beacons"] = beacons
+    def get_metrics_options(self):
+        """获取请求指标的定期导出配置"""
+        return self.config.get("metrics", {})
+    
+    def get_profile_options(self):
+        """获取性能剖析配置"""
+        return self.config.get("profile", {})
+    
+    def get_default_beacon_limit(self):
+        """获取单个灯塔默认的最大并行任务数"""
+        return self.config.get("default_beacon_limit", 5)
+    
+    def get_beacon_limits(self):
+        """获取各灯塔单独设置的最大并行任务数"""
+        return dict(self.config.get("beacon_limits", {}))
+    
+    def save_beacon_limits(self, limits):
+        with self.lock:
+            self.config["beacon_limits"] = limits
+        self.save_config()
+    
+    def get_beacon_stats(self):
+        """获取各灯塔历史的任务时长和 API 延迟"""
+        return self.config.get("beacon_stats", {})
+    
+    def save_beacon_stats(self, stats):
+        with self.lock:
+            self.config["beacon_stats"] = stats
         self.save_config()
     
+    def get_successful_beacons(self):
+        self.flush_pending_ops()
+        return self.store.load_beacons()
+    
+    def save_beacon(self, beacon_info):
+        """新增或更新单个灯塔"""
+        self.queue_store_op(("beacon", beacon_info["target"]), "save_beacon", dict(beacon_info))
+    
+    def delete_beacon(self, target):
+        self.queue_store_op(("beacon", target), "delete_beacon", target)
+    
     def get_task_records(self):
-        return self.config.get("task_records", {})
+        self.flush_pending_ops()
+        return self.store.load_task_records()
+    
+    def set_task_status(self, beacon, task_id, status):
+        """新增任务记录或更新单个任务的状态"""
+        self.queue_store_op(("task", beacon, task_id), "set_task_status", beacon, task_id, status)
+    
+    def delete_task_record(self, beacon, task_id):
+        self.queue_store_op(("task", beacon, task_id), "delete_task", beacon, task_id)
     
-    def save_task_records(self, records):
-        self.config["task_records"] = records
-        self.save_config() 
\ No newline at end of file
+    def flush_pending_ops(self):
+        """读取或整体覆盖数据库前，先写入排队中的修改"""
+        if self.write_behind and self.pending_ops:
+            self.flush() 
\ No newline at end of file
@@ -0,0 +1,1003 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dtgo_client import (get_client, configure_clients, close_client, close_all_clients, add_token_listener,
+                         remove_token_listener, TokenExpiredError)
+from dtgo_scheduler import PollScheduler, estimate_progress
+from dtgo_queue import TaskQueue
+from dtgo_planner import get_cost_model, load_cost_models, dump_cost_models, plan_assignments
+from dtgo_cache import ResultCache
+from dtgo_warehouse import ResultWarehouse
+from dtgo_metrics import DEFAULT_METRICS_OPTIONS, get_metrics
+from dtgo_profile import span, profile_thread, start_profiling, stop_profiling
+
+
+def format_asset(item):
+    """格式化站点记录: (网站, 标题, IP, Server, 指纹)"""
+    return (
+        item["site"],
+        item["title"],
+        item.get("ip", ""),
+        item.get("http_server", ""),
+        # 格式化 finger 信息
+        ", ".join([
+            f"{f['name']}{f.get('version', '')}"
+            for f in item.get("finger", [])
+        ])
+    )
+
+
+def format_leak(item):
+    """格式化信息泄露记录: (URL, 标题)"""
+    return (item["url"], item["title"])
+
+
+def format_domain(item):
+    """格式化子域名记录: (域名, 类型, IP)"""
+    return (
+        item["domain"],
+        item["type"],
+        ", ".join(item.get("ips", []))  # 将IP列表合并为字符串
+    )
+
+
+# 结果类型 => (接口路径, 格式化函数, 描述)
+RESULT_TYPES = {
+    "assets": ("/site/", format_asset, "资产"),
+    "leaks": ("/fileleak/", format_leak, "信息泄露"),
+    "domains": ("/domain/", format_domain, "子域名"),
+}
+
+# 分配目标前并发查询灯塔负载的线程数
+LOAD_CHECK_WORKERS = 16
+
+# 灯塔任务的状态为当前扫描阶段，这些状态表示任务已结束
+FINISHED_STATUSES = ("done", "error", "stop")
+
+
+def update_beacon_load(client, cost_model):
+    """用一次任务列表查询更新灯塔的运行和等待任务数，返回灯塔上未结束的任务数"""
+    response = client.get("/task/", params={"page": 1, "size": 100})
+    response.raise_for_status()
+    tasks = response.json().get("items", [])
+    waiting = sum(1 for t in tasks if t["status"] == "waiting")
+    running = sum(1 for t in tasks if t["status"] != "waiting" and t["status"] not in FINISHED_STATUSES)
+    cost_model.update_load(running, waiting)
+    cost_model.record_latency(client.latency_ewma or 0)
+    return running + waiting
+
+
+# 结果接口按 _id 升序分页（ARL 默认 -_id 即最新的在前），任务写入新结果时已获取的页不会移动
+RESULT_ORDER = "_id"
+
+
+class EngineListener:
+    """引擎事件回调，默认不做任何处理，使用方按需覆盖
+
+    回调在引擎的工作线程中执行，界面需要自行转到主线程处理
+    """
+
+    def on_message(self, beacon, message):
+        """与具体任务无关的状态消息，如任务提交成功或失败"""
+
+    def on_error(self, beacon, message):
+        """错误消息，beacon 可能为 None"""
+
+    def on_progress(self, beacon, task_id, message):
+        """任务的最新进度"""
+
+    def on_results(self, beacon, task_id, result_type, items, is_final):
+        """一批新的原始结果，items 为灯塔接口返回的记录"""
+
+    def on_task_created(self, beacon, task_id, target):
+        pass
+
+    def on_task_completed(self, beacon, task_id):
+        pass
+
+    def on_task_status(self, beacon, task_id, status):
+        """历史任务记录的状态变化（"运行中" / "已结束"）"""
+
+    def on_token_expired(self, beacon):
+        """灯塔 token 过期且重新登录失败"""
+
+    def on_token_refreshed(self, beacon, token):
+        pass
+
+    def on_worker_finished(self, beacon):
+        """灯塔的任务线程退出"""
+
+    def on_export_progress(self, done, total, message):
+        pass
+
+
+class BeaconWorker:
+    """单个灯塔的任务提交和监控循环，run() 阻塞执行，所有事件通过 listener 回调通知"""
+    
+    def __init__(self, beacon_info, targets, poll_options=None, queue=None, listener=None, result_cache=None,
+                 warehouse=None):
+        self.beacon_info = beacon_info
+        self.beacon = beacon_info["target"]
+        self.listener = listener or EngineListener()
+        self.thread = None  # 运行 run() 的线程，由引擎启动时设置
+        # 任务完成时把完整结果写入本地缓存，之后导出和查看不再访问灯塔
+        self.result_cache = result_cache
+        self.fetch_errors = 0  # 获取结果失败的次数，用于判断缓存是否完整
+        self.warehouse = warehouse  # 所有结果写入本地去重结果库
+        self.client = get_client(beacon_info["target"], beacon_info.get("token"))
+        self.targets = targets
+        self.task_ids = []  # 存储所有任务ID
+        self.running = True
+        self.active_tasks = {}  # 存储活动任务的状态信息 {task_id: {progress, cursors, target}}
+        self.scheduler = PollScheduler(poll_options)  # 按任务自适应安排轮询时间
+        # 待提交目标队列，多个灯塔共享同一个队列时按空闲槽位领取目标
+        self.queue = queue or TaskQueue()
+        if targets:
+            self.queue.put(targets, [beacon_info["target"]])
+        self.next_slot_check = 0  # 下次检查灯塔空闲槽位的时间
+        self.cost_model = get_cost_model(beacon_info["target"])  # 记录任务时长和负载，用于分配目标
+        
+    def stop(self):
+        self.running = False
+        
+    def report_progress(self, message, task_id=None):
+        """发送进度消息，task_id 为空时是与具体任务无关的消息"""
+        if task_id is None:
+            self.listener.on_message(self.beacon, message)
+        else:
+            self.listener.on_progress(self.beacon, task_id, message)
+            
+    def report_error(self, message):
+        self.listener.on_error(self.beacon, message)
+        
+    def check_existing_tasks(self):
+        """检查灯塔当前的任务数量，并更新灯塔的负载信息"""
+        try:
+            return update_beacon_load(self.client, self.cost_model)
+        except Exception as e:
+            self.report_error(f"检查任务失败: {str(e)}")
+        return 0
+        
+    def has_pending_targets(self):
+        return self.queue.has_work(self.beacon_info["target"])
+        
+    def fill_free_slots(self):
+        """在并发上限内从队列领取目标并提交"""
+        beacon = self.beacon_info["target"]
+        limit = self.queue.get_limit(beacon)
+        if len(self.active_tasks) >= limit or not self.has_pending_targets():
+            return
+        if time.time() < self.next_slot_check:
+            return
+            
+        # 灯塔上可能还有其他来源的任务，以实际运行数为准
+        current_tasks = max(self.check_existing_tasks(), len(self.active_tasks))
+        free_slots = limit - current_tasks
+        if free_slots <= 0:
+            self.next_slot_check = time.time() + self.scheduler.options["min_interval"]
+            return
+            
+        entries = self.queue.take(beacon, free_slots)
+        failed = []
+        for i, entry in enumerate(entries):
+            if not self.running:
+                # 线程停止时，没来得及提交的目标还给队列
+                self.queue.requeue(entries[i:], failed=False)
+                break
+            target = entry["target"]
+            try:
+                task_id = self.submit_task(target)
+            except Exception as e:
+                self.report_error(f"任务提交失败: {str(e)}")
+                task_id = None
+            if task_id:
+                self.start_tracking(task_id, target)
+            else:
+                failed.append(entry)
+                
+        # 提交失败的目标放回队列，由本灯塔或其他灯塔稍后重试
+        for entry in self.queue.requeue(failed):
+            self.report_error(f"提交任务失败: {entry['target']}")
+        if failed:
+            self.next_slot_check = time.time() + self.scheduler.options["min_interval"]
+        
+    def start_tracking(self, task_id, target):
+        """记录新提交的任务并加入轮询调度"""
+        self.task_ids.append(task_id)
+        self.listener.on_task_created(self.beacon, task_id, target)
+        # 初始化任务状态
+        self.active_tasks[task_id] = {
+            "submitted": time.time(),
+            "progress": 0.0,
+            # 每类结果已经发送过的记录数，下次只获取之后的新记录
+            "cursors": {result_type: 0 for result_type in RESULT_TYPES},
+            "target": target,
+            # 从第一条结果开始逐批写入缓存，任务完成后提交
+            "cache_writer": self.open_cache_writer(task_id)
+        }
+        self.scheduler.add(task_id)
+        
+    def run(self):
+        # 提交任务并监控，直到队列中没有本灯塔可领取的目标且所有任务结束
+        while self.running:
+            self.fill_free_slots()
+            if not self.active_tasks:
+                if not self.has_pending_targets():
+                    break
+                # 灯塔槽位被其他任务占满，等待后再检查
+                self.wait_until_due(self.scheduler.options["min_interval"])
+                continue
+                
+            due_tasks = self.scheduler.due()
+            if not due_tasks:
+                self.wait_until_due()
+                continue
+            
+            completed_tasks = []
+            with span("poll.worker", beacon=self.beacon, tasks=len(due_tasks)):
+                # 每轮只发一次任务列表请求，获取到期任务的状态
+                statuses = self.check_task_statuses(due_tasks)
+                for task_id in due_tasks:
+                    if not self.running:
+                        break
+                    try:
+                        if self.monitor_task_once(task_id, statuses):
+                            completed_tasks.append(task_id)
+                    except Exception as e:
+                        self.report_error(f"监控任务失败: {str(e)}")
+                        completed_tasks.append(task_id)
+            
+            # 移除已完成的任务，空出的槽位在下一轮领取新目标
+            for task_id in completed_tasks:
+                self.close_cache_writer(self.active_tasks.pop(task_id), commit=False)
+                self.scheduler.remove(task_id)
+        
+        # 线程被停止时，未完成任务的缓存不完整，直接丢弃
+        for task_info in self.active_tasks.values():
+            self.close_cache_writer(task_info, commit=False)
+    
+    def open_cache_writer(self, task_id):
+        if self.result_cache is None:
+            return None
+        try:
+            return self.result_cache.open_writer(self.beacon_info["target"], task_id)
+        except Exception as e:
+            self.report_error(f"创建结果缓存失败: {str(e)}")
+            return None
+    
+    def close_cache_writer(self, task_info, commit):
+        """提交或丢弃任务的结果缓存"""
+        writer = task_info.get("cache_writer")
+        if writer is None:
+            return
+        task_info["cache_writer"] = None
+        try:
+            if commit:
+                writer.commit()
+            else:
+                writer.abort()
+        except Exception as e:
+            self.report_error(f"保存结果缓存失败: {str(e)}")
+    
+    def wait_until_due(self, delay=None):
+        """等待到下一个任务的轮询时间，期间可以被 stop() 打断"""
+        if delay is None:
+            delay = self.scheduler.next_due_in()
+            # 队列中还有目标时，至少每个最短间隔检查一次空闲槽位
+            if self.has_pending_targets():
+                delay = min(delay or 0, self.scheduler.options["min_interval"])
+        while self.running and delay and delay > 0:
+            step = min(delay, 1)
+            time.sleep(step)
+            delay -= step
+    
+    def monitor_task_once(self, task_id, statuses=None):
+        """监控单个任务一次，返回任务是否结束（结束的任务由调用方移出并空出槽位）
+
+        statuses 为批量查询得到的 {task_id: status}，不在其中的任务单独查询；
+        已停止或已在灯塔上删除的任务也算结束，不完整的结果缓存由调用方丢弃
+        """
+        try:
+            if statuses is not None and task_id in statuses:
+                status = statuses[task_id]
+            elif task_id in self.client.missing_tasks:
+                status = None  # 批量查询时已确认被删除
+            else:
+                status = self.check_task_status(task_id)
+            task_info = self.active_tasks[task_id]
+            
+            if status == "done":
+                self.cost_model.record_duration(time.time() - task_info["submitted"])
+                self.listener.on_task_completed(self.beacon, task_id)
+                self.report_progress(f"任务 {task_id} ({task_info['target']}) 完成，正在收集最终结果...", task_id)
+                self.collect_final_results(task_id, task_info["cursors"])
+                self.close_cache_writer(task_info, commit=True)
+                return True
+            elif status == "error":
+                self.report_error(f"任务执行失败: {task_id} ({task_info['target']})")
+                return True
+            elif status == "stop":
+                self.listener.on_task_completed(self.beacon, task_id)
+                self.report_progress(f"任务 {task_id} ({task_info['target']}) 已在灯塔上停止", task_id)
+                return True
+            elif status is None and task_id in self.client.missing_tasks:
+                self.report_error(f"任务已在灯塔上删除: {task_id} ({task_info['target']})")
+                return True
+            else:
+                # 收集新结果，并根据阶段和结果变化安排下次轮询
+                new_counts = self.collect_intermediate_results(task_id, task_info["cursors"])
+                changed = bool(new_counts and any(new_counts.values()))
+                self.scheduler.record(task_id, changed, task_info["progress"])
+                self.report_progress(f"任务 {task_id} ({task_info['target']}) 状态: {status}", task_id)
+                return False
+                
+        except Exception as e:
+            self.report_error(f"监控任务状态失败: {str(e)}")
+            return True  # 发生错误时认为任务完成，避免无限循环
+        
+    def refresh_token(self):
+        """刷新token，由灯塔共享的 TokenManager 完成，同时失效的多个线程只登录一次"""
+        return self.client.tokens.refresh()
+            
+    def submit_task(self, target, retry=True):
+        headers = {"Content-Type": "application/json"}
+        data = {
+            "name": f"DTGO_{int(time.time())}",
+            "target": target,
+            "domain_brute_type": "big",
+            "port_scan_type": "all",
+            "domain_brute": True,
+            "alt_dns": False,
+            "dns_query_plugin": True,
+            "arl_search": True,
+            "port_scan": True,
+            "service_detection": True,
+            "os_detection": False,
+            "ssl_cert": False,
+            "skip_scan_cdn_ip": True,
+            "site_identify": True,
+            "search_engines": False,
+            "site_spider": False,
+            "site_capture": False,
+            "file_leak": True,
+            "findvhost": False,
+            "nuclei_scan": False,
+            "web_info_hunter": False
+        }
+        
+        try:
+            response = self.client.post("/task/", json=data, headers=headers)
+            if response.status_code == 200:
+                result = response.json()
+                if result.get("code") == 200:
+                    self.report_progress(f"成功提交任务: {target}")
+                    return result["items"][0]["task_id"]
+                elif result.get("code") == 401 and retry:  # token过期
+                    if self.refresh_token():
+                        # 刷新token成功，重试提交任务
+                        return self.submit_task(target, retry=False)
+                    else:
+                        self.listener.on_token_expired(self.beacon)
+                else:
+                    self.report_progress(f"提交任务失败: {target}")
+            else:
+                self.report_progress(f"提交任务失败: {target}")
+        except Exception as e:
+            self.report_progress(f"提交任务异常: {target} ({str(e)})")
+        return None
+        
+    def check_task_status(self, task_id):
+        """单独检查任务状态，查询失败时返回 None，确认任务不存在时由客户端记入 missing_tasks"""
+        task_data = self.client.get_task(task_id)
+        if task_data is None:
+            return None
+        return self.report_task_status(task_id, task_data)
+        
+    def check_task_statuses(self, task_ids):
+        """用一次任务列表查询获取多个任务的状态，返回 {task_id: status}"""
+        try:
+            tasks = self.client.get_task_statuses(task_ids, refresh=self.refresh_token)
+            return {
+                task_id: self.report_task_status(task_id, task_data)
+                for task_id, task_data in tasks.items()
+            }
+        except TokenExpiredError:
+            self.listener.on_token_expired(self.beacon)
+        except Exception as e:
+            self.report_error(f"批量检查任务状态失败: {str(e)}")
+        return {}
+        
+    def report_task_status(self, task_id, task_data):
+        """发送任务的详细状态信息并记录任务进度，返回任务状态"""
+        status = task_data["status"]
+        if task_id in self.active_tasks:
+            self.active_tasks[task_id]["progress"] = estimate_progress(task_data)
+        
+        # 添加详细的状态信息
+        progress_info = []
+        if "service" in task_data:
+            completed_services = [s["name"] for s in task_data.get("service", [])]
+            progress_info.append(f"已完成: {', '.join(completed_services)}")
+        
+        if "end_time" in task_data and task_data["end_time"] != "-":
+            progress_info.append(f"结束时间: {task_data['end_time']}")
+        
+        progress_str = " | ".join(progress_info) if progress_info else "进行中"
+        self.report_progress(f"任务 {task_id} - {status} ({progress_str})", task_id)
+        return status
+        
+    def collect_new_results(self, task_id, cursors, is_final):
+        """从游标处继续获取每类结果，逐批发送并推进游标，返回本次新增数量"""
+        new_counts = {result_type: 0 for result_type in RESULT_TYPES}
+        task_info = self.active_tasks.get(task_id, {})
+        fetch_errors = self.fetch_errors
+        for result_type in RESULT_TYPES:
+            for items in self.iter_results(result_type, task_id, offset=cursors[result_type], raw=True):
+                cursors[result_type] += len(items)
+                new_counts[result_type] += len(items)
+                if task_info.get("cache_writer"):
+                    with span("persist.cache", result_type=result_type, rows=len(items)):
+                        task_info["cache_writer"].write(result_type, items)
+                self.ingest_results(result_type, task_id, items)
+                with span("emit", result_type=result_type, rows=len(items)):
+                    self.listener.on_results(self.beacon, task_id, result_type, items, is_final)
+        if self.fetch_errors != fetch_errors:
+            # 获取失败时游标停在失败处，缓存中可能缺少后续结果，不再使用
+            self.close_cache_writer(task_info, commit=False)
+        return new_counts
+        
+    def ingest_results(self, result_type, task_id, items):
+        if self.warehouse is None:
+            return
+        try:
+            with span("persist.warehouse", result_type=result_type, rows=len(items)):
+                self.warehouse.ingest(result_type, self.beacon_info["target"], task_id, items)
+        except Exception as e:
+            self.report_error(f"写入结果库失败: {str(e)}")
+        
+    def collect_intermediate_results(self, task_id, cursors):
+        """收集中间结果，只获取并发送游标之后新发现的结果"""
+        try:
+            new_counts = self.collect_new_results(task_id, cursors, is_final=False)
+            if any(new_counts.values()):
+                self.report_progress(
+                    f"任务 {task_id} 发现新结果: "
+                    f"{new_counts['assets']} 个资产, {new_counts['leaks']} 个泄露, "
+                    f"{new_counts['domains']} 个子域名",
+                    task_id
+                )
+            return new_counts
+        except Exception as e:
+            self.report_error(f"收集中间结果失败: {str(e)}")
+            return None
+        
+    def collect_final_results(self, task_id, cursors=None):
+        """收集最终结果，已经通过中间结果发送过的记录不再重复发送"""
+        try:
+            if cursors is None:
+                cursors = {result_type: 0 for result_type in RESULT_TYPES}
+            self.collect_new_results(task_id, cursors, is_final=True)
+            
+            if any(cursors.values()):
+                self.report_progress(
+                    f"任务 {task_id} 完成，共发现 "
+                    f"{cursors['assets']} 个资产, {cursors['leaks']} 个泄露, "
+                    f"{cursors['domains']} 个子域名",
+                    task_id
+                )
+        except Exception as e:
+            self.report_error(f"收集最终结果失败: {str(e)}")
+        
+    def iter_results(self, result_type, task_id, offset=0, raw=False):
+        """分页获取任务结果，跳过前 offset 条记录，逐批返回格式化后的记录（raw 为 True 时返回原始记录）
+
+        请求时指定按 _id 升序（写入顺序）分页，因此 offset 之后的记录就是新增的记录；
+        ARL 默认按 -_id 排列，不指定时任务运行中新写入的结果会使已获取的页整体后移
+        """
+        path, formatter, desc = RESULT_TYPES[result_type]
+        page_size = self.client.options["page_size"]
+        start_page = offset // page_size + 1
+        skip = offset % page_size
+        try:
+            for page, items in self.client.iter_pages(
+                path,
+                {"task_id": task_id, "order": RESULT_ORDER},
+                page_size=page_size,
+                start_page=start_page,
+                refresh=self.refresh_token
+            ):
+                if page == start_page and skip:
+                    items = items[skip:]
+                if items:
+                    yield items if raw else [formatter(item) for item in items]
+        except TokenExpiredError:
+            self.fetch_errors += 1
+            self.listener.on_token_expired(self.beacon)
+        except Exception as e:
+            self.fetch_errors += 1
+            self.report_error(f"获取{desc}失败: {str(e)}")
+
+
+class Engine(EngineListener):
+    """不依赖 Qt 的核心引擎：灯塔管理、目标分配、任务提交和监控、历史任务轮询、结果缓存、结果库和导出
+
+    图形界面和命令行都只是引擎的使用方，通过 listener 接收事件；
+    引擎本身作为各灯塔工作线程的 listener，先更新任务记录再转发给使用方
+    """
+
+    def __init__(self, config, listener=None):
+        self.config = config
+        self.listener = listener or EngineListener()
+        self.lock = threading.RLock()
+        configure_clients(config.get_client_options())
+        # 任何组件刷新 token 后都由引擎更新灯塔信息并保存
+        add_token_listener(self.on_token_refreshed)
+        load_cost_models(config.get_beacon_stats())
+        self.beacons = config.get_successful_beacons()  # {target: {"target", "token"}}
+        self.task_records = config.get_task_records()    # {beacon: {task_id: 状态}}
+        self.poll_options = config.get_poll_options()
+        # 请求指标定期写入 Prometheus 文本文件和 JSON 快照
+        self.metrics_options = dict(DEFAULT_METRICS_OPTIONS)
+        self.metrics_options.update(config.get_metrics_options())
+        self.next_metrics_export = 0
+        # 任务完成后灯塔耗时模型有变化，由轮询线程合并保存，关闭时再保存一次
+        self.beacon_stats_dirty = False
+        # 可选的性能剖析，关闭引擎时写入结果
+        profile_options = config.get_profile_options()
+        if profile_options.get("enabled"):
+            start_profiling(profile_options)
+        # 所有灯塔共享的待提交目标队列
+        self.queue = TaskQueue(config.get_default_beacon_limit(), config.get_beacon_limits())
+        # 历史运行中任务按灯塔自适应轮询
+        self.record_scheduler = PollScheduler(self.poll_options)
+        self.workers = {}  # {beacon: BeaconWorker}
+        self.running = False
+        self.poll_thread = None
+        self.poll_event = threading.Event()
+        # 已完成任务的结果缓存在本地，导出和查看时不再访问灯塔
+        try:
+            self.result_cache = ResultCache(config.cache_dir, config.get_cache_options())
+        except Exception as e:
+            print(f"Result cache initialization error: {str(e)}")
+            self.result_cache = None
+        # 所有结果写入本地结果库，跨任务、跨灯塔去重
+        try:
+            self.warehouse = ResultWarehouse(config.warehouse_file)
+        except Exception as e:
+            print(f"Result warehouse initialization error: {str(e)}")
+            self.warehouse = ResultWarehouse(":memory:")
+
+    # ---- 生命周期 ----
+
+    def start(self):
+        """启动历史任务轮询线程，并为队列中有目标的灯塔启动任务线程"""
+        if self.running:
+            return
+        self.running = True
+        self.poll_event.clear()
+        self.poll_thread = threading.Thread(target=self.poll_loop, name="dtgo-poll", daemon=True)
+        self.poll_thread.start()
+        for beacon in list(self.beacons):
+            self.ensure_worker(beacon)
+
+    def shutdown(self):
+        """停止所有线程，保存统计和配置，关闭结果库和连接"""
+        self.running = False
+        self.poll_event.set()
+        with self.lock:
+            workers = list(self.workers.values())
+        for worker in workers:
+            worker.stop()
+        for worker in workers:
+            if worker.thread:
+                worker.thread.join()
+        if self.poll_thread:
+            self.poll_thread.join()
+        self.export_metrics()
+        self.save_beacon_stats()
+        remove_token_listener(self.on_token_refreshed)  # 之后刷新的 token 不再写入已关闭的配置
+        self.config.close()  # 写入所有延迟保存的配置和任务记录
+        self.warehouse.close()
+        close_all_clients()  # 关闭所有灯塔长连接
+        output_dir = stop_profiling()
+        if output_dir:
+            self.listener.on_message(None, f"性能剖析结果已写入 {output_dir}")
+
+    def is_idle(self):
+        """没有运行中的任务线程，也没有等待提交的目标"""
+        with self.lock:
+            return not self.workers and not self.queue.has_work()
+
+    def wait_idle(self, timeout=None):
+        """等待所有提交的目标执行完成，返回是否已空闲"""
+        deadline = None if timeout is None else time.time() + timeout
+        while not self.is_idle():
+            if deadline is not None and time.time() >= deadline:
+                return False
+            time.sleep(0.2)
+        return True
+
+    # ---- 灯塔 ----
+
+    def add_beacon(self, beacon_info):
+        with self.lock:
+            self.beacons[beacon_info["target"]] = beacon_info
+        get_client(beacon_info["target"]).token = beacon_info["token"]
+        self.config.save_beacon(beacon_info)
+        # 新加入的灯塔可以领取队列中无人认领的目标
+        self.ensure_worker(beacon_info["target"])
+
+    def login_beacon(self, address, username, password):
+        """用账号密码登录灯塔，成功后加入灯塔列表并返回灯塔信息，失败返回 None"""
+        client = get_client(address)
+        try:
+            if not client.login(username, password):
+                close_client(address)
+                return None
+        except Exception:
+            close_client(address)
+            raise
+        beacon_info = {
+            "token": client.token,
+            "target": address  # 添加target字段，与FOFA扫描添加的格式保持一致
+        }
+        self.add_beacon(beacon_info)
+        return beacon_info
+
+    def remove_beacon(self, beacon):
+        """移除灯塔，停止它的任务线程，未领取的目标留给其他灯塔"""
+        with self.lock:
+            self.beacons.pop(beacon, None)
+        self.config.delete_beacon(beacon)
+        self.stop_worker(beacon)
+        close_client(beacon)
+
+    def set_beacon_limit(self, beacons, limit):
+        limits = self.config.get_beacon_limits()
+        for beacon in beacons:
+            self.queue.set_limit(beacon, limit)
+            limits[beacon] = limit
+        self.config.save_beacon_limits(limits)
+
+    def refresh_beacon_token(self, beacon):
+        """重新登录灯塔，新 token 由 on_token_refreshed 保存"""
+        return get_client(beacon).tokens.refresh()
+
+    # ---- 目标分配和任务线程 ----
+
+    def plan(self, targets, beacons):
+        """按各灯塔的任务时长、API 延迟和当前负载分配目标，返回 (并发上限, 分配结果, 预计完成秒数)"""
+        self.refresh_load(beacons)
+        limits = {beacon: self.queue.get_limit(beacon) for beacon in beacons}
+        assignments, finish_times = plan_assignments(targets, beacons, limits, self.queue.preferred_counts())
+        return limits, assignments, finish_times
+
+    def refresh_load(self, beacons):
+        """分配前查询没有任务线程的灯塔的当前负载，有任务线程的灯塔在领取目标时已经更新"""
+        with self.lock:
+            idle = [beacon for beacon in beacons if beacon in self.beacons and beacon not in self.workers]
+        if not idle:
+            return
+
+        def refresh(beacon):
+            try:
+                update_beacon_load(get_client(beacon, self.beacons[beacon]["token"]), get_cost_model(beacon))
+            except Exception as e:
+                # 查询失败时沿用上次的负载
+                self.listener.on_error(beacon, f"查询灯塔 {beacon} 负载失败: {str(e)}")
+
+        with ThreadPoolExecutor(max_workers=min(LOAD_CHECK_WORKERS, len(idle))) as pool:
+            list(pool.map(refresh, idle))
+
+    def enqueue(self, assignments, beacons):
+        """把分配结果放入队列，空闲的灯塔也可以领取其他灯塔的目标"""
+        for beacon, targets in assignments.items():
+            if targets:
+                self.queue.put(targets, beacons, preferred=beacon)
+        for beacon in beacons:
+            self.ensure_worker(beacon)
+
+    def submit(self, targets, beacons=None):
+        """分配并提交目标，beacons 为空时使用所有已登录的灯塔，返回分配结果"""
+        beacons = [beacon for beacon in (beacons or list(self.beacons)) if beacon in self.beacons]
+        if not beacons or not targets:
+            return {}
+        _, assignments, _ = self.plan(targets, beacons)
+        self.enqueue(assignments, beacons)
+        return assignments
+
+    def is_busy(self, beacon):
+        with self.lock:
+            return beacon in self.workers
+
+    def ensure_worker(self, beacon):
+        """确保灯塔有一个从队列领取目标的任务线程"""
+        with self.lock:
+            worker = self.workers.get(beacon)
+            if worker and worker.running:
+                return
+            if beacon not in self.beacons or not self.queue.has_work(beacon):
+                return
+            worker = BeaconWorker(
+                self.beacons[beacon], [], self.poll_options, self.queue, self, self.result_cache, self.warehouse
+            )
+            worker.thread = threading.Thread(
+                target=self.run_worker, args=(worker,), name=f"dtgo-{beacon}", daemon=True
+            )
+            self.workers[beacon] = worker
+            worker.thread.start()
+
+    def run_worker(self, worker):
+        try:
+            with profile_thread():
+                worker.run()
+        except Exception as e:
+            self.on_error(worker.beacon, f"任务线程异常退出: {str(e)}")
+        with self.lock:
+            if self.workers.get(worker.beacon) is worker:
+                del self.workers[worker.beacon]
+        self.listener.on_worker_finished(worker.beacon)
+        # 没有被停止的线程退出时，队列中仍有目标则重新启动
+        if worker.running and self.running:
+            self.ensure_worker(worker.beacon)
+        elif self.running:
+            # 被停止的线程可能在退出前放回了提交失败的目标
+            self.reassign_pending()
+
+    def stop_worker(self, beacon):
+        with self.lock:
+            worker = self.workers.get(beacon)
+        if worker:
+            worker.stop()
+        self.queue.remove_beacon(beacon)
+        self.reassign_pending()
+
+    def reassign_pending(self):
+        """灯塔离开后让其余灯塔领取开放出来的目标，没有灯塔时丢弃队列中的目标，避免引擎永远不空闲"""
+        with self.lock:
+            beacons = list(self.beacons)
+        if not beacons:
+            dropped = self.queue.clear()
+            if dropped:
+                self.listener.on_error(None, f"没有可用的灯塔，{len(dropped)} 个目标未提交")
+            return
+        if self.running:
+            for beacon in beacons:
+                self.ensure_worker(beacon)
+
+    # ---- 任务记录 ----
+
+    def set_task_status(self, beacon, task_id, status, create=False):
+        """更新任务记录的状态，create 为 False 时只更新已有的记录，返回是否有变化"""
+        with self.lock:
+            tasks = self.task_records.get(beacon)
+            if tasks is None:
+                if not create:
+                    return False
+                tasks = self.task_records[beacon] = {}
+            if task_id not in tasks and not create:
+                return False
+            if tasks.get(task_id) == status:
+                return False
+            tasks[task_id] = status
+        # 只更新这一条任务记录
+        self.config.set_task_status(beacon, task_id, status)
+        return True
+
+    def running_tasks(self):
+        """返回运行中的历史任务 {beacon: [task_id]}"""
+        with self.lock:
+            return {
+                beacon: running for beacon, running in (
+                    (beacon, [task_id for task_id, status in tasks.items() if status == "运行中"])
+                    for beacon, tasks in self.task_records.items()
+                ) if running
+            }
+
+    def finished_task_keys(self, tasks):
+        """tasks 中已结束的任务，这些任务的结果不会再变化，可以写入缓存"""
+        with self.lock:
+            return {
+                (beacon, task_id) for beacon, task_id in tasks
+                if self.task_records.get(beacon, {}).get(task_id) == "已结束"
+            }
+
+    def poll_loop(self):
+        with profile_thread():
+            interval = self.record_scheduler.options["min_interval"]
+            while self.running:
+                with span("poll.records"):
+                    self.poll_task_records()
+                if self.beacon_stats_dirty:
+                    self.save_beacon_stats()
+                if time.time() >= self.next_metrics_export:
+                    self.export_metrics()
+                    self.next_metrics_export = time.time() + self.metrics_options["interval"]
+                self.poll_event.wait(interval)
+
+    def save_beacon_stats(self):
+        self.beacon_stats_dirty = False
+        self.config.save_beacon_stats(dump_cost_models())
+
+    def export_metrics(self):
+        """把请求指标写入配置的 Prometheus 文本文件和 JSON 快照"""
+        metrics = get_metrics()
+        for key, write in (("prometheus_file", metrics.write_prometheus), ("json_file", metrics.write_json)):
+            path = self.metrics_options.get(key)
+            if not path:
+                continue
+            try:
+                write(path)
+            except Exception as e:
+                self.listener.on_error(None, f"写入请求指标失败: {str(e)}")
+
+    def poll_task_records(self):
+        """检查到达轮询时间的灯塔上运行中的历史任务状态"""
+        running_tasks = self.running_tasks()
+        
+        # 没有运行中任务的灯塔不再参与调度
+        for beacon in list(self.record_scheduler.entries):
+            if beacon not in running_tasks:
+                self.record_scheduler.remove(beacon)
+        
+        if not running_tasks:
+            return
+            
+        # 只检查到达轮询时间的灯塔
+        for beacon in running_tasks:
+            if beacon not in self.record_scheduler:
+                self.record_scheduler.add(beacon)
+        due_beacons = set(self.record_scheduler.due())
+            
+        for beacon, task_ids in running_tasks.items():
+            if beacon not in self.beacons or beacon not in due_beacons:
+                continue
+            # 正在由任务线程监控的任务不重复查询
+            worker = self.workers.get(beacon)
+            if worker:
+                task_ids = [task_id for task_id in task_ids if task_id not in worker.active_tasks]
+                if not task_ids:
+                    continue
+                
+            try:
+                changed = self.check_beacon_tasks(beacon, task_ids)
+                self.record_scheduler.record(beacon, bool(changed))
+            except Exception as e:
+                self.record_scheduler.record(beacon, False)
+                self.listener.on_error(beacon, f"检查灯塔 {beacon} 任务状态失败: {str(e)}")
+
+    def check_beacon_tasks(self, beacon, task_ids, retry=True):
+        """检查单个灯塔的任务状态，支持token过期重试，返回状态有变化的任务数"""
+        try:
+            client = get_client(beacon, self.beacons[beacon]["token"])
+            # 与任务线程共享同一个任务列表快照
+            tasks = client.get_task_statuses(
+                task_ids,
+                refresh=(lambda: self.refresh_beacon_token(beacon)) if retry else None
+            )
+            
+            changed = 0
+            for task_id in task_ids:
+                if task_id in tasks and tasks[task_id]["status"] in ("done", "stop"):
+                    if self.set_task_status(beacon, task_id, "已结束"):
+                        self.listener.on_task_status(beacon, task_id, "已结束")
+                        changed += 1
+            return changed
+        except TokenExpiredError:
+            # 刷新失败，移除灯塔
+            self.on_token_expired(beacon)
+            return 0
+        except Exception:
+            # 发生错误时尝试刷新token重试
+            if retry and self.refresh_beacon_token(beacon):
+                return self.check_beacon_tasks(beacon, task_ids, retry=False)
+            raise
+
+    def delete_task(self, beacon, task_id):
+        """删除灯塔上的任务和本地记录、缓存，远程删除失败时保留本地记录，返回是否成功"""
+        if beacon not in self.beacons:
+            return False
+        if not self.delete_remote_task(beacon, task_id):
+            return False
+        with self.lock:
+            tasks = self.task_records.get(beacon, {})
+            tasks.pop(task_id, None)
+            if not tasks:
+                self.task_records.pop(beacon, None)
+        self.config.delete_task_record(beacon, task_id)
+        if self.result_cache:
+            self.result_cache.invalidate(beacon, task_id)
+        self.warehouse.delete_task(beacon, task_id)
+        return True
+
+    def delete_remote_task(self, beacon, task_id, retry=True):
+        """删除灯塔上的任务和任务数据，支持token过期重试"""
+        try:
+            self.listener.on_message(beacon, f"正在删除任务 {task_id}...")
+            client = get_client(beacon, self.beacons[beacon]["token"])
+            response = client.post(
+                "/task/delete/",
+                json={"task_id": [task_id], "del_task_data": True},
+                headers={"Content-Type": "application/json"}
+            )
+            result = response.json()
+            if result.get("code") == 200:
+                self.listener.on_message(beacon, f"任务 {task_id} 删除成功")
+                return True
+            if result.get("code") == 401:
+                if retry and self.refresh_beacon_token(beacon):
+                    return self.delete_remote_task(beacon, task_id, retry=False)
+                self.on_token_expired(beacon)
+            else:
+                self.listener.on_error(beacon, f"删除任务失败: {result.get('message', '未知错误')}")
+        except Exception as e:
+            self.listener.on_error(beacon, f"删除任务失败: {str(e)}")
+        return False
+
+    # ---- 导出 ----
+
+    def exportable_tasks(self, tasks):
+        """tasks 中可以获取结果的任务：灯塔可用或结果已在本地缓存中"""
+        return [
+            (beacon, task_id) for beacon, task_id in tasks
+            if beacon in self.beacons or (self.result_cache and self.result_cache.contains(beacon, task_id))
+        ]
+
+    def create_exporter(self, tasks, writer):
+        """创建获取 tasks 结果并交给 writer 的导出器，没有缓存且灯塔不可用的任务被跳过"""
+        tasks = self.exportable_tasks(tasks)
+        tokens = {beacon: self.beacons[beacon]["token"] for beacon, _ in tasks if beacon in self.beacons}
+        from dtgo_export import TaskExporter  # dtgo_export 依赖本模块的 RESULT_TYPES
+        return TaskExporter(
+            tasks, tokens, writer, self.config.get_export_options(), self.result_cache,
+            self.finished_task_keys(tasks), self.warehouse, listener=self
+        )
+
+    def create_warehouse_exporter(self, tasks, writer):
+        """创建读取 tasks 去重结果的导出器，tasks 为 None 时读取全部"""
+        from dtgo_export import WarehouseExporter
+        return WarehouseExporter(self.warehouse, tasks, writer, listener=self)
+
+    # ---- 工作线程回调，先更新引擎状态再转发 ----
+
+    def on_message(self, beacon, message):
+        self.listener.on_message(beacon, message)
+
+    def on_error(self, beacon, message):
+        self.listener.on_error(beacon, message)
+
+    def on_progress(self, beacon, task_id, message):
+        self.listener.on_progress(beacon, task_id, message)
+
+    def on_results(self, beacon, task_id, result_type, items, is_final):
+        self.listener.on_results(beacon, task_id, result_type, items, is_final)
+
+    def on_task_created(self, beacon, task_id, target):
+        self.set_task_status(beacon, task_id, "运行中", create=True)
+        self.listener.on_task_created(beacon, task_id, target)
+
+    def on_task_completed(self, beacon, task_id):
+        self.set_task_status(beacon, task_id, "已结束")
+        self.beacon_stats_dirty = True
+        self.listener.on_task_completed(beacon, task_id)
+
+    def on_task_status(self, beacon, task_id, status):
+        self.listener.on_task_status(beacon, task_id, status)
+
+    def on_token_expired(self, beacon):
+        # 重新登录失败的灯塔从列表和存储中移除
+        if beacon in self.beacons:
+            self.remove_beacon(beacon)
+        self.listener.on_token_expired(beacon)
+
+    def on_token_refreshed(self, beacon, token):
+        with self.lock:
+            beacon_info = self.beacons.get(beacon)
+            if beacon_info:
+                beacon_info["token"] = token
+        if beacon_info:
+            self.config.save_beacon(beacon_info)
+        self.listener.on_token_refreshed(beacon, token)
+
+    def on_export_progress(self, done, total, message):
+        self.listener.on_export_progress(done, total, message)
@@ -0,0 +1,86 @@
+import threading
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+from dtgo_profile import span
+
+FLUSH_INTERVAL_MS = 250      # 向界面刷新的间隔（毫秒）
+MAX_ROWS_PER_FLUSH = 20000   # 每次刷新最多交给界面的结果条数，剩余的留到下一次
+
+
+class EventBus(QObject):
+    """任务线程和界面之间的事件总线
+
+    任务线程只把结果批次、进度和消息写入共享缓冲区，不跨线程发送信号；
+    界面线程的定时器按固定间隔取出缓冲区，合并后一次性交给界面。
+    同一任务的多条进度只保留最新一条
+    """
+
+    results_ready = pyqtSignal(dict)   # {"assets": rows, "leaks": rows, "domains": rows, "is_final": bool}
+    progress_ready = pyqtSignal(dict)  # {(beacon, task_id): 最新进度}
+    messages_ready = pyqtSignal(list)  # [消息]
+
+    def __init__(self, parent=None, interval=FLUSH_INTERVAL_MS, max_rows=MAX_ROWS_PER_FLUSH):
+        super().__init__(parent)
+        self.lock = threading.Lock()
+        self.result_batches = []  # [(result_type, rows, is_final)]
+        self.progress = {}
+        self.messages = []
+        self.max_rows = max_rows
+        self.timer = QTimer(self)
+        self.timer.setInterval(interval)
+        self.timer.timeout.connect(self.flush)
+
+    def start(self):
+        self.timer.start()
+
+    def stop(self):
+        self.timer.stop()
+        self.flush()
+
+    # 任务线程调用
+    def publish_results(self, result_type, rows, is_final=False):
+        if rows:
+            with self.lock:
+                self.result_batches.append((result_type, rows, is_final))
+
+    def publish_progress(self, beacon, task_id, message):
+        with self.lock:
+            self.progress[(beacon, task_id)] = message
+
+    def publish_message(self, message):
+        with self.lock:
+            self.messages.append(message)
+
+    def pending_rows(self):
+        with self.lock:
+            return sum(len(rows) for _, rows, _ in self.result_batches)
+
+    # 界面线程调用
+    def take_results(self):
+        """取出不超过 max_rows 条结果，按类型合并"""
+        results = {"assets": [], "leaks": [], "domains": [], "is_final": False}
+        with self.lock:
+            taken = 0
+            count = 0
+            for result_type, rows, is_final in self.result_batches:
+                # 至少取一批，避免单批超过上限时永远取不出
+                if count and taken + len(rows) > self.max_rows:
+                    break
+                results[result_type].extend(rows)
+                results["is_final"] = results["is_final"] or is_final
+                taken += len(rows)
+                count += 1
+            del self.result_batches[:count]
+        return results if count else None
+
+    def flush(self):
+        with span("ui.flush"):
+            results = self.take_results()
+            with self.lock:
+                progress, self.progress = self.progress, {}
+                messages, self.messages = self.messages, []
+            if results:
+                self.results_ready.emit(results)
+            if progress:
+                self.progress_ready.emit(progress)
+            if messages:
+                self.messages_ready.emit(messages)
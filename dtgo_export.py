@@ -0,0 +1,504 @@
+import csv
+import gzip
+import json
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dtgo_client import get_client
+from dtgo_engine import RESULT_TYPES, RESULT_ORDER, EngineListener
+from dtgo_profile import span, profile_thread
+
+# 默认导出配置，可以通过配置文件中的 "export" 覆盖
+DEFAULT_EXPORT_OPTIONS = {
+    "max_workers": 8,    # 同时获取结果的任务数
+    "per_beacon": 2,     # 同一灯塔同时获取结果的任务数，避免压垮单个灯塔
+}
+EXCEL_MAX_ROWS = 1048576  # Excel 单个工作表的最大行数（包含表头）
+
+
+def format_finger(item, sep=', '):
+    return sep.join([f"{f['name']}{f.get('version', '')}" for f in item.get('finger', [])])
+
+
+# 每类结果导出时的工作表名、表头和行格式
+EXPORT_COLUMNS = {
+    "assets": (
+        "资产列表",
+        ["灯塔地址", "任务ID", "网站", "标题", "IP", "Server", "指纹"],
+        lambda item: [item.get('site', ''), item.get('title', ''), item.get('ip', ''),
+                      item.get('http_server', ''), format_finger(item)]
+    ),
+    "domains": (
+        "子域名列表",
+        ["灯塔地址", "任务ID", "域名", "类型", "IP列表"],
+        lambda item: [item.get('domain', ''), item.get('type', ''), ', '.join(item.get('ips', []))]
+    ),
+    "leaks": (
+        "信息泄露列表",
+        ["灯塔地址", "任务ID", "URL", "标题"],
+        lambda item: [item.get('url', ''), item.get('title', '')]
+    ),
+}
+
+
+class XlsxStreamWriter:
+    """边获取边写入的 XLSX 导出，使用 openpyxl 的只写模式，内存占用与导出行数无关
+
+    工作表在第一次写入时创建，超过 Excel 行数上限后自动续写到新的工作表
+    """
+
+    def __init__(self, file_name, max_rows=EXCEL_MAX_ROWS):
+        from openpyxl import Workbook
+        self.file_name = file_name
+        self.max_rows = max_rows
+        self.workbook = Workbook(write_only=True)
+        self.sheets = {}  # {result_type: [工作表, 已写入行数, 工作表序号]}
+        self.rows = 0
+
+    def new_sheet(self, result_type, number):
+        title, headers, _ = EXPORT_COLUMNS[result_type]
+        if number > 1:
+            title = f"{title}{number}"
+        sheet = self.workbook.create_sheet(title)
+        sheet.append(headers)
+        return [sheet, 1, number]
+
+    def write_rows(self, result_type, beacon, task_id, items):
+        _, _, format_row = EXPORT_COLUMNS[result_type]
+        state = self.sheets.get(result_type)
+        if state is None:
+            state = self.sheets[result_type] = self.new_sheet(result_type, 1)
+        for item in items:
+            if state[1] >= self.max_rows:
+                state = self.sheets[result_type] = self.new_sheet(result_type, state[2] + 1)
+            state[0].append([beacon, task_id] + format_row(item))
+            state[1] += 1
+        self.rows += len(items)
+
+    def close(self):
+        if not self.sheets:
+            # 没有任何结果时也保留一个工作表，保证文件可以打开
+            self.new_sheet("assets", 1)
+        self.workbook.save(self.file_name)
+
+
+COMPRESSION_SUFFIXES = (".gz", ".zst")
+
+
+def split_compression(file_name):
+    """拆分文件名中的压缩后缀，返回 (不含压缩后缀的文件名, 压缩后缀)"""
+    for suffix in COMPRESSION_SUFFIXES:
+        if file_name.endswith(suffix):
+            return file_name[:-len(suffix)], suffix
+    return file_name, ""
+
+
+def open_text_output(file_name):
+    """按后缀打开文本输出文件，.gz 使用 gzip，.zst 需要安装 zstandard"""
+    if file_name.endswith(".gz"):
+        return gzip.open(file_name, "wt", encoding="utf-8", newline="")
+    if file_name.endswith(".zst"):
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError("导出 .zst 文件需要安装 zstandard")
+        return zstandard.open(file_name, "wt", encoding="utf-8", newline="")
+    return open(file_name, "w", encoding="utf-8", newline="")
+
+
+class CsvStreamWriter:
+    """每类结果写入一个 CSV 文件（名称_assets.csv 等），由 csv 模块处理引号和转义"""
+
+    FILE_SUFFIXES = {"assets": "_assets", "domains": "_domains", "leaks": "_leaks"}
+
+    def __init__(self, file_name):
+        base_name, compression = split_compression(file_name)
+        base_name = base_name.rsplit('.', 1)[0]
+        self.files = {}
+        self.writers = {}
+        self.file_names = []
+        self.rows = 0
+        try:
+            for result_type, suffix in self.FILE_SUFFIXES.items():
+                name = f"{base_name}{suffix}.csv{compression}"
+                self.files[result_type] = open_text_output(name)
+                self.writers[result_type] = csv.writer(self.files[result_type])
+                self.writers[result_type].writerow(EXPORT_COLUMNS[result_type][1])
+                self.file_names.append(name)
+        except Exception:
+            self.close()
+            raise
+
+    def write_rows(self, result_type, beacon, task_id, items):
+        format_row = EXPORT_COLUMNS[result_type][2]
+        self.writers[result_type].writerows([beacon, task_id] + format_row(item) for item in items)
+        self.rows += len(items)
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+
+
+class JsonlStreamWriter:
+    """所有结果写入一个 JSON Lines 文件，每行保留灯塔返回的原始记录"""
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.file = open_text_output(file_name)
+        self.rows = 0
+
+    def write_rows(self, result_type, beacon, task_id, items):
+        lines = [
+            json.dumps({"type": result_type, "beacon": beacon, "task_id": task_id, "data": item},
+                       ensure_ascii=False, default=str)
+            for item in items
+        ]
+        if lines:
+            self.file.write("\n".join(lines) + "\n")
+        self.rows += len(items)
+
+    def close(self):
+        self.file.close()
+
+
+# 列式导出的字段名，和 EXPORT_COLUMNS 的列一一对应；DICTIONARY_FIELDS 中的列重复值多，使用字典编码
+ARROW_FIELDS = {
+    "assets": ["beacon", "task_id", "site", "title", "ip", "server", "finger"],
+    "domains": ["beacon", "task_id", "domain", "type", "ips"],
+    "leaks": ["beacon", "task_id", "url", "title"],
+}
+DICTIONARY_FIELDS = {"beacon", "task_id", "server", "finger", "type"}
+
+
+class ArrowStreamWriter:
+    """每类结果写入一个 Parquet 或 Feather 文件（名称_assets.parquet 等），需要安装 pyarrow
+
+    结果先在内存中攒够 batch_size 行再写成一个批次；字典编码的列在整个文件中共用
+    一个只增不减的字典，Feather 文件据此写入字典增量
+    """
+
+    FILE_SUFFIXES = CsvStreamWriter.FILE_SUFFIXES
+
+    def __init__(self, file_name, batch_size=50000):
+        try:
+            import pyarrow
+        except ImportError:
+            raise RuntimeError("导出 Parquet/Feather 文件需要安装 pyarrow")
+        self.pa = pyarrow
+        self.base_name, self.extension = file_name.rsplit('.', 1)
+        self.batch_size = batch_size
+        self.buffers = {result_type: [] for result_type in ARROW_FIELDS}
+        self.dictionaries = {}  # {(result_type, field): {value: index}}
+        self.writers = {}
+        self.rows = 0
+
+    def schema(self, result_type):
+        pa = self.pa
+        return pa.schema([
+            (field, pa.dictionary(pa.int32(), pa.string()) if field in DICTIONARY_FIELDS else pa.string())
+            for field in ARROW_FIELDS[result_type]
+        ])
+
+    def open_writer(self, result_type):
+        schema = self.schema(result_type)
+        name = f"{self.base_name}{self.FILE_SUFFIXES[result_type]}.{self.extension}"
+        if self.extension == "parquet":
+            import pyarrow.parquet
+            return pyarrow.parquet.ParquetWriter(name, schema, compression="zstd")
+        options = self.pa.ipc.IpcWriteOptions(compression="zstd", emit_dictionary_deltas=True)
+        return self.pa.ipc.new_file(name, schema, options=options)
+
+    def encode(self, result_type, field, values):
+        """用文件级的字典编码一列，新值追加到字典末尾"""
+        mapping = self.dictionaries.setdefault((result_type, field), {})
+        indices = []
+        for value in values:
+            index = mapping.get(value)
+            if index is None:
+                index = mapping[value] = len(mapping)
+            indices.append(index)
+        return self.pa.DictionaryArray.from_arrays(
+            self.pa.array(indices, type=self.pa.int32()),
+            self.pa.array(list(mapping), type=self.pa.string())
+        )
+
+    def write_rows(self, result_type, beacon, task_id, items):
+        format_row = EXPORT_COLUMNS[result_type][2]
+        buffer = self.buffers[result_type]
+        buffer.extend([beacon, task_id] + format_row(item) for item in items)
+        self.rows += len(items)
+        if len(buffer) >= self.batch_size:
+            self.flush(result_type)
+
+    def flush(self, result_type):
+        buffer = self.buffers[result_type]
+        writer = self.writers.get(result_type)
+        if writer is None:
+            writer = self.writers[result_type] = self.open_writer(result_type)
+        if not buffer:
+            return
+        columns = []
+        for field, values in zip(ARROW_FIELDS[result_type], zip(*buffer)):
+            if field in DICTIONARY_FIELDS:
+                columns.append(self.encode(result_type, field, values))
+            else:
+                columns.append(self.pa.array(values, type=self.pa.string()))
+        writer.write_batch(self.pa.RecordBatch.from_arrays(columns, schema=self.schema(result_type)))
+        self.buffers[result_type] = []
+
+    def close(self):
+        # 没有结果的类型也写出只有表头的文件
+        for result_type in ARROW_FIELDS:
+            self.flush(result_type)
+        for writer in self.writers.values():
+            writer.close()
+
+
+def create_export_writer(file_name):
+    """根据文件名选择导出格式，支持 .xlsx、.csv、.jsonl、.parquet、.feather 以及 .gz/.zst 压缩的文本格式"""
+    base_name, compression = split_compression(file_name)
+    if base_name.endswith((".parquet", ".feather")) and not compression:
+        return ArrowStreamWriter(file_name)
+    if base_name.endswith(".jsonl"):
+        return JsonlStreamWriter(file_name)
+    if base_name.endswith(".xlsx") and not compression:
+        return XlsxStreamWriter(file_name)
+    return CsvStreamWriter(file_name)
+
+
+class BackgroundWriter:
+    """在独立线程中执行写入和压缩，获取结果的线程只需把批次放入有界队列
+
+    队列满时 write_rows 阻塞，内存占用不超过 max_pending 个批次
+    """
+
+    def __init__(self, writer, max_pending=64):
+        self.writer = writer
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.error = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    @property
+    def rows(self):
+        return self.writer.rows
+
+    def run(self):
+        with profile_thread():
+            while True:
+                batch = self.queue.get()
+                if batch is None:
+                    return
+                if self.error is None:
+                    try:
+                        with span("persist.export", result_type=batch[0], rows=len(batch[3])):
+                            self.writer.write_rows(*batch)
+                    except Exception as e:
+                        self.error = e
+
+    def write_rows(self, result_type, beacon, task_id, items):
+        if self.error is not None:
+            raise self.error
+        self.queue.put((result_type, beacon, task_id, items))
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        self.writer.close()
+        if self.error is not None:
+            raise self.error
+
+
+class ResultViewWriter:
+    """把获取到的结果格式化后交给事件总线，显示在界面的结果表格中"""
+
+    def __init__(self, event_bus):
+        self.event_bus = event_bus
+        self.rows = 0
+
+    def write_rows(self, result_type, beacon, task_id, items):
+        formatter = RESULT_TYPES[result_type][1]
+        self.event_bus.publish_results(result_type, [formatter(item) for item in items], True)
+        self.rows += len(items)
+
+    def close(self):
+        pass
+
+
+class ExportCancelled(Exception):
+    """导出任务被取消"""
+
+
+class TaskExporter:
+    """并行获取多个任务的结果，每页结果获取后立即交给 writer 写入
+
+    工作线程池大小固定，调度时跳过已达到并发上限的灯塔，
+    各灯塔的任务轮流提交，少量任务的灯塔不会排在大量任务的灯塔后面；
+    进度和错误通过 listener（EngineListener）回调通知，token 由灯塔共享的 TokenManager 刷新
+    """
+
+    def __init__(self, tasks, tokens, writer, options=None, cache=None, finished_tasks=None, warehouse=None,
+                 listener=None):
+        """tasks 为 [(beacon, task_id)]，tokens 为 {beacon: token}
+
+        writer 需要提供 write_rows(result_type, beacon, task_id, items) 和 close()；
+        有缓存的任务直接从 cache 读取，finished_tasks 中的已完成任务第一次获取时写入缓存；
+        从灯塔获取的结果同时写入 warehouse
+        """
+        self.listener = listener or EngineListener()
+        self.tasks = list(tasks)
+        self.tokens = tokens
+        self.writer = writer
+        self.writer_lock = threading.Lock()
+        self.cache = cache
+        self.finished_tasks = set(finished_tasks or ())
+        self.cached_tasks = 0  # 从本地缓存读取的任务数
+        self.warehouse = warehouse
+        self.options = dict(DEFAULT_EXPORT_OPTIONS)
+        if options:
+            self.options.update(options)
+        self.cancel_event = threading.Event()
+        self.rows = 0
+        self.rows_lock = threading.Lock()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def is_cancelled(self):
+        return self.cancel_event.is_set()
+
+    def run(self):
+        """获取所有结果并关闭 writer，返回导出的任务数（去重导出为记录数），失败时返回 0"""
+        exported = 0
+        try:
+            exported = self.fetch_all()
+            self.listener.on_export_progress(len(self.tasks), len(self.tasks), "正在保存文件...")
+        except Exception as e:
+            self.listener.on_error(None, f"导出失败: {str(e)}")
+        finally:
+            try:
+                self.writer.close()
+            except Exception as e:
+                exported = 0
+                self.listener.on_error(None, f"导出失败: {str(e)}")
+        return exported
+
+    def fetch_all(self):
+        """按灯塔并发上限调度获取所有任务的结果，返回成功获取的任务数"""
+        pending = {}  # {beacon: deque[task_id]}
+        for beacon, task_id in self.tasks:
+            pending.setdefault(beacon, deque()).append(task_id)
+        running = {beacon: 0 for beacon in pending}
+        per_beacon = max(self.options["per_beacon"], 1)
+        exported = 0
+        total = len(self.tasks)
+        done = 0
+        start = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=max(self.options["max_workers"], 1)) as pool:
+            futures = {}  # {future: (beacon, task_id)}
+            while True:
+                # 轮流为每个未达到上限的灯塔提交一个任务，直到线程池占满
+                submitted = True
+                while submitted and not self.is_cancelled() and len(futures) < self.options["max_workers"]:
+                    submitted = False
+                    for beacon, task_queue in pending.items():
+                        if task_queue and running[beacon] < per_beacon and len(futures) < self.options["max_workers"]:
+                            task_id = task_queue.popleft()
+                            future = pool.submit(self.fetch_task, beacon, task_id)
+                            futures[future] = (beacon, task_id)
+                            running[beacon] += 1
+                            submitted = True
+                if not futures:
+                    break
+
+                finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    beacon, task_id = futures.pop(future)
+                    running[beacon] -= 1
+                    done += 1
+                    try:
+                        future.result()
+                        exported += 1
+                    except ExportCancelled:
+                        pass
+                    except Exception as e:
+                        self.listener.on_error(beacon, f"获取任务 {task_id} 结果失败: {str(e)}")
+                    elapsed = max(time.monotonic() - start, 0.001)
+                    self.listener.on_export_progress(
+                        done, total,
+                        f"已获取 {done}/{total} 个任务，{self.rows} 条结果，"
+                        f"{done / elapsed:.1f} 任务/秒，{self.rows / elapsed:.0f} 条/秒"
+                    )
+        return exported
+
+    def fetch_task(self, beacon, task_id):
+        """获取单个任务的所有结果并逐页写入，每页之间检查是否已取消"""
+        cached = self.cache.iter_results(beacon, task_id) if self.cache else None
+        if cached is not None:
+            with self.rows_lock:
+                self.cached_tasks += 1
+            for result_type, items in cached:
+                self.write_batch(result_type, beacon, task_id, items)
+            return
+
+        cache_writer = None
+        if self.cache and (beacon, task_id) in self.finished_tasks:
+            cache_writer = self.cache.open_writer(beacon, task_id)
+        try:
+            client = get_client(beacon, self.tokens.get(beacon))
+            for result_type, (path, _, _) in RESULT_TYPES.items():
+                for _, items in client.iter_pages(
+                    path,
+                    {"task_id": task_id, "order": RESULT_ORDER},
+                    refresh=client.tokens.refresh
+                ):
+                    self.write_batch(result_type, beacon, task_id, items)
+                    if cache_writer:
+                        cache_writer.write(result_type, items)
+                    if self.warehouse:
+                        self.warehouse.ingest(result_type, beacon, task_id, items)
+        except Exception:
+            if cache_writer:
+                cache_writer.abort()
+            raise
+        if cache_writer:
+            cache_writer.commit()
+
+    def write_batch(self, result_type, beacon, task_id, items):
+        if self.is_cancelled():
+            raise ExportCancelled()
+        with self.writer_lock:
+            self.writer.write_rows(result_type, beacon, task_id, items)
+        with self.rows_lock:
+            self.rows += len(items)
+
+
+class WarehouseExporter(TaskExporter):
+    """从本地结果库读取跨任务去重后的结果，交给 writer 写入或显示
+
+    tasks 为 None 时读取结果库中的全部记录
+    """
+
+    def __init__(self, warehouse, tasks, writer, listener=None):
+        super().__init__(tasks or [], {}, writer, listener=listener)
+        self.warehouse = warehouse
+        self.selected_tasks = tasks
+
+    def fetch_all(self):
+        """返回读取的去重记录数"""
+        total = len(RESULT_TYPES)
+        start = time.monotonic()
+        for done, result_type in enumerate(RESULT_TYPES, 1):
+            try:
+                for beacon, task_id, items in self.warehouse.iter_items(result_type, self.selected_tasks):
+                    self.write_batch(result_type, beacon, task_id, items)
+            except ExportCancelled:
+                break
+            elapsed = max(time.monotonic() - start, 0.001)
+            self.listener.on_export_progress(
+                done, total, f"已读取 {self.rows} 条去重结果，{self.rows / elapsed:.0f} 条/秒"
+            )
+        return self.rows
@@ -0,0 +1,403 @@
+import bisect
+import functools
+import ipaddress
+import queue
+import re
+import socket
+import time
+from array import array
+from PyQt6.QtCore import QThread, pyqtSignal
+
+# 每类结果中可以按 IP 筛选的列和分面列，列号对应结果表格的列
+FILTER_FIELDS = {
+    "assets": {"ip_columns": [2], "facet_columns": {"server": 3, "finger": 4}},
+    "domains": {"ip_columns": [2], "facet_columns": {"type": 1}},
+    "leaks": {"ip_columns": [], "facet_columns": {}},
+}
+
+# 筛选栏的提示文字，列出每类结果支持的条件
+FILTER_HINTS = {
+    "assets": "筛选: 文本  re:正则  ip:10.0.0.0/8  server:nginx  finger:shiro（多个条件用空格分隔）",
+    "domains": "筛选: 文本  re:正则  ip:10.0.0.0/8  type:A（多个条件用空格分隔）",
+    "leaks": "筛选: 文本  re:正则（多个条件用空格分隔）",
+}
+
+FILTER_DELAY_MS = 200   # 停止输入后多久执行筛选
+VALUE_SEPARATOR = ", "  # 指纹、子域名 IP 列中多个值的分隔符
+CHUNK_ROWS = 65536      # 每段文本包含的行数，正则和无词查询按段扫描
+IPV6_OFFSET = 1 << 32   # IPv6 地址的排序键整体排在 IPv4 之后
+
+WORD_PATTERN = re.compile(r"[^\W_]+")
+TERM_PATTERN = re.compile(r'(?:(\w+):)?(?:"([^"]*)"|(\S+))')
+
+
+class FilterError(ValueError):
+    pass
+
+
+@functools.lru_cache(maxsize=65536)
+def ip_key(text):
+    """IP 的排序键，不是合法 IP 时返回 None"""
+    text = text.strip()
+    try:
+        return int.from_bytes(socket.inet_pton(socket.AF_INET, text), "big")
+    except OSError:
+        pass
+    try:
+        return IPV6_OFFSET + int.from_bytes(socket.inet_pton(socket.AF_INET6, text.split("%")[0]), "big")
+    except OSError:
+        return None
+
+
+def ip_range(text):
+    """把 IP、CIDR 或 "起始IP-结束IP" 转换为排序键区间"""
+    try:
+        if "-" in text:
+            first, last = text.split("-", 1)
+            low, high = ip_key(first), ip_key(last)
+            if low is None or high is None:
+                raise ValueError(text)
+            return low, high
+        network = ipaddress.ip_network(text.strip(), strict=False)
+    except ValueError:
+        raise FilterError(f"无效的 IP 或网段: {text}")
+    offset = 0 if network.version == 4 else IPV6_OFFSET
+    return offset + int(network.network_address), offset + int(network.broadcast_address)
+
+
+def parse_query(text, facet_names=()):
+    """解析筛选条件，多个条件之间为“且”的关系
+
+    文本             所有列中包含该文本（不区分大小写）
+    re:正则          所有列中匹配正则表达式
+    ip:网段          IP 列在该 IP、CIDR 或 "起始IP-结束IP" 范围内
+    分面:值          分面列中有以该值开头的取值，资产为 server: 和 finger:，子域名为 type:
+
+    含空格的值可以用双引号括起来，例如 server:"Apache Tomcat"，不带字段的 "后台 登录" 按整段文本匹配
+    """
+    terms = []
+    for match in TERM_PATTERN.finditer(text):
+        field = (match.group(1) or "").lower()
+        value = match.group(2) if match.group(2) is not None else match.group(3)
+        if field == "re":
+            # 行文本已转为小写，正则中没有大写字符时不需要 IGNORECASE，匹配快很多
+            flags = re.MULTILINE if value == value.lower() else re.IGNORECASE | re.MULTILINE
+            try:
+                terms.append(("re", re.compile(value, flags)))
+            except re.error as e:
+                raise FilterError(f"无效的正则表达式: {value} ({e})")
+        elif field == "ip":
+            terms.append(("ip", ip_range(value)))
+        elif field in facet_names:
+            terms.append(("facet", field, value.lower()))
+        else:
+            value = match.group(0) if field else value
+            if value.strip():
+                terms.append(("text", value.lower()))
+    return terms
+
+
+def merge_postings(postings):
+    """合并多个有序行号数组，返回有序列表"""
+    if len(postings) == 1:
+        return list(postings[0])
+    merged = set()
+    for rows in postings:
+        merged.update(rows)
+    return sorted(merged)
+
+
+class TextChunks:
+    """只追加的文本列表，按 CHUNK_ROWS 条分段，每段拼接成一个字符串用于整段搜索"""
+
+    def __init__(self):
+        self.chunks = []  # [[文本列表, 拼接文本, 每条起始位置]]
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, text):
+        if self.count % CHUNK_ROWS == 0:
+            self.chunks.append([[], None, None])
+        chunk = self.chunks[-1]
+        chunk[0].append(text)
+        chunk[1] = None
+        self.count += 1
+
+    def chunk_text(self, number):
+        """返回第 number 段的拼接文本和每条起始位置，最后一段追加后重新拼接"""
+        chunk = self.chunks[number]
+        if chunk[1] is None:
+            chunk[1] = "\n".join(chunk[0]) + "\n"
+            offsets = array("I", [0])
+            position = 0
+            for text in chunk[0]:
+                position += len(text) + 1
+                offsets.append(position)
+            chunk[2] = offsets
+            if len(chunk[0]) == CHUNK_ROWS:
+                # 写满的段只保留拼接文本
+                chunk[0] = None
+        return chunk[1], chunk[2]
+
+    def get(self, number):
+        chunk = self.chunks[number // CHUNK_ROWS]
+        offset = number % CHUNK_ROWS
+        if chunk[0] is not None:
+            return chunk[0][offset]
+        return chunk[1][chunk[2][offset]:chunk[2][offset + 1] - 1]
+
+    def scan(self, search, verify=None):
+        """逐段搜索，search(文本, 起始位置) 返回匹配位置，verify 校验匹配所在的整条文本"""
+        numbers = []
+        for chunk_number in range(len(self.chunks)):
+            blob, offsets = self.chunk_text(chunk_number)
+            base = chunk_number * CHUNK_ROWS
+            position = search(blob, 0)
+            while position >= 0:
+                number = bisect.bisect_right(offsets, position) - 1
+                if verify is None or verify(blob[offsets[number]:offsets[number + 1] - 1]):
+                    numbers.append(base + number)
+                position = search(blob, offsets[number + 1])
+        return numbers
+
+
+class ResultIndex:
+    """一类结果的筛选索引，只追加不修改，与结果表格的行号一一对应
+
+    - 词倒排索引: 每行文本按字母、数字、汉字切分成词，词 => 行号数组；
+      子串查询先在拼接的词表中搜索候选词，再用原文校验
+    - IP 排序索引: 按 IP 排序的 (键, 行号) 分段有序数组，网段查询二分定位
+    - 分面索引: 分面列的每个取值 => 行号数组
+    - 小写的行文本，用于正则和不含词的查询
+    """
+
+    def __init__(self, ip_columns=(), facet_columns=None):
+        self.ip_columns = list(ip_columns)
+        self.facet_columns = dict(facet_columns or {})
+        self.clear()
+
+    def clear(self):
+        self.texts = []                 # 每行的小写文本
+        self.vocabulary = TextChunks()  # 所有出现过的词，序号即词编号
+        self.word_ids = {}              # {词: 词编号}
+        self.postings = []              # 词编号 => 行号数组
+        self.ip_runs = []               # [(有序键列表, 对应行号数组)]，相邻两段大小接近时合并
+        self.facets = {name: {} for name in self.facet_columns}  # {分面: {取值: 行号数组}}
+
+    @property
+    def row_count(self):
+        return len(self.texts)
+
+    def add_rows(self, rows):
+        word_ids = self.word_ids
+        postings = self.postings
+        ip_entries = []
+        for row_number, row in enumerate(rows, len(self.texts)):
+            text = "\t".join(row).lower()
+            self.texts.append(text)
+            for word in set(WORD_PATTERN.findall(text)):
+                word_id = word_ids.get(word)
+                if word_id is None:
+                    word_id = word_ids[word] = len(postings)
+                    postings.append(array("I"))
+                    self.vocabulary.append(word)
+                postings[word_id].append(row_number)
+            for column in self.ip_columns:
+                for value in row[column].split(VALUE_SEPARATOR):
+                    key = ip_key(value) if value else None
+                    if key is not None:
+                        ip_entries.append((key, row_number))
+            for name, column in self.facet_columns.items():
+                values = self.facets[name]
+                for value in set(row[column].lower().split(VALUE_SEPARATOR)):
+                    if value:
+                        rows_of_value = values.get(value)
+                        if rows_of_value is None:
+                            rows_of_value = values[value] = array("I")
+                        rows_of_value.append(row_number)
+        if ip_entries:
+            self.add_ip_run(ip_entries)
+
+    def add_ip_run(self, entries):
+        entries.sort()
+        self.ip_runs.append(([key for key, _ in entries], array("I", [row for _, row in entries])))
+        # 新段不小于前一段的一半时合并，段数保持在 log(n) 级别
+        while len(self.ip_runs) > 1 and len(self.ip_runs[-2][0]) <= 2 * len(self.ip_runs[-1][0]):
+            keys, rows = self.ip_runs.pop()
+            previous_keys, previous_rows = self.ip_runs.pop()
+            merged = sorted(zip(previous_keys + keys, previous_rows + rows))
+            self.ip_runs.append(([key for key, _ in merged], array("I", [row for _, row in merged])))
+
+    def find_words(self, word, verify=None):
+        """在词表中查找包含 word 的词，返回这些词的行号数组"""
+        word_ids = self.vocabulary.scan(lambda blob, start: blob.find(word, start), verify)
+        return [self.postings[word_id] for word_id in word_ids]
+
+    def select(self, rows, text):
+        texts = self.texts
+        if rows is None:
+            return [row for row, line in enumerate(texts) if text in line]
+        return [row for row in rows if text in texts[row]]
+
+    def match_text(self, text, candidates=None):
+        """包含 text 的行号；candidates 为之前条件得到的有序行号，只在其中查找"""
+        words = list(WORD_PATTERN.finditer(text))
+        if not words:
+            return self.select(candidates, text)
+
+        # 词的前后如果是分隔符，说明它在原文中也是完整的词首或词尾
+        best = None
+        for match in words:
+            word = match.group()
+            starts, ends = match.start() > 0, match.end() < len(text)
+            if starts and ends:
+                postings = [self.postings[self.word_ids[word]]] if word in self.word_ids else []
+            elif starts:
+                postings = self.find_words(word, lambda token: token.startswith(word))
+            elif ends:
+                postings = self.find_words(word, lambda token: token.endswith(word))
+            else:
+                postings = self.find_words(word)
+            size = sum(len(rows) for rows in postings)
+            if best is None or size < best[0]:
+                best = (size, postings)
+            if size == 0:
+                return []
+
+        if candidates is not None and len(candidates) <= best[0]:
+            # 之前的条件已经足够少，直接校验原文
+            return self.select(candidates, text)
+        rows = merge_postings(best[1])
+        if candidates is not None:
+            allowed = set(candidates)
+            rows = [row for row in rows if row in allowed]
+        if len(words) == 1 and words[0].group() == text:
+            return rows
+        return self.select(rows, text)
+
+    def match_regex(self, pattern, candidates=None):
+        search = pattern.search
+        texts = self.texts
+        if candidates is None:
+            return [row for row, line in enumerate(texts) if search(line)]
+        return [row for row in candidates if search(texts[row])]
+
+    def match_ip(self, low, high):
+        postings = []
+        for keys, rows in self.ip_runs:
+            first = bisect.bisect_left(keys, low)
+            last = bisect.bisect_right(keys, high)
+            if first < last:
+                postings.append(rows[first:last])
+        return merge_postings(postings) if postings else []
+
+    def match_facet(self, name, value):
+        postings = [rows for facet, rows in self.facets[name].items() if facet.startswith(value)]
+        return merge_postings(postings) if postings else []
+
+    def query(self, terms):
+        """返回满足所有条件的行号（升序）；没有条件时返回 None 表示不筛选"""
+        if not terms:
+            return None
+        # 先算 IP 和分面这类直接查索引的条件，缩小文本和正则条件的校验范围
+        order = {"ip": 0, "facet": 1, "text": 2, "re": 3}
+        result = None
+        for term in sorted(terms, key=lambda term: order[term[0]]):
+            if term[0] == "text":
+                result = self.match_text(term[1], result)
+            elif term[0] == "re":
+                result = self.match_regex(term[1], result)
+            else:
+                if term[0] == "ip":
+                    rows = self.match_ip(*term[1])
+                else:
+                    rows = self.match_facet(term[1], term[2])
+                if result is not None:
+                    allowed = set(result)
+                    rows = [row for row in rows if row in allowed]
+                result = rows
+            if not result:
+                break
+        return result
+
+    def facet_counts(self, name, limit=50):
+        """分面取值及其行数，按行数从多到少排列"""
+        counts = [(len(rows), value) for value, rows in self.facets.get(name, {}).items()]
+        counts.sort(reverse=True)
+        return [(value, count) for count, value in counts[:limit]]
+
+
+class FilterThread(QThread):
+    """在后台维护各类结果的筛选索引并执行查询
+
+    界面追加结果后调用 add_rows，输入筛选条件后调用 submit；
+    请求按顺序处理，同一类结果排队中的旧查询会被新查询取代
+    """
+    result_signal = pyqtSignal(str, int, object, float)  # (结果类型, 查询编号, 行号列表或 None, 耗时毫秒)
+    error_signal = pyqtSignal(str, int, str)              # (结果类型, 查询编号, 错误信息)
+
+    def __init__(self, fields=None):
+        super().__init__()
+        self.indexes = {
+            result_type: ResultIndex(**options)
+            for result_type, options in (fields or FILTER_FIELDS).items()
+        }
+        self.requests = queue.Queue()
+        self.query_ids = {result_type: 0 for result_type in self.indexes}
+
+    def add_rows(self, result_type, rows):
+        if rows:
+            self.requests.put(("add", result_type, rows))
+
+    def clear(self, result_type):
+        self.requests.put(("clear", result_type, None))
+
+    def submit(self, result_type, text):
+        """提交查询，返回查询编号，界面只采用最新编号的结果"""
+        self.query_ids[result_type] += 1
+        query_id = self.query_ids[result_type]
+        self.requests.put(("query", result_type, (query_id, text)))
+        return query_id
+
+    def stop(self):
+        self.requests.put(None)
+
+    def run(self):
+        while True:
+            batch = [self.requests.get()]
+            while True:
+                try:
+                    batch.append(self.requests.get_nowait())
+                except queue.Empty:
+                    break
+            # 同一类结果只执行这一批中最后一个查询
+            last_queries = {
+                request[1]: position for position, request in enumerate(batch)
+                if request and request[0] == "query"
+            }
+            for position, request in enumerate(batch):
+                if request is None:
+                    return
+                action, result_type, payload = request
+                index = self.indexes[result_type]
+                if action == "add":
+                    index.add_rows(payload)
+                elif action == "clear":
+                    index.clear()
+                elif last_queries[result_type] == position:
+                    self.run_query(result_type, index, *payload)
+
+    def run_query(self, result_type, index, query_id, text):
+        started = time.perf_counter()
+        try:
+            rows = index.query(parse_query(text, index.facet_columns))
+        except FilterError as e:
+            self.error_signal.emit(result_type, query_id, str(e))
+            return
+        except Exception as e:
+            # 其他异常也只报告给界面，不能结束筛选线程
+            self.error_signal.emit(result_type, query_id, f"筛选失败: {str(e)}")
+            return
+        self.result_signal.emit(result_type, query_id, rows, (time.perf_counter() - started) * 1000)
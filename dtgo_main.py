@@ -1,16 +1,28 @@
 import sys
 import json
+import collections
 import base64
 import requests
+from datetime import datetime, timedelta
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                             QHBoxLayout, QLineEdit, QPushButton, QTextEdit, 
-                            QProgressBar, QLabel, QListWidget, QTableWidget, 
-                            QTableWidgetItem, QTabWidget, QMessageBox, QDialog, QFormLayout, QMenu, QListWidgetItem, QScrollArea, QFileDialog, QProgressDialog)
+                            QProgressBar, QLabel, QListWidget, QListView, QTableView, 
+                            QTabWidget, QMessageBox, QDialog, QFormLayout, QMenu, QListWidgetItem, QScrollArea, QFileDialog, QProgressDialog,
+                            QInputDialog)
 from PyQt6.QtCore import Qt, QThread, pyqtSignal, QMimeData, QTimer
 from PyQt6.QtGui import QAction
 import urllib3
-from dtgo_handlers import TaskManager
+from dtgo_engine import Engine, RESULT_TYPES
+from dtgo_handlers import EngineBridge, ExportThread
 from dtgo_config import Config
+from dtgo_planner import get_cost_model, format_duration
+from dtgo_client import get_client
+from dtgo_events import EventBus
+from dtgo_export import BackgroundWriter, ResultViewWriter, create_export_writer
+from dtgo_models import ResultTableModel, TaskListModel, MetricsTableModel, TASK_KEY_ROLE, resize_columns_from_sample
+from dtgo_metrics import get_metrics
+from dtgo_profile import span
+from dtgo_filter import FilterThread, FILTER_HINTS, FILTER_DELAY_MS
 urllib3.disable_warnings()
 
 class FofaThread(QThread):
@@ -92,6 +104,25 @@ class LoginThread(QThread):
                 error_msg = "连接失败"
             self.progress_signal.emit(f"登录 {self.target} 失败: {error_msg}")
 
+class PlanThread(QThread):
+    """在后台查询灯塔负载并分配目标，慢速或无法连接的灯塔不会卡住界面"""
+    finished_signal = pyqtSignal(object, object, object)  # (并发上限, 分配结果, 预计完成秒数)
+    error_signal = pyqtSignal(str)
+
+    def __init__(self, engine, targets, beacons):
+        super().__init__()
+        self.engine = engine
+        self.targets = targets
+        self.beacons = beacons
+
+    def run(self):
+        try:
+            limits, assignments, finish_times = self.engine.plan(self.targets, self.beacons)
+        except Exception as e:
+            self.error_signal.emit(f"分配任务失败: {str(e)}")
+            return
+        self.finished_signal.emit(limits, assignments, finish_times)
+
 class SettingsDialog(QDialog):
     def __init__(self, config, parent=None):
         super().__init__(parent)
@@ -452,6 +483,77 @@ class AddBeaconDialog(QDialog):
             'password': self.password_input.text().strip()
         }
 
+class MetricsDialog(QDialog):
+    """按灯塔和接口显示请求指标，定时刷新，可导出为 Prometheus 文本文件或 JSON 快照"""
+    REFRESH_MS = 2000
+
+    def __init__(self, beacons=None, parent=None):
+        super().__init__(parent)
+        self.beacons = beacons  # 只显示这些灯塔，None 表示全部
+        self.setWindowTitle("请求指标")
+        self.resize(1000, 500)
+        self.setStyleSheet("""
+            QDialog {
+                background-color: white;
+            }
+            QPushButton {
+                background-color: #2196F3;
+                color: white;
+                border: none;
+                padding: 8px 20px;
+                border-radius: 4px;
+                font-weight: bold;
+                min-width: 80px;
+            }
+            QPushButton:hover {
+                background-color: #1976D2;
+            }
+        """)
+        
+        layout = QVBoxLayout()
+        layout.setContentsMargins(20, 20, 20, 20)
+        layout.setSpacing(10)
+        
+        self.model = MetricsTableModel(self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setAlternatingRowColors(True)
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        layout.addWidget(self.table)
+        
+        button_layout = QHBoxLayout()
+        prometheus_button = QPushButton("导出 Prometheus")
+        json_button = QPushButton("导出 JSON")
+        close_button = QPushButton("关闭")
+        prometheus_button.clicked.connect(lambda: self.export("Prometheus 文本文件 (*.prom)", "write_prometheus"))
+        json_button.clicked.connect(lambda: self.export("JSON 文件 (*.json)", "write_json"))
+        close_button.clicked.connect(self.accept)
+        button_layout.addStretch()
+        button_layout.addWidget(prometheus_button)
+        button_layout.addWidget(json_button)
+        button_layout.addWidget(close_button)
+        layout.addLayout(button_layout)
+        self.setLayout(layout)
+        
+        self.refresh()
+        self.table.resizeColumnsToContents()
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(self.REFRESH_MS)
+    
+    def refresh(self):
+        self.model.set_snapshot(get_metrics().snapshot(self.beacons))
+    
+    def export(self, file_filter, method):
+        file_name, _ = QFileDialog.getSaveFileName(self, "导出请求指标", "", file_filter)
+        if not file_name:
+            return
+        try:
+            getattr(get_metrics(), method)(file_name)
+        except Exception as e:
+            QMessageBox.warning(self, "导出失败", f"导出失败: {str(e)}")
+
 class DTGO(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -492,7 +594,7 @@ class DTGO(QMainWindow):
         
         # 优化表格样式
         self.TABLE_STYLE = """
-            QTableWidget {
+            QTableView {
                 background-color: white;
                 alternate-background-color: #F8F9FA;
                 border: 1px solid #E0E0E0;
@@ -501,11 +603,11 @@ class DTGO(QMainWindow):
                 selection-background-color: #E3F2FD;
                 selection-color: #1976D2;
             }
-            QTableWidget::item {
+            QTableView::item {
                 padding: 8px;
                 border-bottom: 1px solid #F0F0F0;
             }
-            QTableWidget::item:selected {
+            QTableView::item:selected {
                 background-color: #E3F2FD;
                 color: #1976D2;
             }
@@ -525,22 +627,22 @@ class DTGO(QMainWindow):
         
         # 优化列表样式
         self.LIST_STYLE = """
-            QListWidget {
+            QListView {
                 background-color: white;
                 border: 1px solid #E0E0E0;
                 border-radius: 4px;
                 outline: none;
             }
-            QListWidget::item {
+            QListView::item {
                 padding: 10px;
                 border-bottom: 1px solid #F0F0F0;
             }
-            QListWidget::item:selected {
+            QListView::item:selected {
                 background-color: #E3F2FD;
                 color: #1976D2;
                 border-left: 3px solid #1976D2;
             }
-            QListWidget::item:hover {
+            QListView::item:hover {
                 background-color: #F5F5F5;
             }
         """
@@ -589,6 +691,21 @@ class DTGO(QMainWindow):
             }
         """
         
+        # 结果筛选输入框样式
+        self.FILTER_INPUT_STYLE = """
+            QLineEdit {
+                background-color: white;
+                border: 1px solid #E0E0E0;
+                border-radius: 4px;
+                padding: 6px;
+                selection-background-color: #E3F2FD;
+                selection-color: #1976D2;
+            }
+            QLineEdit:focus {
+                border: 1px solid #2196F3;
+            }
+        """
+        
         # 优化标签样式
         self.LABEL_STYLE = """
             QLabel {
@@ -724,19 +841,42 @@ class DTGO(QMainWindow):
         
         self.setWindowTitle("灯塔狩猎者 (DTGO) by 小艾搞安全")
         self.setGeometry(100, 100, 1200, 800)
-        self.config = Config()
-        self.successful_beacons = self.config.get_successful_beacons()
+        self.config = Config(write_behind=True)
         self.active_threads = []
         self.scanning = False
         self.task_threads = []
         self.max_status_length = 50
+        self.status_history = collections.deque(maxlen=20)  # 最近的状态消息，完整显示在状态栏的提示中
         self.task_running = False
-        self.active_beacon_tasks = {}
-        self.task_records = self.config.get_task_records()
-        self.status_check_timer = QTimer()
-        self.status_check_timer.setInterval(120000)
-        self.status_check_timer.timeout.connect(self.check_running_tasks)
-        self.status_check_timer.start()
+        self.export_thread = None  # 后台导出任务
+        self.view_thread = None  # 后台加载任务结果到表格
+        self.plan_thread = None  # 后台查询灯塔负载并分配目标
+        # 任务线程的结果和进度经事件总线合并后定时刷新到界面
+        self.event_bus = EventBus(self)
+        self.event_bus.results_ready.connect(self.handle_task_results)
+        self.event_bus.progress_ready.connect(self.handle_task_progress)
+        self.event_bus.messages_ready.connect(self.handle_status_messages)
+        self.event_bus.start()
+        # 任务提交、监控、历史任务轮询和导出都由引擎完成，界面只处理引擎的事件
+        self.engine_bridge = EngineBridge(self.event_bus, self)
+        self.engine_bridge.task_created_signal.connect(self.handle_task_created)
+        self.engine_bridge.task_completed_signal.connect(self.handle_task_completed)
+        self.engine_bridge.task_status_signal.connect(self.update_task_status)
+        self.engine_bridge.token_expired_signal.connect(self.handle_token_expired)
+        self.engine_bridge.worker_finished_signal.connect(self.update_beacon_item_color)
+        self.engine = Engine(self.config, self.engine_bridge)
+        # 灯塔、任务记录、目标队列、结果缓存和结果库与引擎共用
+        self.successful_beacons = self.engine.beacons
+        self.task_records = self.engine.task_records
+        self.task_queue = self.engine.queue
+        self.result_cache = self.engine.result_cache
+        self.warehouse = self.engine.warehouse
+        # 结果筛选索引在后台线程中维护和查询，界面只采用每类结果最新一次查询的结果
+        self.filter_thread = FilterThread()
+        self.filter_thread.result_signal.connect(self.handle_filter_results)
+        self.filter_thread.error_signal.connect(self.handle_filter_error)
+        self.filter_thread.start()
+        self.filter_queries = {result_type: 0 for result_type in RESULT_TYPES}
         
         # 设置应用全局样式
         self.setStyleSheet(f"""
@@ -753,6 +893,7 @@ class DTGO(QMainWindow):
         
         self.initUI()
         self.load_cached_beacons()
+        self.engine.start()
         
     def closeEvent(self, event):
         # 停止所有活动线程
@@ -770,11 +911,17 @@ class DTGO(QMainWindow):
             if thread.isRunning():
                 thread.wait()
                 
-        # 停止所有任务
-        for task_manager in self.active_beacon_tasks.values():
-            task_manager.stop()
-            task_manager.wait()
-        self.status_check_timer.stop()  # 停止定时器
+        for thread in (self.export_thread, self.view_thread):
+            if thread and thread.isRunning():
+                thread.cancel()
+                thread.wait()
+        if self.plan_thread and self.plan_thread.isRunning():
+            self.plan_thread.wait()
+        # 停止所有任务，保存配置并关闭结果库和灯塔长连接
+        self.engine.shutdown()
+        self.event_bus.stop()  # 刷新剩余的结果
+        self.filter_thread.stop()
+        self.filter_thread.wait()
         event.accept()
         
     def initUI(self):
@@ -851,24 +998,26 @@ class DTGO(QMainWindow):
         
         # 结果标签页
         self.result_tabs = QTabWidget()
-        self.asset_table = QTableWidget()
-        self.domain_table = QTableWidget()
-        self.leak_table = QTableWidget()
+        self.asset_table = QTableView()
+        self.domain_table = QTableView()
+        self.leak_table = QTableView()
         
         # 设置表格样式
         for table in [self.asset_table, self.domain_table, self.leak_table]:
             table.setStyleSheet(self.TABLE_STYLE)
             table.setAlternatingRowColors(True)
-            table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
-            table.setSelectionMode(QTableWidget.SelectionMode.SingleSelection)
+            table.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
+            table.setSelectionMode(QTableView.SelectionMode.SingleSelection)
+            # 行高固定，滚动时不需要逐行计算高度
+            table.verticalHeader().setDefaultSectionSize(table.fontMetrics().height() + 16)
             table.horizontalHeader().setStretchLastSection(True)
             table.verticalHeader().setVisible(False)
         
         self.setup_tables()
         
-        self.result_tabs.addTab(self.asset_table, "资产列表")
-        self.result_tabs.addTab(self.domain_table, "子域名")
-        self.result_tabs.addTab(self.leak_table, "信息泄露")
+        self.result_tabs.addTab(self.create_result_tab("assets"), "资产列表")
+        self.result_tabs.addTab(self.create_result_tab("domains"), "子域名")
+        self.result_tabs.addTab(self.create_result_tab("leaks"), "信息泄露")
         left_layout.addWidget(self.result_tabs)
         
         # 状态栏
@@ -882,7 +1031,11 @@ class DTGO(QMainWindow):
         # 右侧任务记录列表
         task_layout = QVBoxLayout()
         task_label = QLabel("任务记录")
-        self.task_list = QListWidget()
+        self.task_list = QListView()
+        self.task_model = TaskListModel(self)
+        self.task_list.setModel(self.task_model)
+        # 所有行高度相同，只绘制可见行，大量记录时也能立即显示
+        self.task_list.setUniformItemSizes(True)
         self.task_list.setStyleSheet(self.LIST_STYLE)
         self.task_list.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
         self.task_list.customContextMenuRequested.connect(self.show_task_context_menu)
@@ -909,17 +1062,75 @@ class DTGO(QMainWindow):
         self.result_tabs.setStyleSheet(self.TAB_STYLE)
         
     def setup_tables(self):
-        self.asset_table.setColumnCount(5)
-        self.asset_table.setHorizontalHeaderLabels(["网站", "标题", "IP", "Server", "指纹"])
-        
-        self.domain_table.setColumnCount(3)
-        self.domain_table.setHorizontalHeaderLabels(["域名", "类型", "IP"])
-        
-        self.leak_table.setColumnCount(2)
-        self.leak_table.setHorizontalHeaderLabels(["URL", "标题"])
-        
-        for table in [self.asset_table, self.domain_table, self.leak_table]:
+        # 结果表格使用按列存储的模型，以第一列（网站/域名/URL）去重
+        self.result_models = {
+            "assets": ResultTableModel(["网站", "标题", "IP", "Server", "指纹"], parent=self),
+            "domains": ResultTableModel(["域名", "类型", "IP"], parent=self),
+            "leaks": ResultTableModel(["URL", "标题"], parent=self)
+        }
+        self.result_tables = {
+            "assets": self.asset_table,
+            "domains": self.domain_table,
+            "leaks": self.leak_table
+        }
+        for result_type, table in self.result_tables.items():
+            table.setModel(self.result_models[result_type])
             table.horizontalHeader().setStretchLastSection(True)
+        self.filter_inputs = {}
+        self.filter_labels = {}
+        self.filter_timers = {}
+
+    def create_result_tab(self, result_type):
+        """结果表格和上方的筛选栏"""
+        tab = QWidget()
+        layout = QVBoxLayout(tab)
+        layout.setContentsMargins(0, 4, 0, 0)
+        filter_layout = QHBoxLayout()
+        filter_input = QLineEdit()
+        filter_input.setPlaceholderText(FILTER_HINTS[result_type])
+        filter_input.setClearButtonEnabled(True)
+        filter_input.setStyleSheet(self.FILTER_INPUT_STYLE)
+        filter_label = QLabel()
+        filter_label.setStyleSheet("QLabel { color: #757575; padding: 0 8px; }")
+        # 输入时延迟执行，连续输入只查询最后一次
+        filter_timer = QTimer(self)
+        filter_timer.setSingleShot(True)
+        filter_timer.setInterval(FILTER_DELAY_MS)
+        filter_timer.timeout.connect(lambda t=result_type: self.apply_filter(t))
+        filter_input.textChanged.connect(lambda text, timer=filter_timer: timer.start())
+        filter_layout.addWidget(filter_input)
+        filter_layout.addWidget(filter_label)
+        layout.addLayout(filter_layout)
+        layout.addWidget(self.result_tables[result_type])
+        self.filter_inputs[result_type] = filter_input
+        self.filter_labels[result_type] = filter_label
+        self.filter_timers[result_type] = filter_timer
+        return tab
+
+    def apply_filter(self, result_type):
+        text = self.filter_inputs[result_type].text().strip()
+        self.filter_queries[result_type] = self.filter_thread.submit(result_type, text)
+
+    def handle_filter_results(self, result_type, query_id, rows, elapsed):
+        # 输入过程中提交的旧查询结果直接丢弃
+        if query_id != self.filter_queries[result_type]:
+            return
+        model = self.result_models[result_type]
+        model.set_visible_rows(rows)
+        label = self.filter_labels[result_type]
+        if rows is None:
+            label.clear()
+        else:
+            label.setText(f"匹配 {len(rows)} / {model.total_rows()} 行（{elapsed:.0f} ms）")
+
+    def handle_filter_error(self, result_type, query_id, message):
+        if query_id == self.filter_queries[result_type]:
+            self.filter_labels[result_type].setText(message)
+
+    def clear_result_tables(self):
+        for result_type, model in self.result_models.items():
+            model.clear()
+            self.filter_thread.clear(result_type)
 
     def show_settings(self):
         dialog = SettingsDialog(self.config, self)
@@ -986,9 +1197,9 @@ class DTGO(QMainWindow):
         login_thread.start()
         
     def handle_login_success(self, beacon_info):
-        self.successful_beacons[beacon_info["target"]] = beacon_info
+        # 新加入的灯塔可以领取队列中无人认领的目标
+        self.engine.add_beacon(beacon_info)
         self.beacon_list.addItem(beacon_info["target"])
-        self.config.save_successful_beacons(self.successful_beacons)
         
     def submit_tasks(self):
         """提交任务"""
@@ -1003,45 +1214,50 @@ class DTGO(QMainWindow):
             QMessageBox.warning(self, "警告", "请输入目标")
             return
             
-        # 获取可用的灯塔列表（优先选择没有任务的灯塔）
-        available_beacons = []
-        for item in selected_items:
-            beacon_target = item.text()
-            if beacon_target in self.successful_beacons:
-                is_busy = beacon_target in self.active_beacon_tasks
-                available_beacons.append((beacon_target, is_busy))
-        
-        # 按是否繁忙排序，空闲的灯塔优先
-        available_beacons.sort(key=lambda x: x[1])
+        # 获取可用的灯塔列表
+        available_beacons = [
+            item.text() for item in selected_items
+            if item.text() in self.successful_beacons
+        ]
         
         if not available_beacons:
             QMessageBox.warning(self, "警告", "没有可用的灯塔")
             return
+        if self.plan_thread and self.plan_thread.isRunning():
+            QMessageBox.warning(self, "警告", "正在分配上一批任务，请稍候")
+            return
         
-        # 分配任务
-        task_assignments = {}  # {beacon_target: [targets]}
-        beacon_index = 0
-        beacon_count = len(available_beacons)
-        
-        for target in targets:
-            # 选择下一个可用的灯塔
-            beacon_target = available_beacons[beacon_index][0]
-            
-            # 初始化任务列表
-            if beacon_target not in task_assignments:
-                task_assignments[beacon_target] = []
-            
-            # 添加任务
-            task_assignments[beacon_target].append(target)
-            
-            # 更新灯塔索引
-            beacon_index = (beacon_index + 1) % beacon_count
-        
+        # 按各灯塔的任务时长、API 延迟和当前负载分配目标，使总完成时间最短；
+        # 分配前要查询灯塔的当前负载，在后台线程中进行，完成后再弹出确认对话框
+        plan_thread = PlanThread(self.engine, targets, available_beacons)
+        plan_thread.finished_signal.connect(
+            lambda limits, assignments, finish_times: self.confirm_tasks(
+                targets, available_beacons, limits, assignments, finish_times
+            )
+        )
+        plan_thread.error_signal.connect(lambda message: QMessageBox.warning(self, "警告", message))
+        self.plan_thread = plan_thread
+        self.status_label.setText(f"正在查询 {len(available_beacons)} 个灯塔的负载...")
+        plan_thread.start()
+
+    def confirm_tasks(self, targets, available_beacons, limits, task_assignments, finish_times):
+        """显示分配结果，确认后加入队列"""
+        if not self.isVisible():
+            return  # 查询负载期间窗口已关闭
+        self.status_label.clear()
         # 构建确认信息
-        info_text = "任务分配情况：\n\n"
+        now = datetime.now()
+        info_text = "任务分配情况（空闲的灯塔会从其他灯塔的队列中领取目标）：\n\n"
         for beacon_target, target_list in task_assignments.items():
-            status = "（正在运行任务）" if beacon_target in self.active_beacon_tasks else "（空闲）"
-            info_text += f"{beacon_target}{status}:\n"
+            if not target_list:
+                continue
+            model = get_cost_model(beacon_target)
+            finish_at = now + timedelta(seconds=finish_times[beacon_target])
+            info_text += (
+                f"{beacon_target}（并发上限 {limits[beacon_target]}，运行中 {model.running}，"
+                f"预计 {format_duration(finish_times[beacon_target])} 后完成，"
+                f"约 {finish_at.strftime('%m-%d %H:%M')}）:\n"
+            )
             for target in target_list:
                 info_text += f"  - {target}\n"
             info_text += "\n"
@@ -1049,110 +1265,51 @@ class DTGO(QMainWindow):
         # 使用自定义确认对话框
         dialog = TaskConfirmDialog(info_text, self)
         if dialog.exec() == QDialog.DialogCode.Accepted:
-            for beacon_target, target_list in task_assignments.items():
-                beacon_info = self.successful_beacons[beacon_target]
-                task_manager = TaskManager(beacon_info, target_list)
-                
-                # 连接信号
-                task_manager.progress_signal.connect(self.update_status)
-                task_manager.result_signal.connect(self.handle_task_results)
-                task_manager.error_signal.connect(self.update_status)
-                task_manager.token_expired_signal.connect(self.handle_token_expired)
-                task_manager.task_created_signal.connect(
-                    lambda t, b=beacon_target: self.handle_task_created(b, t)
-                )
-                task_manager.task_completed_signal.connect(
-                    lambda t, b=beacon_target: self.handle_task_completed(b, t)
-                )
-                
-                # 启动任务
-                task_manager.start()
-                
-                # 更新灯塔状态
-                self.active_beacon_tasks[beacon_target] = task_manager
+            self.engine.enqueue(task_assignments, available_beacons)
+            for beacon_target in available_beacons:
                 self.update_beacon_item_color(beacon_target)
             
-            self.status_label.setText(f"已提交 {len(targets)} 个任务到 {len(task_assignments)} 个灯塔")
+            self.status_label.setText(f"已将 {len(targets)} 个任务加入队列，由 {len(available_beacons)} 个灯塔领取")
 
     def handle_task_created(self, beacon_target, task_id):
-        """处理新建任务"""
-        if beacon_target not in self.task_records:
-            self.task_records[beacon_target] = {}
-        
-        self.task_records[beacon_target][task_id] = "运行中"
-        self.config.save_task_records(self.task_records)
-        
-        # 添加到任务列表
-        item = QListWidgetItem(f"{beacon_target} => {task_id} [运行中]")
-        self.set_task_item_color(item, "运行中")
-        self.task_list.addItem(item)
+        """处理新建任务，任务记录已由引擎保存"""
+        self.task_model.add_task(beacon_target, task_id, "运行中")
+        self.update_beacon_item_color(beacon_target)
 
     def handle_task_completed(self, beacon_target, task_id):
         """处理任务完成"""
-        if beacon_target in self.task_records:
-            self.task_records[beacon_target][task_id] = "已结束"
-            self.config.save_task_records(self.task_records)
-            
-            # 更新任务列表中的状态
-            for i in range(self.task_list.count()):
-                item = self.task_list.item(i)
-                if f"{beacon_target} => {task_id}" in item.text():
-                    item.setText(f"{beacon_target} => {task_id} [已结束]")
-                    self.set_task_item_color(item, "已结束")
-                    break
+        self.task_model.set_status(beacon_target, task_id, "已结束")
 
     def handle_task_results(self, results):
-        # 更新资产表格，避免重复添加
-        existing_assets = set()
-        for row in range(self.asset_table.rowCount()):
-            existing_assets.add(self.asset_table.item(row, 0).text())
-        
-        # 更新资产表格
-        for site_info in results["assets"]:
-            site, title, ip, server, finger = site_info  # 解包五个值
-            if site not in existing_assets:
-                row = self.asset_table.rowCount()
-                self.asset_table.insertRow(row)
-                self.asset_table.setItem(row, 0, QTableWidgetItem(site))
-                self.asset_table.setItem(row, 1, QTableWidgetItem(title))
-                self.asset_table.setItem(row, 2, QTableWidgetItem(ip))
-                self.asset_table.setItem(row, 3, QTableWidgetItem(server))
-                self.asset_table.setItem(row, 4, QTableWidgetItem(finger))
-                existing_assets.add(site)
-            
-        # 更新子域名表格，避免重复添加
-        existing_domains = set()
-        for row in range(self.domain_table.rowCount()):
-            existing_domains.add(self.domain_table.item(row, 0).text())
-        
-        # 更新子域名表格
-        for domain_info in results.get("domains", []):
-            domain, type_, ips = domain_info
-            if domain not in existing_domains:
-                row = self.domain_table.rowCount()
-                self.domain_table.insertRow(row)
-                self.domain_table.setItem(row, 0, QTableWidgetItem(domain))
-                self.domain_table.setItem(row, 1, QTableWidgetItem(type_))
-                self.domain_table.setItem(row, 2, QTableWidgetItem(ips))
-                existing_domains.add(domain)
-            
-        # 更新泄露表格，避免重复添加
-        existing_leaks = set()
-        for row in range(self.leak_table.rowCount()):
-            existing_leaks.add(self.leak_table.item(row, 0).text())
-        
-        # 更新泄露表格
-        for url, title in results["leaks"]:
-            if url not in existing_leaks:
-                row = self.leak_table.rowCount()
-                self.leak_table.insertRow(row)
-                self.leak_table.setItem(row, 0, QTableWidgetItem(url))
-                self.leak_table.setItem(row, 1, QTableWidgetItem(title))
-                existing_leaks.add(url)
-            
-        # 自动调整所有表格的列宽
-        for table in [self.asset_table, self.domain_table, self.leak_table]:
-            table.resizeColumnsToContents()
+        # 每种结果整批追加到表格模型，模型内部按键去重
+        for result_type, model in self.result_models.items():
+            rows = results.get(result_type, [])
+            if not rows:
+                continue
+            with span("ui.results", result_type=result_type, rows=len(rows)):
+                added = model.append_rows(rows)
+                if added:
+                    self.filter_thread.add_rows(result_type, model.tail_rows(added))
+                    timer = self.filter_timers[result_type]
+                    if self.filter_inputs[result_type].text().strip() and not timer.isActive():
+                        # 筛选中有新结果时重新查询，新匹配的行追加到表格末尾
+                        timer.start()
+                    # 只按采样行调整有新数据的表格的列宽
+                    resize_columns_from_sample(self.result_tables[result_type])
+        
+    def handle_task_progress(self, progress):
+        """每个任务只显示最新的进度，放在任务列表的提示中"""
+        with span("ui.progress", tasks=len(progress)):
+            for (beacon, task_id), message in progress.items():
+                self.task_model.set_progress(beacon, task_id, message)
+
+    def handle_status_messages(self, messages):
+        """一次刷新中的多条消息都记入状态历史，状态栏显示最后一条"""
+        if not messages:
+            return
+        now = datetime.now().strftime("%H:%M:%S")
+        self.status_history.extend(f"{now} {message}" for message in messages)
+        self.show_status(messages[-1])
         
     def load_cached_beacons(self):
         for target in self.successful_beacons:
@@ -1160,11 +1317,15 @@ class DTGO(QMainWindow):
             self.beacon_list.addItem(item)
             
     def update_status(self, message):
-        if "成功" in message or "失败" in message:
-            # 截断过长的消息
-            if len(message) > self.max_status_length:
-                message = message[:self.max_status_length] + "..."
-            self.status_label.setText(message)
+        self.status_history.append(f"{datetime.now().strftime('%H:%M:%S')} {message}")
+        self.show_status(message)
+
+    def show_status(self, message):
+        # 截断过长的消息，完整内容和之前的消息在提示中查看
+        if len(message) > self.max_status_length:
+            message = message[:self.max_status_length] + "..."
+        self.status_label.setText(message)
+        self.status_label.setToolTip("\n".join(self.status_history))
 
     def show_beacon_context_menu(self, position):
         menu = QMenu()
@@ -1185,12 +1346,29 @@ class DTGO(QMainWindow):
         delete_action.triggered.connect(self.delete_selected_beacons)
         menu.addAction(delete_action)
         
+        # 添加连接统计动作
+        stats_action = QAction("连接统计", self)
+        stats_action.triggered.connect(self.show_connection_stats)
+        menu.addAction(stats_action)
+        
+        # 添加请求指标动作，没有选中灯塔时显示全部灯塔
+        metrics_action = QAction("请求指标", self)
+        metrics_action.triggered.connect(self.show_request_metrics)
+        menu.addAction(metrics_action)
+        
+        # 添加并发上限设置动作
+        limit_action = QAction("设置并发上限", self)
+        limit_action.triggered.connect(self.set_selected_beacon_limit)
+        menu.addAction(limit_action)
+        
         # 如果列表不为空，才显示菜单
         if self.beacon_list.count() > 0:
             # 根据是否有选中项启用/禁用复制和删除菜单
             has_selection = len(self.beacon_list.selectedItems()) > 0
             copy_action.setEnabled(has_selection)
             delete_action.setEnabled(has_selection)
+            stats_action.setEnabled(has_selection)
+            limit_action.setEnabled(has_selection)
             menu.exec(self.beacon_list.mapToGlobal(position))
 
     def copy_selected_beacons(self):
@@ -1211,6 +1389,51 @@ class DTGO(QMainWindow):
         count = len(selected_items)
         self.status_label.setText(f"已复制 {count} 个灯塔地址到剪贴板")
 
+    def show_connection_stats(self):
+        """显示选中灯塔的连接复用统计"""
+        selected_items = self.beacon_list.selectedItems()
+        if not selected_items:
+            return
+        
+        lines = []
+        for item in selected_items:
+            stats = get_client(item.text()).get_stats()
+            lines.append(
+                f"{stats['target']}: 请求 {stats['requests']} 次, "
+                f"新建连接 {stats['connections']} 个, 复用 {stats['reused']} 次 "
+                f"({stats['reuse_ratio']:.0%}), 失败 {stats['errors']} 次, "
+                f"批量状态查询节省 {stats['status_requests_saved']} 次请求, "
+                f"token 刷新 {stats['token_refreshes']} 次（提前 {stats['token_refreshes_proactive']} 次, "
+                f"复用其他线程 {stats['token_refreshes_shared']} 次）"
+            )
+        QMessageBox.information(self, "连接统计", "\n".join(lines))
+
+    def show_request_metrics(self):
+        """显示选中灯塔（未选中时为全部灯塔）各接口的请求指标"""
+        beacons = [item.text() for item in self.beacon_list.selectedItems()] or None
+        MetricsDialog(beacons, self).exec()
+
+    def set_selected_beacon_limit(self):
+        """设置选中灯塔的最大并行任务数"""
+        selected_items = self.beacon_list.selectedItems()
+        if not selected_items:
+            return
+        
+        current = self.task_queue.get_limit(selected_items[0].text())
+        limit, ok = QInputDialog.getInt(
+            self,
+            "设置并发上限",
+            f"选中的 {len(selected_items)} 个灯塔最多同时运行的任务数：",
+            current,
+            1,
+            100
+        )
+        if not ok:
+            return
+        
+        self.engine.set_beacon_limit([item.text() for item in selected_items], limit)
+        self.status_label.setText(f"已将 {len(selected_items)} 个灯塔的并发上限设置为 {limit}")
+
     def delete_selected_beacons(self):
         # 获取所有选中的项目
         selected_items = self.beacon_list.selectedItems()
@@ -1232,19 +1455,15 @@ class DTGO(QMainWindow):
                 target = item.text()
                 # 从列表中移除
                 self.beacon_list.takeItem(self.beacon_list.row(item))
-                # 从存储中移除
-                if target in self.successful_beacons:
-                    del self.successful_beacons[target]
-            
-            # 更新配置文件
-            self.config.save_successful_beacons(self.successful_beacons)
+                # 从存储中移除，停止它的任务线程
+                self.engine.remove_beacon(target)
 
     def update_beacon_item_color(self, beacon_target):
         """更新灯塔项的颜色"""
         for i in range(self.beacon_list.count()):
             item = self.beacon_list.item(i)
             if item.text() == beacon_target:
-                if beacon_target in self.active_beacon_tasks:
+                if self.engine.is_busy(beacon_target):
                     # 设置为蓝色表示正在执行任务
                     item.setBackground(Qt.GlobalColor.lightGray)
                     item.setForeground(Qt.GlobalColor.blue)
@@ -1255,36 +1474,23 @@ class DTGO(QMainWindow):
                 break
 
     def handle_token_expired(self, beacon_target):
-        """处理token过期"""
-        # 从灯塔列表和存储中移除过期的灯塔
+        """处理token过期，引擎已从存储中移除过期的灯塔"""
         for i in range(self.beacon_list.count()):
             item = self.beacon_list.item(i)
             if item.text() == beacon_target:
                 self.beacon_list.takeItem(i)
-                if beacon_target in self.successful_beacons:
-                    del self.successful_beacons[beacon_target]
-                self.config.save_successful_beacons(self.successful_beacons)
                 break
         
         self.status_label.setText(f"灯塔 {beacon_target} 认证失败，已移除")
 
     def load_task_records(self):
         """加载任务记录到列表"""
-        self.task_list.clear()
-        for beacon, tasks in self.task_records.items():
-            for task_id, status in tasks.items():
-                item = QListWidgetItem(f"{beacon} => {task_id} [{status}]")
-                self.set_task_item_color(item, status)
-                self.task_list.addItem(item)
+        self.task_model.load(self.task_records)
 
-    def set_task_item_color(self, item, status):
-        """设置任务项的颜色"""
-        if status == "运行中":
-            item.setForeground(Qt.GlobalColor.blue)
-        elif status == "已结束":
-            item.setForeground(Qt.GlobalColor.green)
-        else:
-            item.setForeground(Qt.GlobalColor.black)
+    def selected_task_keys(self):
+        """返回选中任务的 [(beacon, task_id)]，按列表顺序排列"""
+        indexes = sorted(self.task_list.selectionModel().selectedIndexes(), key=lambda index: index.row())
+        return [index.data(TASK_KEY_ROLE) for index in indexes]
 
     def show_task_context_menu(self, position):
         menu = QMenu()
@@ -1295,337 +1501,225 @@ class DTGO(QMainWindow):
         select_all_action.triggered.connect(self.task_list.selectAll)
         menu.addAction(select_all_action)
         
+        # 添加查看结果动作
+        view_action = QAction("查看结果", self)
+        view_action.triggered.connect(self.view_selected_tasks)
+        menu.addAction(view_action)
+        
         # 添加导出动作
-        export_action = QAction("导出到XLSX", self)
+        export_action = QAction("导出结果", self)
         export_action.triggered.connect(self.export_selected_tasks)
         menu.addAction(export_action)
         
+        # 从本地结果库读取跨任务去重后的结果
+        dedup_view_action = QAction("查看去重结果", self)
+        dedup_view_action.triggered.connect(self.view_deduplicated_results)
+        menu.addAction(dedup_view_action)
+        dedup_export_action = QAction("导出去重结果", self)
+        dedup_export_action.triggered.connect(self.export_deduplicated_results)
+        menu.addAction(dedup_export_action)
+        
         # 添加删除动作
         delete_action = QAction("删除", self)
         delete_action.triggered.connect(self.delete_selected_tasks)
         menu.addAction(delete_action)
         
-        if self.task_list.count() > 0:
-            has_selection = len(self.task_list.selectedItems()) > 0
+        if self.task_model.rowCount() > 0:
+            has_selection = self.task_list.selectionModel().hasSelection()
+            view_action.setEnabled(has_selection)
+            dedup_view_action.setEnabled(has_selection)
+            dedup_export_action.setEnabled(has_selection)
             export_action.setEnabled(has_selection)
             delete_action.setEnabled(has_selection)
             menu.exec(self.task_list.mapToGlobal(position))
 
     def export_selected_tasks(self):
         """导出选中任务的详细结果"""
-        selected_items = self.task_list.selectedItems()
-        if not selected_items:
+        selected_tasks = self.selected_task_keys()
+        if not selected_tasks:
             return
         
         file_name, _ = QFileDialog.getSaveFileName(
             self,
             "导出任务结果",
             "",
-            "Excel Files (*.xlsx);;CSV Files (*.csv);;All Files (*)"
+            "Excel Files (*.xlsx);;CSV Files (*.csv *.csv.gz *.csv.zst);;"
+            "JSON Lines (*.jsonl *.jsonl.gz *.jsonl.zst);;"
+            "Parquet/Feather (*.parquet *.feather);;All Files (*)"
         )
         
         if not file_name:
             return
         
+        if self.export_thread and self.export_thread.isRunning():
+            QMessageBox.warning(self, "导出失败", "已有导出任务正在进行")
+            return
+        
+        tasks = self.engine.exportable_tasks(selected_tasks)
+        if not tasks:
+            QMessageBox.warning(self, "导出失败", "没有找到可导出的结果")
+            return
         try:
-            results = []
-            total_items = len(selected_items)
-            progress_dialog = QProgressDialog("正在获取任务结果...", "取消", 0, total_items, self)
-            progress_dialog.setWindowModality(Qt.WindowModality.WindowModal)
-            
-            for i, item in enumerate(selected_items):
-                if progress_dialog.wasCanceled():
-                    break
-                
-                text = item.text()
-                beacon, rest = text.split(" => ")
-                task_id = rest.split(" [")[0]
-                
-                if beacon not in self.successful_beacons:
-                    continue
-                
-                progress_dialog.setValue(i)
-                progress_dialog.setLabelText(f"正在获取任务 {task_id} 的结果...")
-                
-                # 获取任务结果
-                task_result = self.get_task_results(beacon, task_id)
-                if task_result:
-                    results.append(task_result)
-            
-            progress_dialog.setValue(total_items)
-            
-            if results:
-                if file_name.endswith('.xlsx'):
-                    self.export_to_excel(results, file_name)
-                else:
-                    self.export_to_csv(results, file_name)
-                
-                self.status_label.setText(f"已导出 {len(results)} 个任务的结果到 {file_name}")
-            else:
-                QMessageBox.warning(self, "导出失败", "没有找到可导出的结果")
-            
+            # 写入和压缩在单独的线程中进行，不阻塞获取结果
+            writer = BackgroundWriter(create_export_writer(file_name))
         except Exception as e:
             QMessageBox.warning(self, "导出失败", f"导出失败: {str(e)}")
+            return
+        
+        # 在后台线程中并行获取结果并写入文件，界面保持响应
+        progress_dialog = QProgressDialog("正在获取任务结果...", "取消", 0, len(tasks), self)
+        progress_dialog.setWindowModality(Qt.WindowModality.WindowModal)
+        progress_dialog.setAutoClose(False)
+        progress_dialog.setAutoReset(False)
+        
+        export_thread = ExportThread(self.engine.create_exporter(tasks, writer))
+        export_thread.progress_signal.connect(
+            lambda done, total, message: (progress_dialog.setValue(done), progress_dialog.setLabelText(message))
+        )
+        export_thread.error_signal.connect(self.update_status)
+        export_thread.finished_signal.connect(
+            lambda count, cancelled: self.handle_export_finished(progress_dialog, file_name, count, cancelled)
+        )
+        progress_dialog.canceled.connect(export_thread.cancel)
+        self.export_thread = export_thread
+        export_thread.start()
+        progress_dialog.show()
 
-    def get_task_results(self, beacon, task_id):
-        """获取单个任务的所有结果"""
-        try:
-            headers = {"Token": self.successful_beacons[beacon]["token"]}
-            base_url = f"https://{beacon}/api"
-            
-            # 获取资产列表
-            assets_response = requests.get(
-                f"{base_url}/site/?page=1&size=1000&task_id={task_id}",
-                headers=headers,
-                verify=False
-            )
-            
-            # 获取子域名列表
-            domains_response = requests.get(
-                f"{base_url}/domain/?page=1&size=1000&task_id={task_id}",
-                headers=headers,
-                verify=False
-            )
-            
-            # 获取信息泄露列表
-            leaks_response = requests.get(
-                f"{base_url}/fileleak/?page=1&size=1000&task_id={task_id}",
-                headers=headers,
-                verify=False
+    def view_selected_tasks(self):
+        """在结果表格中显示选中任务的结果，已完成任务优先从本地缓存读取"""
+        selected_tasks = self.selected_task_keys()
+        if not selected_tasks:
+            return
+        if self.view_thread and self.view_thread.isRunning():
+            self.view_thread.cancel()
+            self.view_thread.wait()
+        
+        tasks = self.engine.exportable_tasks(selected_tasks)
+        if not tasks:
+            return
+        self.clear_result_tables()
+        
+        view_thread = ExportThread(self.engine.create_exporter(tasks, ResultViewWriter(self.event_bus)))
+        view_thread.progress_signal.connect(lambda done, total, message: self.status_label.setText(message))
+        view_thread.error_signal.connect(self.update_status)
+        view_thread.finished_signal.connect(
+            lambda count, cancelled, t=view_thread: self.status_label.setText(
+                f"已加载 {count} 个任务的结果（{t.cached_tasks} 个来自本地缓存）"
             )
-            
-            return {
-                'beacon': beacon,
-                'task_id': task_id,
-                'assets': assets_response.json().get('items', []) if assets_response.status_code == 200 else [],
-                'domains': domains_response.json().get('items', []) if domains_response.status_code == 200 else [],
-                'leaks': leaks_response.json().get('items', []) if leaks_response.status_code == 200 else []
-            }
-        except Exception as e:
-            self.status_label.setText(f"获取任务 {task_id} 结果失败: {str(e)}")
-            return None
+        )
+        self.view_thread = view_thread
+        view_thread.start()
 
-    def export_to_excel(self, results, file_name):
-        """导出结果到Excel文件"""
-        import pandas as pd
-        from datetime import datetime
-        
-        with pd.ExcelWriter(file_name) as writer:
-            # 导出资产列表
-            assets_data = []
-            for result in results:
-                for asset in result['assets']:
-                    assets_data.append({
-                        '灯塔地址': result['beacon'],
-                        '任务ID': result['task_id'],
-                        '网站': asset.get('site', ''),
-                        '标题': asset.get('title', ''),
-                        'IP': asset.get('ip', ''),
-                        'Server': asset.get('http_server', ''),
-                        '指纹': ', '.join([f"{f['name']}{f.get('version', '')}" for f in asset.get('finger', [])])
-                    })
-            if assets_data:
-                pd.DataFrame(assets_data).to_excel(writer, sheet_name='资产列表', index=False)
-            
-            # 导出子域名列表
-            domains_data = []
-            for result in results:
-                for domain in result['domains']:
-                    domains_data.append({
-                        '灯塔地址': result['beacon'],
-                        '任务ID': result['task_id'],
-                        '域名': domain.get('domain', ''),
-                        '类型': domain.get('type', ''),
-                        'IP列表': ', '.join(domain.get('ips', []))
-                    })
-            if domains_data:
-                pd.DataFrame(domains_data).to_excel(writer, sheet_name='子域名列表', index=False)
-            
-            # 导出信息泄露列表
-            leaks_data = []
-            for result in results:
-                for leak in result['leaks']:
-                    leaks_data.append({
-                        '灯塔地址': result['beacon'],
-                        '任务ID': result['task_id'],
-                        'URL': leak.get('url', ''),
-                        '标题': leak.get('title', '')
-                    })
-            if leaks_data:
-                pd.DataFrame(leaks_data).to_excel(writer, sheet_name='信息泄露列表', index=False)
+    def view_deduplicated_results(self):
+        """在结果表格中显示选中任务发现的去重结果"""
+        selected_tasks = self.selected_task_keys()
+        if not selected_tasks:
+            return
+        if self.view_thread and self.view_thread.isRunning():
+            self.view_thread.cancel()
+            self.view_thread.wait()
+        self.clear_result_tables()
+        
+        view_thread = ExportThread(
+            self.engine.create_warehouse_exporter(selected_tasks, ResultViewWriter(self.event_bus))
+        )
+        view_thread.progress_signal.connect(lambda done, total, message: self.status_label.setText(message))
+        view_thread.error_signal.connect(self.update_status)
+        view_thread.finished_signal.connect(
+            lambda count, cancelled: self.status_label.setText(f"已加载 {count} 条去重结果")
+        )
+        self.view_thread = view_thread
+        view_thread.start()
 
-    def export_to_csv(self, results, file_name):
-        """导出结果到CSV文件"""
-        base_name = file_name.rsplit('.', 1)[0]
-        
-        # 导出资产列表
-        assets_file = f"{base_name}_assets.csv"
-        with open(assets_file, 'w', encoding='utf-8') as f:
-            f.write("灯塔地址,任务ID,网站,标题,IP,Server,指纹\n")
-            for result in results:
-                for asset in result['assets']:
-                    finger_str = ','.join([f"{f['name']}{f.get('version', '')}" for f in asset.get('finger', [])])
-                    f.write(f"{result['beacon']},{result['task_id']},"
-                           f"{asset.get('site', '')},{asset.get('title', '')},"
-                           f"{asset.get('ip', '')},{asset.get('http_server', '')},"
-                           f"{finger_str}\n")
-        
-        # 导出子域名列表
-        domains_file = f"{base_name}_domains.csv"
-        with open(domains_file, 'w', encoding='utf-8') as f:
-            f.write("灯塔地址,任务ID,域名,类型,IP列表\n")
-            for result in results:
-                for domain in result['domains']:
-                    ips_str = ','.join(domain.get('ips', []))
-                    f.write(f"{result['beacon']},{result['task_id']},"
-                           f"{domain.get('domain', '')},{domain.get('type', '')},"
-                           f"{ips_str}\n")
-        
-        # 导出信息泄露列表
-        leaks_file = f"{base_name}_leaks.csv"
-        with open(leaks_file, 'w', encoding='utf-8') as f:
-            f.write("灯塔地址,任务ID,URL,标题\n")
-            for result in results:
-                for leak in result['leaks']:
-                    f.write(f"{result['beacon']},{result['task_id']},"
-                           f"{leak.get('url', '')},{leak.get('title', '')}\n")
+    def export_deduplicated_results(self):
+        """导出选中任务发现的去重结果，不访问灯塔"""
+        selected_tasks = self.selected_task_keys()
+        if not selected_tasks:
+            return
+        if self.export_thread and self.export_thread.isRunning():
+            QMessageBox.warning(self, "导出失败", "已有导出任务正在进行")
+            return
+        
+        file_name, _ = QFileDialog.getSaveFileName(
+            self,
+            "导出去重结果",
+            "",
+            "Excel Files (*.xlsx);;CSV Files (*.csv *.csv.gz *.csv.zst);;"
+            "JSON Lines (*.jsonl *.jsonl.gz *.jsonl.zst);;"
+            "Parquet/Feather (*.parquet *.feather);;All Files (*)"
+        )
+        if not file_name:
+            return
+        try:
+            writer = BackgroundWriter(create_export_writer(file_name))
+        except Exception as e:
+            QMessageBox.warning(self, "导出失败", f"导出失败: {str(e)}")
+            return
+        
+        progress_dialog = QProgressDialog("正在读取去重结果...", "取消", 0, len(RESULT_TYPES), self)
+        progress_dialog.setWindowModality(Qt.WindowModality.WindowModal)
+        progress_dialog.setAutoClose(False)
+        progress_dialog.setAutoReset(False)
+        
+        export_thread = ExportThread(self.engine.create_warehouse_exporter(selected_tasks, writer))
+        export_thread.progress_signal.connect(
+            lambda done, total, message: (progress_dialog.setValue(done), progress_dialog.setLabelText(message))
+        )
+        export_thread.error_signal.connect(self.update_status)
+        export_thread.finished_signal.connect(
+            lambda count, cancelled: (
+                progress_dialog.close(),
+                self.status_label.setText(f"已导出 {count} 条去重结果到 {file_name}")
+            )
+        )
+        progress_dialog.canceled.connect(export_thread.cancel)
+        self.export_thread = export_thread
+        export_thread.start()
+        progress_dialog.show()
+
+    def handle_export_finished(self, progress_dialog, file_name, count, cancelled):
+        progress_dialog.close()
+        if count:
+            message = f"已导出 {count} 个任务的结果到 {file_name}"
+            if cancelled:
+                message += "（已取消，仅包含已获取的任务）"
+            self.status_label.setText(message)
+        elif cancelled:
+            self.status_label.setText("导出已取消")
+        else:
+            QMessageBox.warning(self, "导出失败", "没有找到可导出的结果")
 
     def delete_selected_tasks(self):
         """删除选中的任务记录和远程灯塔记录"""
-        selected_items = self.task_list.selectedItems()
-        if not selected_items:
+        selected_tasks = self.selected_task_keys()
+        if not selected_tasks:
             return
         
         reply = QMessageBox.question(
             self,
             "确认删除",
-            f"确定要删除选中的 {len(selected_items)} 条任务记录吗？\n(同时会删除灯塔系统中的任务数据)",
+            f"确定要删除选中的 {len(selected_tasks)} 条任务记录吗？\n(同时会删除灯塔系统中的任务数据)",
             QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
         )
         
         if reply == QMessageBox.StandardButton.Yes:
-            for item in selected_items:
-                text = item.text()
-                beacon, rest = text.split(" => ")
-                task_id = rest.split(" [")[0]
-                
-                # 删除远程灯塔记录
+            deleted_tasks = []
+            for beacon, task_id in selected_tasks:
+                # 删除远程灯塔记录，成功后再删除本地记录、缓存和结果库中的发现记录
                 if beacon in self.successful_beacons:
-                    beacon_info = {
-                        "target": beacon,
-                        "token": self.successful_beacons[beacon]["token"]
-                    }
-                    task_manager = TaskManager(beacon_info, [])
-                    task_manager.progress_signal.connect(self.update_status)
-                    task_manager.error_signal.connect(self.update_status)
-                    task_manager.token_expired_signal.connect(self.handle_token_expired)
-                    
-                    if task_manager.delete_task(task_id):
+                    if self.engine.delete_task(beacon, task_id):
                         self.status_label.setText(f"成功删除灯塔 {beacon} 的任务 {task_id}")
-                        # 从本地记录中删除
-                        if beacon in self.task_records:
-                            if task_id in self.task_records[beacon]:
-                                del self.task_records[beacon][task_id]
-                            if not self.task_records[beacon]:
-                                del self.task_records[beacon]
-                        # 从列表中删除
-                        self.task_list.takeItem(self.task_list.row(item))
+                        deleted_tasks.append((beacon, task_id))
                     else:
                         self.status_label.setText(f"删除灯塔 {beacon} 的任务 {task_id} 失败")
                         continue  # 如果远程删除失败，不删除本地记录
-            
-            # 保存更新后的记录
-            self.config.save_task_records(self.task_records)
-
-    def check_running_tasks(self):
-        """检查所有运行中的任务状态"""
-        running_tasks = {}  # {beacon: [task_ids]}
-        
-        # 收集所有运行中的任务
-        for beacon, tasks in self.task_records.items():
-            running = [task_id for task_id, status in tasks.items() if status == "运行中"]
-            if running:
-                running_tasks[beacon] = running
-        
-        if not running_tasks:
-            return
-            
-        # 检查每个灯塔的任务状态
-        for beacon, task_ids in running_tasks.items():
-            if beacon not in self.successful_beacons:
-                continue
-                
-            try:
-                self.check_beacon_tasks(beacon, task_ids)
-            except Exception as e:
-                self.status_label.setText(f"检查灯塔 {beacon} 任务状态失败: {str(e)}")
 
-    def check_beacon_tasks(self, beacon, task_ids, retry=True):
-        """检查单个灯塔的任务状态，支持token过期重试"""
-        try:
-            url = f"https://{beacon}/api/task/?page=1&size=100"
-            headers = {"Token": self.successful_beacons[beacon]["token"]}
-            response = requests.get(url, headers=headers, verify=False)
-            
-            if response.status_code == 200:
-                result = response.json()
-                if result.get("code") == 200:
-                    tasks = {item["_id"]: item["status"] for item in result.get("items", [])}
-                    
-                    # 更新任务状态
-                    for task_id in task_ids:
-                        if task_id in tasks and tasks[task_id] == "done":
-                            self.update_task_status(beacon, task_id, "已结束")
-                elif result.get("code") == 401 and retry:  # token过期
-                    # 尝试刷新token
-                    if self.refresh_beacon_token(beacon):
-                        # 刷新成功，重试检查
-                        self.check_beacon_tasks(beacon, task_ids, retry=False)
-                    else:
-                        # 刷新失败，移除灯塔
-                        self.handle_token_expired(beacon)
-        except Exception as e:
-            if retry:
-                # 发生错误时尝试刷新token重试
-                if self.refresh_beacon_token(beacon):
-                    self.check_beacon_tasks(beacon, task_ids, retry=False)
-                else:
-                    raise e
-            else:
-                raise e
-
-    def refresh_beacon_token(self, beacon):
-        """刷新灯塔token"""
-        try:
-            url = f"https://{beacon}/api/user/login"
-            data = {"username": "admin", "password": "arlpass"}
-            response = requests.post(url, json=data, verify=False, timeout=5)
-            result = response.json()
-            
-            if result.get("code") == 200:
-                self.successful_beacons[beacon]["token"] = result["data"]["token"]
-                self.config.save_successful_beacons(self.successful_beacons)
-                return True
-            return False
-        except:
-            return False
+            # 从列表中删除
+            self.task_model.remove_tasks(deleted_tasks)
 
     def update_task_status(self, beacon, task_id, status):
-        """更新任务状态"""
-        # 更新内存中的记录
-        if beacon in self.task_records and task_id in self.task_records[beacon]:
-            self.task_records[beacon][task_id] = status
-            
-            # 更新列表显示
-            for i in range(self.task_list.count()):
-                item = self.task_list.item(i)
-                if f"{beacon} => {task_id}" in item.text():
-                    item.setText(f"{beacon} => {task_id} [{status}]")
-                    self.set_task_item_color(item, status)
-                    break
-            
-            # 保存到配置文件
-            self.config.save_task_records(self.task_records)
+        """更新任务列表中的状态，任务记录已由引擎保存"""
+        self.task_model.set_status(beacon, task_id, status)
 
     def show_add_beacon_dialog(self):
         """显示添加灯塔对话框"""
@@ -1649,23 +1743,8 @@ class DTGO(QMainWindow):
             return
         
         try:
-            # 尝试登录
-            url = f"https://{address}/api/user/login"
-            data = {
-                "username": inputs['username'],
-                "password": inputs['password']
-            }
-            response = requests.post(url, json=data, verify=False, timeout=5)
-            result = response.json()
-            
-            if result.get("code") == 200:
-                # 登录成功，添加到列表
-                self.successful_beacons[address] = {
-                    "token": result["data"]["token"],
-                    "target": address  # 添加target字段，与FOFA扫描添加的格式保持一致
-                }
-                self.config.save_successful_beacons(self.successful_beacons)
-                
+            # 尝试登录，成功后引擎保存灯塔并启动它的任务线程
+            if self.engine.login_beacon(address, inputs['username'], inputs['password']):
                 # 更新界面
                 self.beacon_list.addItem(address)
                 QMessageBox.information(
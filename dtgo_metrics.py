@@ -0,0 +1,248 @@
+"""灯塔接口请求指标：按灯塔和接口统计请求数、耗时分布、流量、错误、超时和 token 刷新
+
+所有灯塔客户端共享一个全局注册表，可以导出为 Prometheus 文本文件（node_exporter textfile collector）
+或 JSON 快照，用于发现变慢、频繁超时或 token 失效的灯塔
+"""
+import bisect
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+# 默认指标导出配置，可以通过配置文件中的 "metrics" 覆盖
+DEFAULT_METRICS_OPTIONS = {
+    "prometheus_file": "",  # 定期写入的 Prometheus 文本文件，为空时不写入
+    "json_file": "",        # 定期写入的 JSON 快照，为空时不写入
+    "interval": 60,         # 定期写入的间隔（秒）
+}
+
+# 耗时分布的桶上界（秒）：1ms 到 120s 按 1.25 倍递增，估算分位数的误差不超过 25%
+LATENCY_BUCKETS = []
+_bound = 0.001
+while _bound <= 120:
+    LATENCY_BUCKETS.append(round(_bound, 6))
+    _bound *= 1.25
+del _bound
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# 单任务接口的路径中包含任务 ID，统计时合并为一个接口
+TASK_DETAIL_PATTERN = re.compile(r"^/task/(?!delete/)[^/]+/?$")
+# 灯塔 token 失效时返回的业务状态码，响应体很短，只检查小响应
+AUTH_ERROR_PATTERN = re.compile(rb'"code"\s*:\s*401\b')
+AUTH_ERROR_MAX_BYTES = 512
+
+
+def endpoint_name(path):
+    path = path.split("?", 1)[0]
+    if TASK_DETAIL_PATTERN.match(path):
+        return "/task/{id}"
+    return path
+
+
+def is_auth_error(content):
+    return len(content) <= AUTH_ERROR_MAX_BYTES and AUTH_ERROR_PATTERN.search(content) is not None
+
+
+class LatencyHistogram:
+    """固定桶的耗时分布，内存占用不随请求数增长"""
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)  # 最后一个桶记录超过上限的请求
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):
+        """按桶内线性插值估算分位数"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if not count:
+                continue
+            if seen + count >= rank:
+                lower = LATENCY_BUCKETS[index - 1] if index > 0 else 0.0
+                upper = LATENCY_BUCKETS[index] if index < len(LATENCY_BUCKETS) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / count, self.max)
+            seen += count
+        return self.max
+
+
+class EndpointMetrics:
+    """单个灯塔单个接口的计数"""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0        # 连接失败或 HTTP 状态码 >= 400
+        self.timeouts = 0
+        self.auth_errors = 0   # 业务状态码 401（token 失效）
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.latency = LatencyHistogram()
+
+    def snapshot(self):
+        data = {
+            "requests": self.requests,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "auth_errors": self.auth_errors,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "latency_sum": round(self.latency.sum, 6),
+            "latency_max": round(self.latency.max, 6),
+        }
+        for q in QUANTILES:
+            value = self.latency.quantile(q)
+            data[f"p{int(q * 100)}"] = None if value is None else round(value, 6)
+        return data
+
+
+class MetricsRegistry:
+    """所有灯塔共享的指标注册表，记录操作只做计数，开销很小"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = {}  # {(beacon, endpoint): EndpointMetrics}
+        self.tokens = {}     # {beacon: {"logins", "refreshes", "refresh_failures"}}
+        self.started = time.time()
+
+    def record_request(self, beacon, path, seconds, bytes_sent=0, bytes_received=0, status=None,
+                       error=False, timeout=False, auth_error=False):
+        key = (beacon, endpoint_name(path))
+        with self.lock:
+            metrics = self.endpoints.get(key)
+            if metrics is None:
+                metrics = self.endpoints[key] = EndpointMetrics()
+            metrics.requests += 1
+            metrics.bytes_sent += bytes_sent
+            metrics.bytes_received += bytes_received
+            metrics.latency.observe(seconds)
+            if error or (status is not None and status >= 400):
+                metrics.errors += 1
+            if timeout:
+                metrics.timeouts += 1
+            if auth_error:
+                metrics.auth_errors += 1
+
+    def record_login(self, beacon, refresh, success):
+        """记录一次登录，refresh 为 True 表示 token 失效后的重新登录"""
+        with self.lock:
+            counts = self.tokens.setdefault(beacon, {"logins": 0, "refreshes": 0, "refresh_failures": 0})
+            if not refresh:
+                counts["logins"] += 1
+            elif success:
+                counts["refreshes"] += 1
+            else:
+                counts["refresh_failures"] += 1
+
+    def snapshot(self, beacons=None):
+        """返回 {beacon: {"tokens": {...}, "endpoints": {endpoint: {...}}}}，beacons 为空时返回全部灯塔"""
+        wanted = set(beacons) if beacons else None
+        result = {}
+        with self.lock:
+            for (beacon, endpoint), metrics in self.endpoints.items():
+                if wanted is None or beacon in wanted:
+                    entry = result.setdefault(beacon, {"tokens": {}, "endpoints": {}})
+                    entry["endpoints"][endpoint] = metrics.snapshot()
+            for beacon, counts in self.tokens.items():
+                if wanted is None or beacon in wanted:
+                    result.setdefault(beacon, {"tokens": {}, "endpoints": {}})["tokens"] = dict(counts)
+        return result
+
+    def to_json(self):
+        return json.dumps({
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "uptime": round(time.time() - self.started, 1),
+            "beacons": self.snapshot(),
+        }, ensure_ascii=False, indent=2)
+
+    def to_prometheus(self):
+        """Prometheus 文本格式，耗时以 summary 形式导出 p50/p95/p99"""
+        snapshot = self.snapshot()
+        lines = []
+        counters = [
+            ("dtgo_requests_total", "requests", "Beacon API requests"),
+            ("dtgo_request_errors_total", "errors", "Failed beacon API requests (connection error or HTTP >= 400)"),
+            ("dtgo_request_timeouts_total", "timeouts", "Timed out beacon API requests"),
+            ("dtgo_auth_errors_total", "auth_errors", "Beacon API responses with business code 401"),
+            ("dtgo_request_bytes_total", "bytes_sent", "Request body bytes sent to beacons"),
+            ("dtgo_response_bytes_total", "bytes_received", "Response body bytes received from beacons"),
+        ]
+        for name, field, help_text in counters:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for beacon, entry in snapshot.items():
+                for endpoint, data in entry["endpoints"].items():
+                    lines.append(f"{name}{{{labels(beacon, endpoint)}}} {data[field]}")
+
+        name = "dtgo_request_duration_seconds"
+        lines.append(f"# HELP {name} Beacon API request latency")
+        lines.append(f"# TYPE {name} summary")
+        for beacon, entry in snapshot.items():
+            for endpoint, data in entry["endpoints"].items():
+                for q in QUANTILES:
+                    value = data[f"p{int(q * 100)}"]
+                    if value is not None:
+                        lines.append(f'{name}{{{labels(beacon, endpoint)},quantile="{q}"}} {value}')
+                lines.append(f"{name}_sum{{{labels(beacon, endpoint)}}} {data['latency_sum']}")
+                lines.append(f"{name}_count{{{labels(beacon, endpoint)}}} {data['requests']}")
+
+        for name, field, help_text in [
+            ("dtgo_logins_total", "logins", "Initial beacon logins"),
+            ("dtgo_token_refreshes_total", "refreshes", "Successful token refreshes after expiry"),
+            ("dtgo_token_refresh_failures_total", "refresh_failures", "Failed token refreshes"),
+        ]:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for beacon, entry in snapshot.items():
+                if entry["tokens"]:
+                    lines.append(f'{name}{{beacon="{escape_label(beacon)}"}} {entry["tokens"][field]}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        write_atomic(path, self.to_prometheus())
+
+    def write_json(self, path):
+        write_atomic(path, self.to_json())
+
+
+def escape_label(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def labels(beacon, endpoint):
+    return f'beacon="{escape_label(beacon)}",endpoint="{escape_label(endpoint)}"'
+
+
+def write_atomic(path, text):
+    """先写临时文件再替换，textfile collector 不会读到写了一半的文件"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_file = tempfile.mkstemp(prefix=".dtgo_metrics.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(temp_file, path)
+    except Exception:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+
+
+# 全局注册表，所有灯塔客户端共享
+_metrics = MetricsRegistry()
+
+
+def get_metrics():
+    return _metrics
@@ -0,0 +1,342 @@
+import random
+from PyQt6.QtCore import Qt, QAbstractTableModel, QAbstractListModel, QModelIndex
+from PyQt6.QtGui import QColor
+
+RESIZE_SAMPLE_SIZE = 200  # 计算列宽时采样的行数
+MAX_COLUMN_WIDTH = 480    # 自动调整时单列的最大宽度（像素）
+
+
+class ResultTableModel(QAbstractTableModel):
+    """按列存储的结果表格模型
+
+    每列是一个字符串列表，key_column 列的值作为去重键，
+    键到行号的索引常驻内存，追加一批结果时只需一次 beginInsertRows；
+    设置筛选结果后只显示 visible_rows 中的行
+    """
+
+    def __init__(self, headers, key_column=0, parent=None):
+        super().__init__(parent)
+        self.headers = list(headers)
+        self.key_column = key_column
+        self.columns = [[] for _ in self.headers]
+        self.row_index = {}  # {key: row}
+        self.visible_rows = None  # 筛选后显示的行号（升序），None 表示显示全部
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        if self.visible_rows is not None:
+            return len(self.visible_rows)
+        return self.total_rows()
+
+    def total_rows(self):
+        return len(self.columns[self.key_column])
+
+    def source_row(self, row):
+        """视图中的行号对应的数据行号"""
+        if self.visible_rows is not None:
+            return self.visible_rows[row]
+        return row
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.headers)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        if role in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.ToolTipRole):
+            return self.columns[index.column()][self.source_row(index.row())]
+        return None
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.headers[section]
+        return None
+
+    def append_rows(self, rows):
+        """追加一批结果，跳过已存在的键，返回实际新增的行数"""
+        new_rows = []
+        seen = self.row_index
+        batch_keys = set()
+        for row in rows:
+            key = row[self.key_column]
+            if key in seen or key in batch_keys:
+                continue
+            batch_keys.add(key)
+            new_rows.append(row)
+        if not new_rows:
+            return 0
+
+        start = self.total_rows()
+        # 筛选中的新行先不显示，等筛选结果更新后再插入
+        filtered = self.visible_rows is not None
+        if not filtered:
+            self.beginInsertRows(QModelIndex(), start, start + len(new_rows) - 1)
+        for offset, row in enumerate(new_rows):
+            for column, value in zip(self.columns, row):
+                column.append("" if value is None else str(value))
+            self.row_index[row[self.key_column]] = start + offset
+        if not filtered:
+            self.endInsertRows()
+        return len(new_rows)
+
+    def tail_rows(self, count):
+        """最后 count 行的值，用于把新增的行交给筛选索引"""
+        start = self.total_rows() - count
+        return list(zip(*[column[start:] for column in self.columns]))
+
+    def set_visible_rows(self, rows):
+        """设置筛选结果，rows 为升序行号列表，None 表示取消筛选
+
+        新结果只是在原结果后追加了行时（筛选条件不变、结果持续到达）按插入处理，
+        视图保持滚动位置和选中行
+        """
+        old = self.visible_rows
+        if rows is None and old is None:
+            return
+        if rows is not None and old is not None and len(rows) >= len(old) and rows[:len(old)] == old:
+            if len(rows) > len(old):
+                self.beginInsertRows(QModelIndex(), len(old), len(rows) - 1)
+                self.visible_rows = rows
+                self.endInsertRows()
+            return
+        self.beginResetModel()
+        self.visible_rows = rows
+        self.endResetModel()
+
+    def contains(self, key):
+        return key in self.row_index
+
+    def row_values(self, row):
+        return [column[row] for column in self.columns]
+
+    def clear(self):
+        self.beginResetModel()
+        self.columns = [[] for _ in self.headers]
+        self.row_index = {}
+        if self.visible_rows is not None:
+            self.visible_rows = []
+        self.endResetModel()
+
+    def sample_rows(self, count=RESIZE_SAMPLE_SIZE):
+        """返回用于估算列宽的数据行号：开头、结尾各取一部分，其余随机抽取"""
+        total = self.rowCount()
+        if total <= count:
+            rows = range(total)
+        else:
+            edge = count // 4
+            rows = set(range(edge)) | set(range(total - edge, total))
+            rows.update(random.sample(range(edge, total - edge), count - 2 * edge))
+            rows = sorted(rows)
+        if self.visible_rows is None:
+            return rows
+        return [self.visible_rows[row] for row in rows]
+
+
+def resize_columns_from_sample(view, sample_size=RESIZE_SAMPLE_SIZE, max_width=MAX_COLUMN_WIDTH):
+    """按采样行的文本宽度调整列宽，代替遍历所有行的 resizeColumnsToContents"""
+    model = view.model()
+    header = view.horizontalHeader()
+    metrics = view.fontMetrics()
+    header_metrics = header.fontMetrics()
+    rows = model.sample_rows(sample_size)
+    padding = 24
+    # 最后一列由 setStretchLastSection 填满剩余宽度
+    for column in range(model.columnCount() - 1):
+        width = header_metrics.horizontalAdvance(model.headers[column])
+        values = model.columns[column]
+        for row in rows:
+            width = max(width, metrics.horizontalAdvance(values[row]))
+            if width >= max_width:
+                break
+        view.setColumnWidth(column, min(width + padding, max_width))
+
+
+# 任务状态对应的文字颜色
+TASK_STATUS_COLORS = {
+    "运行中": Qt.GlobalColor.blue,
+    "已结束": Qt.GlobalColor.green,
+}
+
+TASK_KEY_ROLE = Qt.ItemDataRole.UserRole         # (beacon, task_id)
+TASK_STATUS_ROLE = Qt.ItemDataRole.UserRole + 1  # 任务状态
+
+
+class TaskListModel(QAbstractListModel):
+    """任务记录列表模型
+
+    按列保存灯塔、任务 ID 和状态，(beacon, task_id) 到行号的索引常驻内存，
+    显示文字和颜色在绘制时按需生成
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.beacons = []
+        self.task_ids = []
+        self.statuses = []
+        self.progress = {}   # {(beacon, task_id): 最新进度}
+        self.row_index = {}  # {(beacon, task_id): row}
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.task_ids)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row = index.row()
+        if role == Qt.ItemDataRole.DisplayRole:
+            return f"{self.beacons[row]} => {self.task_ids[row]} [{self.statuses[row]}]"
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return self.progress.get((self.beacons[row], self.task_ids[row]))
+        if role == Qt.ItemDataRole.ForegroundRole:
+            return QColor(TASK_STATUS_COLORS.get(self.statuses[row], Qt.GlobalColor.black))
+        if role == TASK_KEY_ROLE:
+            return (self.beacons[row], self.task_ids[row])
+        if role == TASK_STATUS_ROLE:
+            return self.statuses[row]
+        return None
+
+    def load(self, records):
+        """用 {beacon: {task_id: status}} 重新填充列表"""
+        self.beginResetModel()
+        self.beacons = []
+        self.task_ids = []
+        self.statuses = []
+        for beacon, tasks in records.items():
+            for task_id, status in tasks.items():
+                self.beacons.append(beacon)
+                self.task_ids.append(task_id)
+                self.statuses.append(status)
+        self._rebuild_index()
+        self.endResetModel()
+
+    def add_task(self, beacon, task_id, status):
+        """追加任务，已存在时只更新状态"""
+        if (beacon, task_id) in self.row_index:
+            self.set_status(beacon, task_id, status)
+            return
+        row = len(self.task_ids)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.beacons.append(beacon)
+        self.task_ids.append(task_id)
+        self.statuses.append(status)
+        self.row_index[(beacon, task_id)] = row
+        self.endInsertRows()
+
+    def set_status(self, beacon, task_id, status):
+        row = self.row_index.get((beacon, task_id))
+        if row is None or self.statuses[row] == status:
+            return False
+        self.statuses[row] = status
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+        return True
+
+    def set_progress(self, beacon, task_id, message):
+        """记录任务的最新进度，提示文字在悬停时读取，不需要刷新视图"""
+        if (beacon, task_id) in self.row_index:
+            self.progress[(beacon, task_id)] = message
+
+    def task_key(self, row):
+        return (self.beacons[row], self.task_ids[row])
+
+    def remove_tasks(self, keys):
+        """删除一批任务，从后往前按连续区间删除后重建索引"""
+        rows = sorted({self.row_index[key] for key in keys if key in self.row_index}, reverse=True)
+        if not rows:
+            return
+        index = 0
+        while index < len(rows):
+            last = first = rows[index]
+            while index + 1 < len(rows) and rows[index + 1] == first - 1:
+                index += 1
+                first = rows[index]
+            self.beginRemoveRows(QModelIndex(), first, last)
+            del self.beacons[first:last + 1]
+            del self.task_ids[first:last + 1]
+            del self.statuses[first:last + 1]
+            self.endRemoveRows()
+            index += 1
+        for key in keys:
+            self.progress.pop(key, None)
+        self._rebuild_index()
+
+    def _rebuild_index(self):
+        self.row_index = {key: row for row, key in enumerate(zip(self.beacons, self.task_ids))}
+
+
+def format_bytes(count):
+    for unit in ("B", "KB", "MB", "GB"):
+        if count < 1024 or unit == "GB":
+            return f"{count:.0f}{unit}" if unit == "B" else f"{count:.1f}{unit}"
+        count /= 1024
+
+
+def format_ms(seconds):
+    return "-" if seconds is None else f"{seconds * 1000:.0f}"
+
+
+class MetricsTableModel(QAbstractTableModel):
+    """灯塔接口请求指标表格，每行一个 (灯塔, 接口)，有错误、超时或 401 的行标红"""
+
+    HEADERS = ["灯塔", "接口", "请求", "错误", "超时", "401", "p50(ms)", "p95(ms)", "p99(ms)", "接收", "token 刷新/失败"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = []
+        self.alerts = []  # 每行是否需要标红
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.HEADERS)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        if role in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.ToolTipRole):
+            return self.rows[index.row()][index.column()]
+        if role == Qt.ItemDataRole.ForegroundRole and self.alerts[index.row()]:
+            return QColor(Qt.GlobalColor.red)
+        return None
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def set_snapshot(self, snapshot):
+        """用 MetricsRegistry.snapshot() 的结果重新填充表格"""
+        self.beginResetModel()
+        self.rows = []
+        self.alerts = []
+        for beacon in sorted(snapshot):
+            entry = snapshot[beacon]
+            tokens = entry["tokens"]
+            token_text = f"{tokens['refreshes']}/{tokens['refresh_failures']}" if tokens else "0/0"
+            for endpoint in sorted(entry["endpoints"]):
+                data = entry["endpoints"][endpoint]
+                self.rows.append([
+                    beacon,
+                    endpoint,
+                    str(data["requests"]),
+                    str(data["errors"]),
+                    str(data["timeouts"]),
+                    str(data["auth_errors"]),
+                    format_ms(data["p50"]),
+                    format_ms(data["p95"]),
+                    format_ms(data["p99"]),
+                    format_bytes(data["bytes_received"]),
+                    token_text,
+                ])
+                self.alerts.append(bool(data["errors"] or data["timeouts"] or data["auth_errors"]))
+        self.endResetModel()
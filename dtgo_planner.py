@@ -0,0 +1,140 @@
+import heapq
+import threading
+
+DEFAULT_TASK_DURATION = 3600  # 没有历史数据时假设的单个任务时长（秒）
+EWMA_ALPHA = 0.3              # 指数加权平均中新样本的权重
+REQUESTS_PER_TASK = 50        # 估算 API 开销时每个任务大约需要的请求数
+
+
+def ewma(current, sample, alpha=EWMA_ALPHA):
+    if current is None:
+        return sample
+    return current * (1 - alpha) + sample * alpha
+
+
+class BeaconCostModel:
+    """单个灯塔的性能模型：任务时长、API 延迟和当前负载"""
+
+    def __init__(self, beacon):
+        self.beacon = beacon
+        self.lock = threading.Lock()
+        self.task_duration = None  # 任务时长的 EWMA（秒）
+        self.latency = None        # API 延迟的 EWMA（秒）
+        self.samples = 0           # 已记录的任务时长样本数
+        self.running = 0           # 灯塔上正在运行的任务数
+        self.waiting = 0           # 灯塔上排队等待的任务数
+
+    def record_duration(self, seconds):
+        with self.lock:
+            self.task_duration = ewma(self.task_duration, seconds)
+            self.samples += 1
+
+    def record_latency(self, seconds):
+        with self.lock:
+            self.latency = ewma(self.latency, seconds)
+
+    def update_load(self, running, waiting):
+        with self.lock:
+            self.running = running
+            self.waiting = waiting
+
+    def expected_duration(self, default=DEFAULT_TASK_DURATION):
+        """单个任务的预计耗时，包含轮询和拉取结果的 API 开销"""
+        duration = self.task_duration if self.task_duration is not None else default
+        return duration + (self.latency or 0) * REQUESTS_PER_TASK
+
+    def predict_finish(self, extra_tasks, limit, default=DEFAULT_TASK_DURATION):
+        """再分配 extra_tasks 个任务后，灯塔预计多少秒后全部完成"""
+        limit = max(limit, 1)
+        # 正在运行的任务平均还剩一半时长
+        backlog = self.running * 0.5 + self.waiting + extra_tasks
+        return backlog * self.expected_duration(default) / limit
+
+    def to_dict(self):
+        return {
+            "task_duration": self.task_duration,
+            "latency": self.latency,
+            "samples": self.samples
+        }
+
+    def load(self, data):
+        self.task_duration = data.get("task_duration")
+        self.latency = data.get("latency")
+        self.samples = data.get("samples", 0)
+
+
+# 全局模型注册表，任务线程记录数据，分配任务时读取
+_models = {}
+_models_lock = threading.Lock()
+
+
+def get_cost_model(beacon):
+    with _models_lock:
+        model = _models.get(beacon)
+        if model is None:
+            model = BeaconCostModel(beacon)
+            _models[beacon] = model
+        return model
+
+
+def load_cost_models(stats):
+    """从配置中恢复历史的灯塔性能数据"""
+    for beacon, data in (stats or {}).items():
+        get_cost_model(beacon).load(data)
+
+
+def dump_cost_models():
+    with _models_lock:
+        models = list(_models.values())
+    return {model.beacon: model.to_dict() for model in models if model.samples or model.latency}
+
+
+def format_duration(seconds):
+    """把秒数格式化为便于阅读的时长"""
+    minutes = int(seconds // 60)
+    if minutes < 1:
+        return "不到 1 分钟"
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours} 小时 {minutes} 分钟"
+    return f"{minutes} 分钟"
+
+
+def default_duration(models):
+    """没有历史数据的灯塔使用其他灯塔的平均任务时长"""
+    known = [model.task_duration for model in models if model.task_duration is not None]
+    if known:
+        return sum(known) / len(known)
+    return DEFAULT_TASK_DURATION
+
+
+def plan_assignments(targets, beacons, limits, queued=None):
+    """把目标分配给预计完成时间最早的灯塔，使所有目标的总完成时间最短
+
+    limits 为 {beacon: 并发上限}，queued 为 {beacon: 已经排队等待提交的目标数}。
+    返回 ({beacon: [targets]}, {beacon: 预计完成秒数})
+    """
+    queued = queued or {}
+    models = {beacon: get_cost_model(beacon) for beacon in beacons}
+    default = default_duration(models.values())
+    assignments = {beacon: [] for beacon in beacons}
+    counts = {beacon: queued.get(beacon, 0) for beacon in beacons}
+
+    # 堆中保存每个灯塔再多分配一个目标后的预计完成时间
+    heap = [
+        (models[beacon].predict_finish(counts[beacon] + 1, limits[beacon], default), index, beacon)
+        for index, beacon in enumerate(beacons)
+    ]
+    heapq.heapify(heap)
+    for target in targets:
+        _, index, beacon = heapq.heappop(heap)
+        assignments[beacon].append(target)
+        counts[beacon] += 1
+        finish = models[beacon].predict_finish(counts[beacon] + 1, limits[beacon], default)
+        heapq.heappush(heap, (finish, index, beacon))
+
+    finish_times = {
+        beacon: models[beacon].predict_finish(counts[beacon], limits[beacon], default)
+        for beacon in beacons
+    }
+    return assignments, finish_times
@@ -0,0 +1,282 @@
+"""可选的性能剖析：主要阶段的耗时区间、每个线程的 cProfile 或采样剖析，以及 Chrome trace 文件
+
+在配置文件中设置 "profile": {"enabled": true} 后启用，关闭程序时写入 output_dir：
+    trace.json                  Chrome trace 格式，可用 chrome://tracing 或 https://ui.perfetto.dev 打开
+    spans.txt                   各阶段的次数、总耗时、平均和最大耗时，按总耗时排列
+    cprofile-<线程>.prof        profiler 为 cprofile 时每个线程的 cProfile 结果，可用 snakeviz 或 pstats 查看
+    sample-<线程>.folded        profiler 为 sample 时每个线程的采样调用栈，可用 speedscope 或 flamegraph.pl 查看
+
+阶段名称以 "阶段.细分" 命名（poll、fetch、decode、emit、ui、persist），trace 中按阶段分类。
+未启用时 span() 只返回一个共享的空对象，对轮询和界面线程几乎没有开销
+"""
+import collections
+import cProfile
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# 默认剖析配置，可以通过配置文件中的 "profile" 覆盖
+DEFAULT_PROFILE_OPTIONS = {
+    "enabled": False,
+    "output_dir": "dtgo_profile",  # 剖析结果目录
+    "trace": True,                 # 是否记录 Chrome trace
+    "profiler": "",                # cprofile 为每个线程的 cProfile，sample 为采样剖析，为空时只记录阶段耗时
+    "sample_interval": 0.005,      # 采样间隔（秒）
+    "max_events": 500000,          # trace 最多保留的区间数，超过后丢弃最早的
+}
+
+
+class NullSpan:
+    """未启用剖析时 span() 返回的空区间"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+class Span:
+    """一个阶段的耗时区间，退出时交给剖析器记录，set() 可以在区间内补充参数（如行数）"""
+    __slots__ = ("profiler", "name", "args", "start")
+
+    def __init__(self, profiler, name, args):
+        self.profiler = profiler
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.profiler.add_span(self.name, self.start, time.perf_counter_ns(), self.args)
+        return False
+
+    def set(self, **args):
+        self.args.update(args)
+
+
+def file_label(name):
+    """线程名中的灯塔地址等字符替换为文件名可用的字符"""
+    return re.sub(r"[^\w.-]+", "_", name).strip("_") or "thread"
+
+
+class Profiler:
+    """收集各线程的阶段耗时、cProfile 结果和采样调用栈，stop() 时写入文件"""
+
+    def __init__(self, options=None):
+        self.options = dict(DEFAULT_PROFILE_OPTIONS)
+        if options:
+            self.options.update(options)
+        self.lock = threading.Lock()
+        self.origin = time.perf_counter_ns()
+        self.pid = os.getpid()
+        self.events = collections.deque(maxlen=self.options["max_events"])  # [(名称, 开始, 结束, 线程, 参数)]
+        self.thread_names = {}  # {线程 ident: 线程名}
+        self.totals = {}        # {名称: [次数, 总耗时, 最大耗时]}（纳秒）
+        self.thread_profiles = {}  # {线程名: [cProfile.Profile]}
+        self.main_profile = None
+        self.main_thread = None
+        self.samples = {}       # {线程名: {调用栈: 次数}}
+        self.sample_thread = None
+        self.sampling = False
+
+    def add_span(self, name, start, end, args):
+        tid = threading.get_ident()
+        elapsed = end - start
+        with self.lock:
+            if tid not in self.thread_names:
+                self.thread_names[tid] = threading.current_thread().name
+            if self.options["trace"]:
+                self.events.append((name, start, end, tid, args))
+            totals = self.totals.get(name)
+            if totals is None:
+                self.totals[name] = [1, elapsed, elapsed]
+            else:
+                totals[0] += 1
+                totals[1] += elapsed
+                if elapsed > totals[2]:
+                    totals[2] = elapsed
+
+    def start(self):
+        """在调用线程（界面或命令行的主线程）上开始 cProfile，或启动采样线程"""
+        mode = self.options["profiler"]
+        if mode == "cprofile":
+            self.main_thread = threading.get_ident()
+            self.main_profile = self.enable_profile()
+        elif mode == "sample":
+            self.sampling = True
+            self.sample_thread = threading.Thread(target=self.sample_loop, name="dtgo-profile-sampler", daemon=True)
+            self.sample_thread.start()
+
+    def enable_profile(self):
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as e:
+            # Python 3.12 起同一时间只能有一个 cProfile 生效，其余线程只记录阶段耗时
+            print(f"cProfile unavailable in thread {threading.current_thread().name}: {str(e)}")
+            return None
+        return profile
+
+    @contextmanager
+    def profile_thread(self):
+        profile = self.enable_profile()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+                with self.lock:
+                    self.thread_profiles.setdefault(threading.current_thread().name, []).append(profile)
+
+    def sample_loop(self):
+        interval = self.options["sample_interval"]
+        own = threading.get_ident()
+        while self.sampling:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            frames = sys._current_frames()
+            with self.lock:
+                for tid, frame in frames.items():
+                    if tid == own:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        code = frame.f_code
+                        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                        frame = frame.f_back
+                    stack.reverse()
+                    counts = self.samples.setdefault(names.get(tid, str(tid)), {})
+                    key = ";".join(stack)
+                    counts[key] = counts.get(key, 0) + 1
+            del frames
+            time.sleep(interval)
+
+    def stop(self):
+        """停止剖析并写入结果文件，返回结果目录"""
+        if self.main_profile is not None and threading.get_ident() == self.main_thread:
+            self.main_profile.disable()
+            self.thread_profiles.setdefault(threading.current_thread().name, []).append(self.main_profile)
+            self.main_profile = None
+        if self.sample_thread is not None:
+            self.sampling = False
+            self.sample_thread.join()
+            self.sample_thread = None
+
+        output_dir = self.options["output_dir"]
+        os.makedirs(output_dir, exist_ok=True)
+        with self.lock:
+            if self.options["trace"]:
+                self.write_trace(os.path.join(output_dir, "trace.json"))
+            self.write_summary(os.path.join(output_dir, "spans.txt"))
+            for name, profiles in self.thread_profiles.items():
+                stats = pstats.Stats(*profiles)
+                stats.dump_stats(os.path.join(output_dir, f"cprofile-{file_label(name)}.prof"))
+            for name, counts in self.samples.items():
+                with open(os.path.join(output_dir, f"sample-{file_label(name)}.folded"), "w", encoding="utf-8") as f:
+                    for stack, count in counts.items():
+                        f.write(f"{stack} {count}\n")
+        return output_dir
+
+    def write_trace(self, path):
+        """Chrome trace 格式：每个区间为一个完整事件（ph X），时间单位为微秒"""
+        events = [
+            {"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": name}}
+            for tid, name in self.thread_names.items()
+        ]
+        for name, start, end, tid, args in self.events:
+            events.append({
+                "name": name,
+                "cat": name.split(".", 1)[0],
+                "ph": "X",
+                "ts": (start - self.origin) / 1000,
+                "dur": (end - start) / 1000,
+                "pid": self.pid,
+                "tid": tid,
+                "args": args,
+            })
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, ensure_ascii=False, default=str)
+
+    def summary(self):
+        """{名称: {"count", "total_ms", "mean_ms", "max_ms"}}，按总耗时从多到少排列"""
+        rows = sorted(self.totals.items(), key=lambda item: item[1][1], reverse=True)
+        return {
+            name: {
+                "count": count,
+                "total_ms": round(total / 1e6, 3),
+                "mean_ms": round(total / count / 1e6, 3),
+                "max_ms": round(peak / 1e6, 3),
+            }
+            for name, (count, total, peak) in rows
+        }
+
+    def write_summary(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"{'span':<28}{'count':>10}{'total_ms':>14}{'mean_ms':>12}{'max_ms':>12}\n")
+            for name, data in self.summary().items():
+                f.write(
+                    f"{name:<28}{data['count']:>10}{data['total_ms']:>14.1f}"
+                    f"{data['mean_ms']:>12.3f}{data['max_ms']:>12.3f}\n"
+                )
+
+
+# 全局剖析器，未启用时为 None
+_profiler = None
+_profiler_lock = threading.Lock()
+
+
+def span(name, **args):
+    """记录一个阶段的耗时：with span("fetch", path=path): ...，未启用剖析时不做任何事"""
+    profiler = _profiler
+    if profiler is None:
+        return NULL_SPAN
+    return Span(profiler, name, args)
+
+
+def profile_thread():
+    """线程入口使用：with profile_thread(): ...，profiler 为 cprofile 时剖析该线程"""
+    profiler = _profiler
+    if profiler is None or profiler.options["profiler"] != "cprofile":
+        return NULL_SPAN
+    return profiler.profile_thread()
+
+
+def is_profiling():
+    return _profiler is not None
+
+
+def start_profiling(options):
+    """按配置启用剖析，已经启用时返回现有的剖析器"""
+    global _profiler
+    with _profiler_lock:
+        if _profiler is None:
+            profiler = Profiler(options)
+            profiler.start()
+            _profiler = profiler
+        return _profiler
+
+
+def stop_profiling():
+    """停止剖析并写入结果，返回结果目录，未启用时返回 None"""
+    global _profiler
+    with _profiler_lock:
+        profiler, _profiler = _profiler, None
+    if profiler is None:
+        return None
+    return profiler.stop()
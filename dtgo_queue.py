@@ -0,0 +1,125 @@
+import threading
+from collections import deque
+
+DEFAULT_BEACON_LIMIT = 5  # 单个灯塔默认的最大并行任务数
+MAX_SUBMIT_ATTEMPTS = 3   # 同一个目标最多尝试提交的次数
+
+
+class TaskQueue:
+    """所有灯塔共享的待提交目标队列
+
+    灯塔的任务线程在有空闲并发槽位时从队列领取目标，提交失败的目标放回队首。
+    每个目标记录允许提交到的灯塔集合，这些灯塔全部离开后目标开放给任意灯塔，避免丢失。
+    目标可以指定优先灯塔，灯塔先领取分配给自己的目标，没有时再从队尾领取其他灯塔的目标
+    """
+
+    def __init__(self, default_limit=DEFAULT_BEACON_LIMIT, limits=None):
+        self.lock = threading.Lock()
+        self.pending = deque()  # [{target, beacons, preferred, attempts}]
+        self.default_limit = default_limit
+        self.limits = dict(limits or {})
+
+    def get_limit(self, beacon):
+        return self.limits.get(beacon, self.default_limit)
+
+    def set_limit(self, beacon, limit):
+        with self.lock:
+            self.limits[beacon] = limit
+
+    def put(self, targets, beacons=None, preferred=None):
+        """加入待提交目标
+
+        beacons 为允许提交到的灯塔，None 表示任意灯塔；preferred 为优先领取的灯塔
+        """
+        allowed = set(beacons) if beacons else None
+        with self.lock:
+            for target in targets:
+                self.pending.append({
+                    "target": target,
+                    "beacons": set(allowed) if allowed else None,
+                    "preferred": preferred,
+                    "attempts": 0
+                })
+
+    def take(self, beacon, count):
+        """为灯塔领取最多 count 个目标，先领取分配给自己的，再从队尾领取其他灯塔的"""
+        if count <= 0:
+            return []
+        with self.lock:
+            own = [
+                entry for entry in self.pending
+                if entry["preferred"] in (None, beacon) and self._allows(entry, beacon)
+            ][:count]
+            taken_ids = {id(entry) for entry in own}
+            stolen = []
+            if len(own) < count:
+                for entry in reversed(self.pending):
+                    if len(own) + len(stolen) >= count:
+                        break
+                    if id(entry) not in taken_ids and self._allows(entry, beacon):
+                        stolen.append(entry)
+                taken_ids.update(id(entry) for entry in stolen)
+            if taken_ids:
+                self.pending = deque(entry for entry in self.pending if id(entry) not in taken_ids)
+        for entry in stolen:
+            entry["preferred"] = beacon
+        return own + stolen
+
+    def requeue(self, entries, failed=True):
+        """把没有提交成功的目标放回队首，返回超过重试次数被丢弃的目标"""
+        dropped = []
+        with self.lock:
+            for entry in reversed(entries):
+                if failed:
+                    entry["attempts"] += 1
+                    if entry["attempts"] >= MAX_SUBMIT_ATTEMPTS:
+                        dropped.append(entry)
+                        continue
+                self.pending.appendleft(entry)
+        return dropped
+
+    def remove_beacon(self, beacon):
+        """灯塔离开时，把它从目标的可选灯塔中移除"""
+        with self.lock:
+            for entry in self.pending:
+                if entry["preferred"] == beacon:
+                    entry["preferred"] = None
+                if entry["beacons"] and beacon in entry["beacons"]:
+                    entry["beacons"].discard(beacon)
+                    if not entry["beacons"]:
+                        entry["beacons"] = None
+
+    def clear(self):
+        """清空队列，返回被移除的目标"""
+        with self.lock:
+            entries = list(self.pending)
+            self.pending.clear()
+        return entries
+
+    def has_work(self, beacon=None):
+        with self.lock:
+            if beacon is None:
+                return bool(self.pending)
+            return any(self._allows(entry, beacon) for entry in self.pending)
+
+    def pending_count(self, beacon=None):
+        with self.lock:
+            if beacon is None:
+                return len(self.pending)
+            return sum(1 for entry in self.pending if self._allows(entry, beacon))
+
+    def preferred_counts(self):
+        """各灯塔被分配但还没有领取的目标数"""
+        counts = {}
+        with self.lock:
+            for entry in self.pending:
+                if entry["preferred"]:
+                    counts[entry["preferred"]] = counts.get(entry["preferred"], 0) + 1
+        return counts
+
+    def __len__(self):
+        return self.pending_count()
+
+    @staticmethod
+    def _allows(entry, beacon):
+        return entry["beacons"] is None or beacon in entry["beacons"]
@@ -0,0 +1,117 @@
+import random
+import threading
+import time
+
+# 默认轮询配置，可以通过配置文件中的 "poll" 覆盖
+DEFAULT_POLL_OPTIONS = {
+    "min_interval": 5,       # 最短轮询间隔（秒）
+    "max_interval": 300,     # 最长轮询间隔（秒）
+    "backoff_factor": 1.5,   # 没有变化时间隔的增长倍数
+    "jitter": 0.2,           # 随机抖动比例，避免所有任务同时轮询
+    "elapsed_ratio": 0.1,    # 间隔不超过任务已运行时长的比例，刚提交的任务保持高频
+}
+
+# DTGO 提交的任务依次经过的扫描阶段（灯塔任务的 service 名称）
+TASK_PHASES = [
+    "domain_brute",
+    "arl_search",
+    "dns_query_plugin",
+    "port_scan",
+    "service_detection",
+    "fetch_site",
+    "site_identify",
+    "file_leak",
+]
+
+
+def estimate_progress(task_data):
+    """根据已完成的扫描阶段估算任务进度 (0~1)"""
+    if task_data.get("status") == "done":
+        return 1.0
+    completed = {s.get("name") for s in task_data.get("service", [])}
+    finished = sum(1 for phase in TASK_PHASES if phase in completed)
+    return finished / len(TASK_PHASES)
+
+
+class PollScheduler:
+    """按任务计算下次轮询时间的调度器
+
+    有新结果或进入新阶段时立即回到最短间隔，否则按指数退避逐渐放慢；
+    退避上限随任务进度升高而降低，接近完成时保持高频轮询
+    """
+
+    def __init__(self, options=None):
+        self.options = dict(DEFAULT_POLL_OPTIONS)
+        if options:
+            self.options.update(options)
+        self.lock = threading.Lock()
+        self.entries = {}  # {key: {added, interval, next_check, progress}}
+
+    def add(self, key, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            self.entries[key] = {
+                "added": now,
+                "interval": self.options["min_interval"],
+                "next_check": now,
+                "progress": 0.0
+            }
+
+    def remove(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def due(self, now=None):
+        """返回已经到达轮询时间的 key 列表"""
+        now = time.time() if now is None else now
+        with self.lock:
+            return [key for key, entry in self.entries.items() if entry["next_check"] <= now]
+
+    def next_due_in(self, now=None):
+        """距离最近一次轮询的秒数，没有任务时返回 None"""
+        now = time.time() if now is None else now
+        with self.lock:
+            if not self.entries:
+                return None
+            return max(min(entry["next_check"] for entry in self.entries.values()) - now, 0)
+
+    def record(self, key, changed, progress=None, now=None):
+        """记录一次轮询结果并安排下次轮询，返回本次选定的间隔"""
+        now = time.time() if now is None else now
+        min_interval = self.options["min_interval"]
+        max_interval = self.options["max_interval"]
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+
+            if progress is not None:
+                # 进入新的扫描阶段也视为有变化
+                if progress > entry["progress"]:
+                    changed = True
+                entry["progress"] = progress
+
+            if changed:
+                interval = min_interval
+            else:
+                interval = entry["interval"] * self.options["backoff_factor"]
+
+            # 进度越接近完成，允许的最长间隔越短
+            cap = min_interval + (max_interval - min_interval) * (1 - entry["progress"])
+            # 刚开始运行的任务间隔不超过已运行时长的一定比例
+            elapsed = now - entry["added"]
+            cap = min(cap, max(min_interval, elapsed * self.options["elapsed_ratio"]))
+            interval = max(min_interval, min(interval, cap))
+            entry["interval"] = interval
+
+            jitter = self.options["jitter"]
+            delay = interval * random.uniform(1 - jitter, 1 + jitter)
+            delay = max(min_interval, min(delay, max_interval))
+            entry["next_check"] = now + delay
+            return interval
@@ -0,0 +1,167 @@
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS beacons (
+    target TEXT PRIMARY KEY,
+    token TEXT NOT NULL DEFAULT '',
+    info TEXT NOT NULL DEFAULT '{}',
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    beacon TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (beacon, task_id)
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status);
+CREATE TABLE IF NOT EXISTS task_status_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    beacon TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    changed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_history_task ON task_status_history (beacon, task_id);
+"""
+
+
+class TaskStore:
+    """基于 SQLite (WAL) 的灯塔和任务记录存储，按行更新"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    @contextmanager
+    def transaction(self):
+        """在一个事务中执行多条写入，异常时回滚"""
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                yield self.conn
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            else:
+                self.conn.execute("COMMIT")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    # 灯塔
+    def load_beacons(self):
+        """返回 {target: beacon_info}"""
+        with self.lock:
+            rows = self.conn.execute("SELECT target, token, info FROM beacons ORDER BY rowid").fetchall()
+        beacons = {}
+        for target, token, info in rows:
+            beacon_info = json.loads(info)
+            beacon_info["target"] = target
+            beacon_info["token"] = token
+            beacons[target] = beacon_info
+        return beacons
+
+    def save_beacon(self, beacon_info, conn=None):
+        extra = {k: v for k, v in beacon_info.items() if k not in ("target", "token")}
+        with self.lock:
+            (conn or self.conn).execute(
+                "INSERT INTO beacons (target, token, info, updated) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (target) DO UPDATE SET token = excluded.token, "
+                "info = excluded.info, updated = excluded.updated",
+                (beacon_info["target"], beacon_info.get("token", ""),
+                 json.dumps(extra, ensure_ascii=False), time.time())
+            )
+
+    def delete_beacon(self, target, conn=None):
+        with self.lock:
+            (conn or self.conn).execute("DELETE FROM beacons WHERE target = ?", (target,))
+
+    # 任务
+    def load_task_records(self):
+        """返回 {beacon: {task_id: status}}，按创建顺序排列"""
+        records = {}
+        with self.lock:
+            rows = self.conn.execute("SELECT beacon, task_id, status FROM tasks ORDER BY rowid").fetchall()
+        for beacon, task_id, status in rows:
+            tasks = records.get(beacon)
+            if tasks is None:
+                tasks = records[beacon] = {}
+            tasks[task_id] = status
+        return records
+
+    def set_task_status(self, beacon, task_id, status, conn=None):
+        """新增任务或更新任务状态，状态变化时写入历史"""
+        now = time.time()
+        with self.lock:
+            conn = conn or self.conn
+            row = conn.execute(
+                "SELECT status FROM tasks WHERE beacon = ? AND task_id = ?",
+                (beacon, task_id)
+            ).fetchone()
+            if row is None:
+                conn.execute(
+                    "INSERT INTO tasks (beacon, task_id, status, created, updated) VALUES (?, ?, ?, ?, ?)",
+                    (beacon, task_id, status, now, now)
+                )
+            elif row[0] != status:
+                conn.execute(
+                    "UPDATE tasks SET status = ?, updated = ? WHERE beacon = ? AND task_id = ?",
+                    (status, now, beacon, task_id)
+                )
+            else:
+                return
+            conn.execute(
+                "INSERT INTO task_status_history (beacon, task_id, status, changed) VALUES (?, ?, ?, ?)",
+                (beacon, task_id, status, now)
+            )
+
+    def delete_task(self, beacon, task_id, conn=None):
+        with self.lock:
+            (conn or self.conn).execute(
+                "DELETE FROM tasks WHERE beacon = ? AND task_id = ?",
+                (beacon, task_id)
+            )
+
+    def get_status_history(self, beacon, task_id):
+        """返回任务的状态变化历史 [(status, changed)]"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT status, changed FROM task_status_history "
+                "WHERE beacon = ? AND task_id = ? ORDER BY id",
+                (beacon, task_id)
+            ).fetchall()
+
+    def import_records(self, beacons, records):
+        """合并旧版配置文件中的灯塔和任务记录，数据库中已有的灯塔和任务保持不变"""
+        with self.transaction() as conn:
+            for target, beacon_info in beacons.items():
+                extra = {k: v for k, v in beacon_info.items() if k not in ("target", "token")}
+                conn.execute(
+                    "INSERT OR IGNORE INTO beacons (target, token, info, updated) VALUES (?, ?, ?, ?)",
+                    (target, beacon_info.get("token", ""), json.dumps(extra, ensure_ascii=False), time.time())
+                )
+            now = time.time()
+            imported = []
+            for beacon, tasks in records.items():
+                for task_id, status in tasks.items():
+                    cursor = conn.execute(
+                        "INSERT OR IGNORE INTO tasks (beacon, task_id, status, created, updated) VALUES (?, ?, ?, ?, ?)",
+                        (beacon, task_id, status, now, now)
+                    )
+                    if cursor.rowcount:
+                        imported.append((beacon, task_id, status, now))
+            conn.executemany(
+                "INSERT INTO task_status_history (beacon, task_id, status, changed) VALUES (?, ?, ?, ?)",
+                imported
+            )
@@ -0,0 +1,342 @@
+import ipaddress
+import sqlite3
+from functools import lru_cache
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit, urlunsplit
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sites (
+    id INTEGER PRIMARY KEY,
+    site TEXT NOT NULL UNIQUE,
+    host TEXT NOT NULL,
+    title TEXT NOT NULL DEFAULT '',
+    ip TEXT NOT NULL DEFAULT '',
+    server TEXT NOT NULL DEFAULT '',
+    finger TEXT NOT NULL DEFAULT '',
+    first_seen REAL NOT NULL,
+    first_beacon TEXT NOT NULL,
+    first_task TEXT NOT NULL,
+    last_seen REAL NOT NULL,
+    last_beacon TEXT NOT NULL,
+    last_task TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sites_host ON sites (host);
+CREATE INDEX IF NOT EXISTS idx_sites_ip ON sites (ip);
+CREATE INDEX IF NOT EXISTS idx_sites_title ON sites (title);
+CREATE INDEX IF NOT EXISTS idx_sites_first ON sites (first_beacon, first_task);
+CREATE TABLE IF NOT EXISTS site_fingers (
+    site_id INTEGER NOT NULL,
+    finger TEXT NOT NULL,
+    PRIMARY KEY (site_id, finger)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_site_fingers_finger ON site_fingers (finger);
+CREATE TABLE IF NOT EXISTS domains (
+    id INTEGER PRIMARY KEY,
+    domain TEXT NOT NULL UNIQUE,
+    type TEXT NOT NULL DEFAULT '',
+    ips TEXT NOT NULL DEFAULT '',
+    first_seen REAL NOT NULL,
+    first_beacon TEXT NOT NULL,
+    first_task TEXT NOT NULL,
+    last_seen REAL NOT NULL,
+    last_beacon TEXT NOT NULL,
+    last_task TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS domain_ips (
+    domain_id INTEGER NOT NULL,
+    ip TEXT NOT NULL,
+    PRIMARY KEY (domain_id, ip)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_domain_ips_ip ON domain_ips (ip);
+CREATE INDEX IF NOT EXISTS idx_domains_first ON domains (first_beacon, first_task);
+CREATE TABLE IF NOT EXISTS leaks (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE,
+    title TEXT NOT NULL DEFAULT '',
+    first_seen REAL NOT NULL,
+    first_beacon TEXT NOT NULL,
+    first_task TEXT NOT NULL,
+    last_seen REAL NOT NULL,
+    last_beacon TEXT NOT NULL,
+    last_task TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_leaks_title ON leaks (title);
+CREATE INDEX IF NOT EXISTS idx_leaks_first ON leaks (first_beacon, first_task);
+CREATE TABLE IF NOT EXISTS sightings (
+    kind TEXT NOT NULL,
+    entity_id INTEGER NOT NULL,
+    beacon TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    seen REAL NOT NULL,
+    PRIMARY KEY (kind, entity_id, beacon, task_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_sightings_task ON sightings (beacon, task_id, kind);
+"""
+
+# 每类结果对应的表、去重键字段和查询时返回的字段
+WAREHOUSE_TABLES = {
+    "assets": ("sites", "site", ["site", "title", "ip", "server", "finger"]),
+    "domains": ("domains", "domain", ["domain", "type", "ips"]),
+    "leaks": ("leaks", "url", ["url", "title"]),
+}
+
+
+def split_url(url):
+    """统一 URL 的写法：协议和主机名小写，去掉默认端口和只有 / 的路径，返回 (URL, 主机名)"""
+    url = (url or "").strip()
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return url, ""
+    if not parts.scheme or not parts.netloc:
+        return url, ""
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    if (scheme, netloc.rsplit(":", 1)[-1]) in (("http", "80"), ("https", "443")):
+        netloc = netloc.rsplit(":", 1)[0]
+    path = "" if parts.path == "/" else parts.path
+    host = netloc.rsplit("@", 1)[-1]
+    host = host[1:host.find("]")] if host.startswith("[") else host.split(":", 1)[0]
+    return urlunsplit((scheme, netloc, path, parts.query, parts.fragment)), host
+
+
+def normalize_url(url):
+    return split_url(url)[0]
+
+
+def normalize_domain(domain):
+    return (domain or "").strip().lower().rstrip(".")
+
+
+@lru_cache(maxsize=65536)
+def _normalize_ip(ip):
+    try:
+        return str(ipaddress.ip_address(ip))
+    except ValueError:
+        return ip
+
+
+def normalize_ip(ip):
+    """IP 统一为标准写法，同一批结果中的 IP 重复很多，结果会被缓存"""
+    return _normalize_ip((ip or "").strip())
+
+
+def normalize_fingers(fingers):
+    """指纹统一为去重排序后的 "名称版本" 列表"""
+    names = set()
+    for finger in fingers or []:
+        name = f"{finger.get('name', '')}{finger.get('version', '')}".strip()
+        if name:
+            names.add(name)
+    return sorted(names)
+
+
+class ResultWarehouse:
+    """跨任务、跨灯塔去重的本地结果库（SQLite）
+
+    资产、子域名和信息泄露按规范化后的网站、域名和 URL 去重，
+    每条记录保存首次和最近一次发现的时间、灯塔和任务，所有发现记录保存在 sightings 中
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    @contextmanager
+    def transaction(self):
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                yield self.conn
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            else:
+                self.conn.execute("COMMIT")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    # 写入
+    def ingest(self, result_type, beacon, task_id, items, seen=None):
+        """写入一批灯塔返回的原始记录，已存在的记录更新内容和最近发现信息"""
+        if not items:
+            return
+        seen = time.time() if seen is None else seen
+        with self.transaction() as conn:
+            if result_type == "assets":
+                self._ingest_sites(conn, beacon, task_id, items, seen)
+            elif result_type == "domains":
+                self._ingest_domains(conn, beacon, task_id, items, seen)
+            elif result_type == "leaks":
+                self._ingest_leaks(conn, beacon, task_id, items, seen)
+
+    def _upsert(self, conn, table, key, columns, rows, beacon, task_id, seen):
+        """按 key 插入或更新记录，返回 {key: id}"""
+        fields = [key] + columns
+        placeholders = ", ".join("?" for _ in fields)
+        updates = ", ".join(f"{column} = excluded.{column}" for column in columns)
+        conn.executemany(
+            f"INSERT INTO {table} ({', '.join(fields)}, first_seen, first_beacon, first_task, "
+            f"last_seen, last_beacon, last_task) VALUES ({placeholders}, ?, ?, ?, ?, ?, ?) "
+            f"ON CONFLICT ({key}) DO UPDATE SET {updates}, last_seen = excluded.last_seen, "
+            f"last_beacon = excluded.last_beacon, last_task = excluded.last_task",
+            [tuple(row) + (seen, beacon, task_id, seen, beacon, task_id) for row in rows]
+        )
+        ids = {}
+        keys = list({row[0] for row in rows})
+        # 分段查询，避免超过 SQLite 的参数数量上限
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            ids.update(conn.execute(
+                f"SELECT {key}, id FROM {table} WHERE {key} IN ({', '.join('?' for _ in chunk)})",
+                chunk
+            ).fetchall())
+        conn.executemany(
+            "INSERT OR IGNORE INTO sightings (kind, entity_id, beacon, task_id, seen) VALUES (?, ?, ?, ?, ?)",
+            [(table, entity_id, beacon, task_id, seen) for entity_id in ids.values()]
+        )
+        return ids
+
+    def _replace_children(self, conn, table, parent, ids, values):
+        """用最新结果覆盖子表（指纹、域名解析 IP）"""
+        conn.executemany(f"DELETE FROM {table} WHERE {parent} = ?", [(entity_id,) for entity_id in ids])
+        conn.executemany(
+            f"INSERT OR IGNORE INTO {table} VALUES (?, ?)",
+            [(entity_id, value) for entity_id, entity_values in zip(ids, values) for value in entity_values]
+        )
+
+    def _ingest_sites(self, conn, beacon, task_id, items, seen):
+        rows = {}
+        fingers = {}
+        for item in items:
+            site, host = split_url(item.get("site"))
+            if not site:
+                continue
+            finger = normalize_fingers(item.get("finger"))
+            fingers[site] = finger
+            rows[site] = (
+                site, host, (item.get("title") or "").strip(),
+                normalize_ip(item.get("ip")), (item.get("http_server") or "").strip(), ", ".join(finger)
+            )
+        if not rows:
+            return
+        ids = self._upsert(conn, "sites", "site", ["host", "title", "ip", "server", "finger"],
+                           list(rows.values()), beacon, task_id, seen)
+        self._replace_children(conn, "site_fingers", "site_id",
+                               [ids[site] for site in rows], [fingers[site] for site in rows])
+
+    def _ingest_domains(self, conn, beacon, task_id, items, seen):
+        rows = {}
+        ips = {}
+        for item in items:
+            domain = normalize_domain(item.get("domain"))
+            if not domain:
+                continue
+            domain_ips = sorted({normalize_ip(ip) for ip in item.get("ips", []) if ip})
+            ips[domain] = domain_ips
+            rows[domain] = (domain, (item.get("type") or "").strip(), ", ".join(domain_ips))
+        if not rows:
+            return
+        ids = self._upsert(conn, "domains", "domain", ["type", "ips"],
+                           list(rows.values()), beacon, task_id, seen)
+        self._replace_children(conn, "domain_ips", "domain_id",
+                               [ids[domain] for domain in rows], [ips[domain] for domain in rows])
+
+    def _ingest_leaks(self, conn, beacon, task_id, items, seen):
+        rows = {}
+        for item in items:
+            url = normalize_url(item.get("url"))
+            if url:
+                rows[url] = (url, (item.get("title") or "").strip())
+        if rows:
+            self._upsert(conn, "leaks", "url", ["title"], list(rows.values()), beacon, task_id, seen)
+
+    def delete_task(self, beacon, task_id):
+        """删除任务的发现记录，记录本身和首次/最近发现信息保留"""
+        with self.lock:
+            self.conn.execute("DELETE FROM sightings WHERE beacon = ? AND task_id = ?", (beacon, task_id))
+
+    # 查询
+    def count(self, result_type):
+        table = WAREHOUSE_TABLES[result_type][0]
+        with self.lock:
+            return self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def iter_items(self, result_type, tasks=None, batch_size=1000):
+        """逐批读取去重后的记录，每次返回 (首次发现的灯塔, 任务, 记录列表)
+
+        记录的字段和灯塔接口返回的一致，可以直接交给导出和表格使用；
+        tasks 为 [(beacon, task_id)] 时只返回这些任务发现过的记录
+        """
+        table, _, columns = WAREHOUSE_TABLES[result_type]
+        query = f"SELECT {', '.join(columns)}, first_beacon, first_task FROM {table} t"
+        params = []
+        if tasks:
+            query += (
+                " WHERE EXISTS (SELECT 1 FROM sightings s JOIN temp_tasks q"
+                " ON s.beacon = q.beacon AND s.task_id = q.task_id"
+                " WHERE s.kind = ? AND s.entity_id = t.id)"
+            )
+            params.append(table)
+        query += " ORDER BY first_beacon, first_task, id"
+
+        with self.lock:
+            # 使用单独的只读连接，遍历期间不阻塞其他线程写入
+            conn = sqlite3.connect(self.path, check_same_thread=False) if self.path != ":memory:" else self.conn
+        try:
+            if tasks:
+                conn.execute("CREATE TEMP TABLE IF NOT EXISTS temp_tasks (beacon TEXT, task_id TEXT)")
+                conn.execute("DELETE FROM temp_tasks")
+                conn.executemany("INSERT INTO temp_tasks VALUES (?, ?)", list(tasks))
+            cursor = conn.execute(query, params)
+            current = None
+            batch = []
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    key = row[-2:]
+                    if key != current or len(batch) >= batch_size:
+                        if batch:
+                            yield current[0], current[1], batch
+                        current = key
+                        batch = []
+                    batch.append(self._to_item(result_type, dict(zip(columns, row))))
+            if batch:
+                yield current[0], current[1], batch
+        finally:
+            if conn is not self.conn:
+                conn.close()
+
+    @staticmethod
+    def _to_item(result_type, row):
+        """把表中的一行还原为灯塔接口的记录格式"""
+        if result_type == "assets":
+            return {
+                "site": row["site"],
+                "title": row["title"],
+                "ip": row["ip"],
+                "http_server": row["server"],
+                "finger": [{"name": name} for name in row["finger"].split(", ") if name]
+            }
+        if result_type == "domains":
+            return {"domain": row["domain"], "type": row["type"], "ips": [ip for ip in row["ips"].split(", ") if ip]}
+        return row
+
+    def get_stats(self):
+        with self.lock:
+            stats = {
+                result_type: self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for result_type, (table, _, _) in WAREHOUSE_TABLES.items()
+            }
+            stats["sightings"] = self.conn.execute("SELECT COUNT(*) FROM sightings").fetchone()[0]
+        return stats